@@ -0,0 +1,108 @@
+"""
+Stand-ins for the ytmusicapi and tidalapi client objects used by the benchmarks.
+
+Both libraries speak private protocols whose payloads are impractical to
+reproduce, so these clients expose the handful of methods Sound Tunnel calls on
+them and fetch their data from the mock server's simplified JSON endpoints.
+Spotify, and the raw Tidal and Apple requests, talk to the mock server directly.
+"""
+
+from types import SimpleNamespace
+
+import requests
+
+
+class BenchYTMusic:
+    """Covers the YTMusic methods used by src.ytfuncs."""
+
+    def __init__(self, base_url):
+        self.base = f"{base_url}/youtube"
+
+    def _get(self, path, **params):
+        r = requests.get(self.base + path, params=params)
+        r.raise_for_status()
+        return r.json()
+
+    def _post(self, path, payload):
+        r = requests.post(self.base + path, json=payload)
+        r.raise_for_status()
+        return r.json()
+
+    def get_library_playlists(self, limit=25):
+        return self._get("/library/playlists", limit=limit)
+
+    def get_playlist(self, playlist_id, limit=100):
+        return self._get(f"/playlists/{playlist_id}")
+
+    def search(self, query, filter=None, limit=20):  # noqa: A002
+        return self._get("/search", query=query, filter=filter, limit=limit)
+
+    def create_playlist(self, title, description):
+        return self._post("/playlists", {"title": title, "description": description})
+
+    def add_playlist_items(self, playlist_id, video_ids):
+        return self._post(f"/playlists/{playlist_id}/items", {"videoIds": video_ids})[
+            "status"
+        ]
+
+    def edit_playlist(self, playlist_id, title=None):
+        return self._post(f"/playlists/{playlist_id}/edit", {"title": title})
+
+
+def _track(item):
+    return SimpleNamespace(
+        id=item["id"],
+        name=item["title"],
+        album=SimpleNamespace(name=item["album"]["title"]),
+        artists=[SimpleNamespace(name=artist["name"]) for artist in item["artists"]],
+    )
+
+
+class _BenchTidalPlaylist:
+    def __init__(self, session, playlist_id):
+        self.session = session
+        self.id = playlist_id
+
+    def tracks(self, limit=None, offset=0):
+        url = f"{self.session.base}/v1/playlists/{self.id}/items"
+        result = []
+        while limit is None or len(result) < limit:
+            r = requests.get(url, params={"offset": offset})
+            r.raise_for_status()
+            page = r.json()
+            result.extend(_track(item["item"]) for item in page["items"])
+            offset += len(page["items"])
+            if not page["items"] or offset >= page["totalNumberOfItems"]:
+                break
+        return result[:limit]
+
+
+class _BenchTidalUser:
+    def __init__(self, session):
+        self.session = session
+
+    def playlists(self):
+        r = requests.get(f"{self.session.base}/v1/users/bench/playlists")
+        r.raise_for_status()
+        return [
+            SimpleNamespace(id=item["uuid"], name=item["title"])
+            for item in r.json()["items"]
+        ]
+
+    def folders(self):
+        return []
+
+
+class BenchTidalSession:
+    """Covers the tidalapi.Session attributes used by src.tidalfuncs."""
+
+    def __init__(self, base_url):
+        self.base = f"{base_url}/tidal"
+        self.access_token = "bench-token"
+        self.user = _BenchTidalUser(self)
+
+    def playlist(self, playlist_id):
+        return _BenchTidalPlaylist(self, playlist_id)
+
+    def folder(self, folder_id):
+        raise NotImplementedError("The benchmark library has no Tidal folders")
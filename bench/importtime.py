@@ -0,0 +1,57 @@
+"""
+Startup benchmark: how long `import main` and each provider module take.
+
+Every measurement runs in a fresh interpreter so nothing is cached.
+
+    python -m bench.importtime --repeat 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from statistics import median
+
+from src.providers import PROVIDERS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Client libraries that only the provider modules should pull in
+HEAVY_MODULES = ("spotipy", "ytmusicapi", "tidalapi", "requests", "tqdm")
+
+_SNIPPET = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - start\n"
+    "heavy = [m for m in {heavy!r} if m in sys.modules]\n"
+    "print(elapsed, ','.join(heavy))\n"
+)
+
+
+def measure(module):
+    # Seconds spent importing module and the heavy libraries it loaded
+    code = _SNIPPET.format(module=module, heavy=HEAVY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    return float(out[0]), out[1].split(",") if len(out) > 1 else []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure Sound Tunnel import time")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per module")
+    args = parser.parse_args(argv)
+    print(f"{'module':<18}{'median ms':>10}  heavy libraries loaded")
+    for module in ["main", *(module for module, _ in PROVIDERS.values())]:
+        runs = [measure(module) for _ in range(args.repeat)]
+        seconds = median(elapsed for elapsed, _ in runs)
+        print(f"{module:<18}{seconds * 1000:>10.1f}  {', '.join(runs[0][1]) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
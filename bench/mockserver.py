@@ -0,0 +1,525 @@
+"""
+Local HTTP stand-in for the Spotify, Tidal, Apple Music and YouTube Music
+endpoints Sound Tunnel talks to, used for offline end-to-end benchmarks.
+
+Every provider lives under its own path prefix (/spotify/v1, /tidal, /apple and
+/youtube) and shares one generated song catalog. Latency, jitter, page size and
+the share of requests answered with 429 are configurable.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PROVIDERS = ("spotify", "tidal", "apple", "youtube")
+
+WORDS = [
+    "blue",
+    "night",
+    "drive",
+    "city",
+    "heart",
+    "fire",
+    "summer",
+    "rain",
+    "golden",
+    "dream",
+    "river",
+    "light",
+    "electric",
+    "wild",
+    "midnight",
+    "echo",
+    "silver",
+    "ocean",
+    "shadow",
+    "paper",
+    "neon",
+    "velvet",
+    "storm",
+    "honey",
+    "desert",
+    "static",
+    "glass",
+    "thunder",
+    "broken",
+    "lonely",
+    "sweet",
+    "cold",
+    "young",
+    "forever",
+    "satellite",
+    "gravity",
+    "diamond",
+    "highway",
+    "mirror",
+    "paradise",
+    "runaway",
+    "whisper",
+]
+
+
+def _tokens(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+class MockState:
+    """Song catalog, per-provider playlists and request counters."""
+
+    def __init__(
+        self,
+        catalog_size=1000,
+        latency=0.0,
+        jitter=0.0,
+        page_size=100,
+        rate_429=0.0,
+        seed=0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.page_size = page_size
+        self.rate_429 = rate_429
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.catalog = [self._make_song(i) for i in range(catalog_size)]
+        self.reset()
+
+    def _make_song(self, idx):
+        pick = self.random.sample
+        return {
+            "id": str(idx),
+            "title": " ".join(pick(WORDS, 2)).title() + f" {idx}",
+            "album": " ".join(pick(WORDS, 2)).title(),
+            "artists": [" ".join(pick(WORDS, 2)).title()],
+        }
+
+    def reset(self):
+        # Drop every playlist and zero the counters, keeping the catalog
+        with self.lock:
+            self.playlists = {provider: {} for provider in PROVIDERS}
+            self.requests = dict.fromkeys(PROVIDERS, 0)
+            self.throttled = dict.fromkeys(PROVIDERS, 0)
+            self._next_id = 0
+
+    def add_playlist(self, provider, name, song_ids=()):
+        with self.lock:
+            self._next_id += 1
+            playlist_id = f"{provider[:2]}pl{self._next_id}"
+            self.playlists[provider][playlist_id] = {
+                "name": name,
+                "tracks": [str(i) for i in song_ids],
+            }
+        return playlist_id
+
+    def playlist(self, provider, playlist_id):
+        return self.playlists[provider].get(playlist_id)
+
+    def add_tracks(self, provider, playlist_id, song_ids):
+        with self.lock:
+            tracks = self.playlists[provider][playlist_id]["tracks"]
+            for song_id in song_ids:
+                if song_id not in tracks:
+                    tracks.append(song_id)
+
+    def search(self, query, limit=5):
+        # Rank catalog songs by the number of query words they share
+        wanted = _tokens(query)
+        scored = []
+        for song in self.catalog:
+            words = _tokens(" ".join([song["title"], song["album"], *song["artists"]]))
+            score = len(words & wanted)
+            if score:
+                scored.append((score, song))
+        scored.sort(key=lambda pair: -pair[0])
+        return [song for _, song in scored[:limit]]
+
+    def song(self, song_id):
+        return self.catalog[int(song_id)]
+
+    def count(self, provider):
+        with self.lock:
+            self.requests[provider] = self.requests.get(provider, 0) + 1
+            throttle = self.random.random() < self.rate_429
+            if throttle:
+                self.throttled[provider] = self.throttled.get(provider, 0) + 1
+        return throttle
+
+    def delay(self):
+        wait = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if wait > 0:
+            time.sleep(wait)
+
+
+# Provider specific response shapes
+
+
+def _spotify_track(song):
+    return {
+        "id": song["id"],
+        "name": song["title"],
+        "album": {"name": song["album"]},
+        "artists": [{"name": artist} for artist in song["artists"]],
+    }
+
+
+def _tidal_track(song):
+    return {
+        "id": song["id"],
+        "title": song["title"],
+        "album": {"title": song["album"]},
+        "artists": [{"name": artist} for artist in song["artists"]],
+    }
+
+
+def _apple_song(song):
+    return {
+        "id": song["id"],
+        "type": "songs",
+        "attributes": {
+            "name": song["title"],
+            "albumName": song["album"],
+            "artistName": " & ".join(song["artists"]),
+        },
+    }
+
+
+def _yt_track(song):
+    return {
+        "videoId": song["id"],
+        "title": song["title"],
+        "album": {"name": song["album"]},
+        "artists": [{"name": artist} for artist in song["artists"]],
+    }
+
+
+def _page(items, query, default):
+    offset = int(query.get("offset", 0))
+    limit = int(query.get("limit", default))
+    return items[offset : offset + limit], offset, limit
+
+
+# Route handlers take (state, match, query, body) and return (status, payload)
+# or (status, payload, headers)
+
+
+def spotify_me(state, match, query, body):
+    return 200, {"id": "bench-user"}
+
+
+def spotify_playlists(state, match, query, body):
+    items = [
+        {"name": playlist["name"], "id": playlist_id}
+        for playlist_id, playlist in state.playlists["spotify"].items()
+    ]
+    page, _, _ = _page(items, query, 50)
+    return 200, {"items": page, "total": len(items), "next": None}
+
+
+def spotify_playlist_items(state, match, query, body):
+    playlist = state.playlist("spotify", match["id"])
+    if playlist is None:
+        return 404, {"error": {"status": 404, "message": "Not found"}}
+    page, offset, limit = _page(playlist["tracks"], query, min(100, state.page_size))
+    return 200, {
+        "items": [{"track": _spotify_track(state.song(i))} for i in page],
+        "total": len(playlist["tracks"]),
+        "offset": offset,
+        "limit": limit,
+        "next": None,
+    }
+
+
+def spotify_add_items(state, match, query, body):
+    song_ids = [uri.rsplit(":", 1)[-1] for uri in body]
+    state.add_tracks("spotify", match["id"], song_ids)
+    return 201, {"snapshot_id": "bench"}
+
+
+def spotify_create_playlist(state, match, query, body):
+    return 201, {"id": state.add_playlist("spotify", body["name"])}
+
+
+def spotify_search(state, match, query, body):
+    songs = state.search(query.get("q", ""), int(query.get("limit", 5)))
+    return 200, {"tracks": {"items": [_spotify_track(song) for song in songs]}}
+
+
+def tidal_folders(state, match, query, body):
+    return 200, {"items": []}
+
+
+def tidal_create_playlist(state, match, query, body):
+    return 201, {"data": {"uuid": state.add_playlist("tidal", query.get("name"))}}
+
+
+def tidal_search(state, match, query, body):
+    songs = state.search(query.get("query", ""), int(query.get("limit", 5)))
+    return 200, {"tracks": {"items": [_tidal_track(song) for song in songs]}}
+
+
+def tidal_playlist(state, match, query, body):
+    playlist = state.playlist("tidal", match["id"])
+    if playlist is None:
+        return 404, {"status": 404}
+    payload = {
+        "uuid": match["id"],
+        "title": playlist["name"],
+        "numberOfTracks": len(playlist["tracks"]),
+    }
+    return 200, payload, {"Etag": f'"{len(playlist["tracks"])}"'}
+
+
+def tidal_playlist_items(state, match, query, body):
+    playlist = state.playlist("tidal", match["id"])
+    if playlist is None:
+        return 404, {"status": 404}
+    page, offset, limit = _page(playlist["tracks"], query, state.page_size)
+    return 200, {
+        "items": [{"item": _tidal_track(state.song(i))} for i in page],
+        "totalNumberOfItems": len(playlist["tracks"]),
+        "offset": offset,
+        "limit": limit,
+    }
+
+
+def tidal_add_items(state, match, query, body):
+    song_ids = [i for i in body.get("trackIds", "").split(",") if i]
+    state.add_tracks("tidal", match["id"], song_ids)
+    return 200, {"lastUpdated": int(time.time())}
+
+
+def tidal_user_playlists(state, match, query, body):
+    items = [
+        {"uuid": playlist_id, "title": playlist["name"]}
+        for playlist_id, playlist in state.playlists["tidal"].items()
+    ]
+    return 200, {"items": items, "totalNumberOfItems": len(items)}
+
+
+def apple_storefront(state, match, query, body):
+    return 200, {"data": [{"id": "us", "type": "storefronts"}]}
+
+
+def apple_library_songs(state, match, query, body):
+    page, _, _ = _page(state.catalog, query, 100)
+    return 200, {"data": [_apple_song(song) for song in page]}
+
+
+def apple_playlists(state, match, query, body):
+    data = [
+        {
+            "id": playlist_id,
+            "type": "library-playlists",
+            "attributes": {"name": playlist["name"]},
+            "relationships": {"parent": {"data": [{"id": "p.playlistsroot"}]}},
+        }
+        for playlist_id, playlist in state.playlists["apple"].items()
+    ]
+    return 200, {"data": data}
+
+
+def apple_create_playlist(state, match, query, body):
+    playlist_id = state.add_playlist("apple", body["attributes"]["name"])
+    return 201, {"data": [{"id": playlist_id, "type": "library-playlists"}]}
+
+
+def apple_playlist(state, match, query, body):
+    playlist = state.playlist("apple", match["id"])
+    if playlist is None:
+        return 404, {"errors": [{"status": "404"}]}
+    return 200, {
+        "data": [{"id": match["id"], "attributes": {"name": playlist["name"]}}]
+    }
+
+
+def apple_playlist_tracks(state, match, query, body):
+    playlist = state.playlist("apple", match["id"])
+    if playlist is None or not playlist["tracks"]:
+        # Apple answers empty playlists with an error document
+        return 404, {"errors": [{"status": "404", "title": "Resource Not Found"}]}
+    # The client pages Apple playlists in fixed steps of 100
+    page, _, _ = _page(playlist["tracks"], query, 100)
+    return 200, {
+        "data": [_apple_song(state.song(i)) for i in page],
+        "meta": {"total": len(playlist["tracks"])},
+    }
+
+
+def apple_add_tracks(state, match, query, body):
+    song_ids = [item["id"] for item in body["data"]]
+    state.add_tracks("apple", match["id"], song_ids)
+    return 204, None
+
+
+def apple_search(state, match, query, body):
+    songs = state.search(query.get("term", ""), int(query.get("limit", 5)))
+    if not songs:
+        return 200, {"results": {}}
+    return 200, {"results": {"song": {"data": [_apple_song(s) for s in songs]}}}
+
+
+def youtube_library_playlists(state, match, query, body):
+    items = [
+        {"title": playlist["name"], "playlistId": playlist_id}
+        for playlist_id, playlist in state.playlists["youtube"].items()
+    ]
+    return 200, items
+
+
+def youtube_playlist(state, match, query, body):
+    playlist = state.playlist("youtube", match["id"])
+    if playlist is None:
+        return 404, {"error": "not found"}
+    return 200, {
+        "id": match["id"],
+        "title": playlist["name"],
+        "tracks": [_yt_track(state.song(i)) for i in playlist["tracks"]],
+    }
+
+
+def youtube_search(state, match, query, body):
+    songs = state.search(query.get("query", ""), int(query.get("limit", 20)))
+    return 200, [_yt_track(song) for song in songs]
+
+
+def youtube_create_playlist(state, match, query, body):
+    return 200, state.add_playlist("youtube", body["title"])
+
+
+def youtube_add_items(state, match, query, body):
+    state.add_tracks("youtube", match["id"], body["videoIds"])
+    return 200, {"status": "STATUS_SUCCEEDED"}
+
+
+def youtube_edit_playlist(state, match, query, body):
+    playlist = state.playlist("youtube", match["id"])
+    if playlist is None:
+        return 404, {"error": "not found"}
+    playlist["name"] = body["title"]
+    return 200, "STATUS_SUCCEEDED"
+
+
+ROUTES = [
+    ("GET", r"/spotify/v1/me/?", spotify_me),
+    ("GET", r"/spotify/v1/me/playlists", spotify_playlists),
+    ("GET", r"/spotify/v1/playlists/(?P<id>[^/]+)/tracks", spotify_playlist_items),
+    ("POST", r"/spotify/v1/playlists/(?P<id>[^/]+)/tracks", spotify_add_items),
+    ("POST", r"/spotify/v1/users/(?P<user>[^/]+)/playlists", spotify_create_playlist),
+    ("GET", r"/spotify/v1/search", spotify_search),
+    ("GET", r"/tidal/v2/my-collection/playlists/folders", tidal_folders),
+    (
+        "PUT",
+        r"/tidal/v2/my-collection/playlists/folders/create-playlist",
+        tidal_create_playlist,
+    ),
+    ("GET", r"/tidal/v1/search/top-hits", tidal_search),
+    ("GET", r"/tidal/v1/playlists/(?P<id>[^/]+)", tidal_playlist),
+    ("GET", r"/tidal/v1/playlists/(?P<id>[^/]+)/items", tidal_playlist_items),
+    ("POST", r"/tidal/v1/playlists/(?P<id>[^/]+)/items", tidal_add_items),
+    ("GET", r"/tidal/v1/users/(?P<user>[^/]+)/playlists", tidal_user_playlists),
+    ("GET", r"/apple/v1/me/storefront", apple_storefront),
+    ("GET", r"/apple/v1/me/library/songs", apple_library_songs),
+    ("GET", r"/apple/v1/me/library/playlists", apple_playlists),
+    ("POST", r"/apple/v1/me/library/playlists", apple_create_playlist),
+    ("GET", r"/apple/v1/me/library/playlists/(?P<id>[^/]+)", apple_playlist),
+    (
+        "GET",
+        r"/apple/v1/me/library/playlists/(?P<id>[^/]+)/tracks",
+        apple_playlist_tracks,
+    ),
+    (
+        "POST",
+        r"/apple/v1/me/library/playlists/(?P<id>[^/]+)/tracks",
+        apple_add_tracks,
+    ),
+    ("GET", r"/apple/v1/catalog/(?P<storefront>[^/]+)/search", apple_search),
+    ("GET", r"/youtube/library/playlists", youtube_library_playlists),
+    ("POST", r"/youtube/playlists", youtube_create_playlist),
+    ("GET", r"/youtube/playlists/(?P<id>[^/]+)", youtube_playlist),
+    ("POST", r"/youtube/playlists/(?P<id>[^/]+)/items", youtube_add_items),
+    ("POST", r"/youtube/playlists/(?P<id>[^/]+)/edit", youtube_edit_playlist),
+    ("GET", r"/youtube/search", youtube_search),
+]
+ROUTES = [(method, re.compile(pattern), handler) for method, pattern, handler in ROUTES]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # noqa: N802
+        self._dispatch("GET")
+
+    def do_POST(self):  # noqa: N802
+        self._dispatch("POST")
+
+    def do_PUT(self):  # noqa: N802
+        self._dispatch("PUT")
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        raw = self.rfile.read(length).decode()
+        if "json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(raw)
+        return {key: values[-1] for key, values in parse_qs(raw).items()}
+
+    def _dispatch(self, method):
+        state = self.server.state
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body = self._read_body()
+        provider = url.path.split("/")[1]
+
+        state.delay()
+        if state.count(provider):
+            self._send(429, {"error": "Too Many Requests"}, {"Retry-After": "0"})
+            return
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.fullmatch(url.path)
+            if match and route_method == method:
+                self._send(*handler(state, match.groupdict(), query, body))
+                return
+        self._send(404, {"error": f"No mock for {method} {url.path}"})
+
+    def _send(self, status, payload, headers=None):
+        data = b"" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockServer(ThreadingHTTPServer):
+    """Threaded mock server bound to a free localhost port."""
+
+    daemon_threads = True
+
+    def __init__(self, state=None, port=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.state = state or MockState()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,69 @@
+"""
+Bulk matching benchmark: two libraries of the same songs, matched pairwise
+with best_match() and with the NumPy path of src/vectors.py.
+
+The second library spells albums and titles differently, as another platform
+would. Pairwise matching is timed on a sample of sources and extrapolated.
+
+    python -m bench.reconcile --size 3000 --sample 30
+"""
+
+import argparse
+from time import perf_counter
+
+from bench.mockserver import MockState
+from src.matching import best_match
+from src.normalize import track_string
+from src.vectors import reconcile
+
+
+def libraries(size, seed=0):
+    # The same songs as two platforms would list them
+    catalog = MockState(catalog_size=size, seed=seed).catalog
+    ours = [
+        track_string(song["album"], song["title"], song["artists"][0])
+        for song in catalog
+    ]
+    theirs = [
+        track_string("Best Of", f"{song['title']} (Remastered)", song["artists"][0])
+        for song in catalog
+    ]
+    return ours, theirs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure bulk library matching")
+    parser.add_argument("--size", type=int, default=3000, help="Tracks per library")
+    parser.add_argument(
+        "--sample", type=int, default=30, help="Sources matched pairwise"
+    )
+    args = parser.parse_args(argv)
+    ours, theirs = libraries(args.size)
+
+    start = perf_counter()
+    sample = ours[: args.sample]
+    pairwise = [best_match(track, theirs) for track in sample]
+    pairwise_seconds = (perf_counter() - start) / len(sample) * len(ours)
+
+    start = perf_counter()
+    vectorized = reconcile(ours, theirs)
+    vectorized_seconds = perf_counter() - start
+
+    def found(matches):
+        hits = sum(
+            match is not None and match[0] == i for i, match in enumerate(matches)
+        )
+        return hits / len(matches)
+
+    print(f"{args.size} x {args.size} tracks")
+    print(
+        f"{'pairwise':<12}{pairwise_seconds:>10.1f}s  (extrapolated)  found {found(pairwise):.1%}"
+    )
+    print(
+        f"{'vectorized':<12}{vectorized_seconds:>10.1f}s  found {found(vectorized):.1%}"
+    )
+    print(f"speedup {pairwise_seconds / vectorized_seconds:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Offline end-to-end benchmark for tunnel()
+
+Starts the mock provider server, seeds a source playlist and moves it to every
+selected destination, reporting tracks/sec and requests/track per pair.
+
+    python -m bench.runner --tracks 50 --latency 0.05 --jitter 0.02
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from itertools import permutations
+from time import perf_counter
+
+from bench.mockserver import PROVIDERS, MockServer, MockState
+from src.hedge import enable_hedging
+from src.metrics import report_timings
+
+
+def use_mock_endpoints(base_url):
+    # Must run before src.tidalfuncs / src.applefuncs are first imported
+    os.environ["SOUND_TUNNEL_TIDAL_API"] = f"{base_url}/tidal"
+    os.environ["SOUND_TUNNEL_APPLE_API"] = f"{base_url}/apple"
+
+
+def connect(base_url, providers, playlistdir=None):
+    # Authenticated providers pointed at the mock server, keyed by name. The
+    # file provider uses playlistdir, never the configured playlists directory
+    from src.providers import load_provider
+
+    connected = {}
+    for name in providers:
+        provider = load_provider(name)
+        if name == "spotify":
+            import spotipy
+
+            provider.session = spotipy.Spotify(auth="bench-token")
+            provider.session.prefix = f"{base_url}/spotify/v1/"
+            provider.user_id = provider.session.me()["id"]
+        elif name == "youtube":
+            from bench.clients import BenchYTMusic
+
+            provider.session = BenchYTMusic(base_url)
+        elif name == "tidal":
+            from bench.clients import BenchTidalSession
+
+            provider.session = BenchTidalSession(base_url)
+        elif name == "apple":
+            provider.session = {
+                "Authorization": "Bearer bench",
+                "Media-User-Token": "bench",
+            }
+        elif name == "file":
+            provider.directory = playlistdir or tempfile.mkdtemp(
+                prefix="sound-tunnel-bench-playlists-"
+            )
+            provider.auth()
+        connected[name] = provider
+    return connected
+
+
+def seed_files(state, name, tracks):
+    # A fresh temporary playlists directory, holding the source playlist when
+    # file is the source: a source read without any network request
+    from src.filefuncs import write_file_tracks
+    from src.normalize import track_string
+
+    playlistdir = tempfile.mkdtemp(prefix="sound-tunnel-bench-playlists-")
+    if not tracks:
+        return playlistdir
+    songs = state.catalog[:tracks]
+    write_file_tracks(
+        os.path.join(playlistdir, f"{name}.json"),
+        [
+            track_string(song["album"], song["title"], " ".join(song["artists"]))
+            for song in songs
+        ],
+        name,
+    )
+    return playlistdir
+
+
+def run_pair(server, source, destination, tracks, name="sound tunnel bench"):
+    from main import tunnel
+
+    state = server.state
+    state.reset()
+    playlistdir = None
+    if "file" in (source, destination):
+        playlistdir = seed_files(state, name, tracks if source == "file" else 0)
+    if source != "file":
+        state.add_playlist(source, name, range(tracks))
+    providers = connect(server.url, [source, destination], playlistdir)
+    setup_requests = sum(state.requests.values())
+
+    try:
+        start = perf_counter()
+        not_found = tunnel(name, providers[source], providers[destination])
+        elapsed = perf_counter() - start
+    finally:
+        if playlistdir:
+            shutil.rmtree(playlistdir, ignore_errors=True)
+
+    requests_made = sum(state.requests.values()) - setup_requests
+    return {
+        "pair": f"{source}->{destination}",
+        "tracks": tracks,
+        "not_found": not_found,
+        "seconds": elapsed,
+        "tracks_per_sec": tracks / elapsed if elapsed else 0.0,
+        "requests": requests_made,
+        "requests_per_track": requests_made / tracks if tracks else 0.0,
+        "throttled": sum(state.throttled.values()),
+    }
+
+
+def report(rows):
+    print(
+        f"\n{'pair':<18}{'tracks':>8}{'missed':>8}{'seconds':>10}"
+        f"{'tracks/s':>10}{'requests':>10}{'req/track':>11}{'429s':>6}"
+    )
+    for row in rows:
+        print(
+            f"{row['pair']:<18}{row['tracks']:>8}{row['not_found']:>8}"
+            f"{row['seconds']:>10.2f}{row['tracks_per_sec']:>10.2f}"
+            f"{row['requests']:>10}{row['requests_per_track']:>11.2f}"
+            f"{row['throttled']:>6}"
+        )
+
+
+def options(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark Sound Tunnel transfers against a local mock server"
+    )
+    parser.add_argument("--tracks", type=int, default=20, help="Tracks per playlist")
+    parser.add_argument(
+        "--catalog", type=int, default=1000, help="Songs in the mock catalog"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every request"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Random +/- seconds of latency"
+    )
+    parser.add_argument(
+        "--page-size", type=int, default=100, help="Items per page on list endpoints"
+    )
+    parser.add_argument(
+        "--rate-429",
+        type=float,
+        default=0.0,
+        help="Share of requests answered with 429 Too Many Requests (0-1)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Catalog/random seed")
+    parser.add_argument(
+        "--hedge", action="store_true", help="Hedge slow reads as main.py --hedge"
+    )
+    parser.add_argument(
+        "--pairs",
+        help="Comma separated source:destination pairs e.g spotify:apple or "
+        "file:tidal for a source read without network requests "
+        "(default: every combination)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = options(argv)
+    if args.pairs:
+        pairs = [tuple(pair.split(":")) for pair in args.pairs.split(",")]
+    else:
+        pairs = list(permutations(PROVIDERS, 2))
+    state = MockState(
+        catalog_size=max(args.catalog, args.tracks),
+        latency=args.latency,
+        jitter=args.jitter,
+        page_size=args.page_size,
+        rate_429=args.rate_429,
+        seed=args.seed,
+    )
+    if args.hedge:
+        enable_hedging()
+    server = MockServer(state).start()
+    use_mock_endpoints(server.url)
+    # Keep failed.jsonl and other run artifacts out of the working tree
+    sys.path.insert(0, os.getcwd())
+    os.chdir(tempfile.mkdtemp(prefix="sound-tunnel-bench-"))
+    try:
+        rows = [run_pair(server, src, dst, args.tracks) for src, dst in pairs]
+    finally:
+        server.stop()
+    report(rows)
+    report_timings()
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import os
+
 # Client_ID and Client_secret from Spotify Developers Dashboard
 CLIENT_ID = ""
 CLIENT_SECRET = ""
@@ -24,3 +26,31 @@ tidalfile = ".creds/creds_auth.txt"
 
 # File containing your applemusic cookies
 applefile = ".creds/i_auth.txt"
+
+# Tracks that couldn't be moved, one JSON record per line (see --retry-failed)
+failedfile = "failed.jsonl"
+
+# Last successful applemusic token check, skipped until the token expires
+applecache = ".creds/i_auth_valid.json"
+
+# Search concurrency each platform settled on, the next run's starting point
+limitsfile = ".creds/limits.json"
+
+# Seconds to wait for a connection, then for each response, on every API call
+connect_timeout = float(os.environ.get("SOUND_TUNNEL_CONNECT_TIMEOUT", 5))
+read_timeout = float(os.environ.get("SOUND_TUNNEL_READ_TIMEOUT", 30))
+request_timeout = (connect_timeout, read_timeout)
+
+# Directory of the file platform's playlists, and the format new ones are
+# written in (json, csv or m3u)
+playlistdir = os.environ.get("SOUND_TUNNEL_PLAYLIST_DIR", "playlists")
+playlistformat = os.environ.get("SOUND_TUNNEL_PLAYLIST_FORMAT", "json")
+
+# Playlists a --deadline run didn't get to, continue them with -P resume.txt
+resumefile = "resume.txt"
+
+# Base URLs of the Tidal and Apple Music web APIs
+# Point these at the local mock server (see bench/) with the SOUND_TUNNEL_TIDAL_API
+# and SOUND_TUNNEL_APPLE_API environment variables to run offline benchmarks
+tidal_api = os.environ.get("SOUND_TUNNEL_TIDAL_API", "https://listen.tidal.com")
+apple_api = os.environ.get("SOUND_TUNNEL_APPLE_API", "https://amp-api.music.apple.com")
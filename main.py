@@ -4,248 +4,398 @@ Sound Tunnel
 """
 
 import argparse
+import os
+import subprocess
 import sys
+import threading
 from os.path import abspath
 
-from src.applefuncs import (
-    apple_auth,
-    apple_dest_check,
-    get_apple_playlist_content,
-    get_apple_playlists,
-    move_to_apple,
-)
-from src.mainfuncs import (
-    confirm_playlist_exist,
-    display_playlists,
-    message,
-    report_sync_summary,
-    write_to_file,
-)
-from src.spfyfuncs import (
-    get_spfy_likes,
-    get_spfy_playlist_content,
-    get_spotify_playlists,
-    move_to_spfy,
-    spfy_dest_check,
-    spotify_auth,
-)
-from src.tidalfuncs import (
-    get_tidal_playlist_content,
-    get_tidal_playlists,
-    move_to_tidal,
-    tidal_auth,
-    tidal_dest_check,
-)
-from src.ytfuncs import (
-    change_name,
-    get_youtube_playlists,
-    get_yt_playlist_content,
-    move_to_ytmusic,
-    yt_dest_check,
-    ytmusic_auth,
+from config.config import failedfile, resumefile
+from src.failures import broad_search, load_failures, log_failures, run_id
+from src.hedge import enable_hedging
+from src.mainfuncs import message, report_sync_summary
+from src.metrics import report_timings, stage, write_metrics
+from src.profiling import configure_profiling, phase
+from src.providers import load_provider, save_limits
+from src.schedule import (
+    POLICIES,
+    order_playlists,
+    run_playlists,
+    select_shard,
+    shard_path,
 )
+from src.transfer import fan_out, set_deadline, stream, transfer
 
 
-def tunnel(source_playlist_name, source, destination, core_sessions):
-    # Carry out basic checks and tunnel
+def tunnel(source_playlist_name, source, *destinations, slot=None, resume=None):
+    # Carry out basic checks and tunnel from one provider to one or more others.
+    # slot is set when several playlists run at once (--parallel), resume holds
+    # how far each destination got in a run the --deadline cut short
     dest_playlist_name = source_playlist_name
-    if "spotify" in source + destination:
-        spotify = core_sessions["s"][0]
-        spfy_lists = core_sessions["s"][1]
-        spfy_id = core_sessions["s"][2]
-    if "youtube" in source + destination:
-        ytmusic = core_sessions["y"][0]
-        yt_lists = core_sessions["y"][1]
-    if "tidal" in source + destination:
-        tidal = core_sessions["t"][0]
-        tidl_lists = core_sessions["t"][1]
-    if "apple" in source + destination:
-        apple = core_sessions["a"][0]
-        apple_lists = core_sessions["a"][1]
-        apple_folders = core_sessions["a"][2]
+    with stage("source read"):
+        pages = source.pages(source_playlist_name)
+    if pages is None:
+        sys.exit(1)
+    dest_playlist_ids = []
+    for destination in destinations:
+        with stage("dest check"):
+            dest_playlist_ids.append(destination.create(dest_playlist_name, source))
+    # Source pages are fetched while earlier tracks are already being searched
+    if len(destinations) == 1:
+        streams = [stream(pages)]
     else:
-        apple_folders = None
-
-    if source == "spotify":
-        if source_playlist_name.lower() == "your likes":
-            playlist_info = get_spfy_likes(spotify)
-        else:
-            source_playlist_id = confirm_playlist_exist(
-                source_playlist_name, spfy_lists, "spotify"
-            )
-            if source_playlist_id is None:
-                sys.exit(1)
-            playlist_info = get_spfy_playlist_content(spotify, source_playlist_id)
-    elif source == "youtube":
-        source_playlist_id = confirm_playlist_exist(
-            source_playlist_name, yt_lists, "youtube"
-        )
-        if source_playlist_id is None:
-            sys.exit(1)
-        playlist_info = get_yt_playlist_content(ytmusic, source_playlist_id)
-    elif source == "tidal":
-        source_playlist_id = confirm_playlist_exist(
-            source_playlist_name, tidl_lists, "tidal"
-        )
-        if source_playlist_id is None:
-            sys.exit(1)
-        playlist_info = get_tidal_playlist_content(tidal, source_playlist_id)
-    elif source == "apple":
-        source_playlist_id = confirm_playlist_exist(
-            source_playlist_name, apple_lists, "apple"
-        )
-        if source_playlist_id is None:
-            sys.exit(1)
-        playlist_info = get_apple_playlist_content(apple, source_playlist_id)
+        streams = fan_out(stream(pages), len(destinations))
+    results = [None] * len(destinations)
+    # One progress bar line per destination and playlist running at once
+    if slot is None and len(destinations) == 1:
+        positions = [None]
     else:
-        print(
-            f"[-]: {source} is an unrecognized source. Use 'spotify', 'tidal' or 'youtube'"
-        )
-        sys.exit(1)
+        positions = [
+            (slot or 0) * len(destinations) + i for i in range(len(destinations))
+        ]
 
-    if destination == "youtube":
-        dest_playlist_id = yt_dest_check(ytmusic, yt_lists, dest_playlist_name)
-        not_found = move_to_ytmusic(
-            ytmusic, playlist_info, dest_playlist_id, source_playlist_name
-        )
-    elif destination == "spotify":
-        dest_playlist_id = spfy_dest_check(
-            spfy_lists, spotify, spfy_id, dest_playlist_name
-        )
-        not_found = move_to_spfy(
-            spotify, playlist_info, dest_playlist_id, source_playlist_name
-        )
-    elif destination == "tidal":
-        # Pass apple_folders if source is Apple Music, otherwise None
-        apple_folders_param = apple_folders if source == "apple" else None
-        dest_playlist_id = tidal_dest_check(
-            tidl_lists, tidal, dest_playlist_name, apple_folders_param
-        )
-        not_found = move_to_tidal(
-            tidal, playlist_info, dest_playlist_id, source_playlist_name
-        )
-    elif destination == "apple":
-        dest_playlist_id = apple_dest_check(apple_lists, apple, dest_playlist_name)
-        not_found = move_to_apple(
-            apple, playlist_info, dest_playlist_id, source_playlist_name
+    def move(i):
+        # Each destination works under its own concurrency and rate limits
+        try:
+            results[i] = transfer(
+                streams[i],
+                destinations[i],
+                dest_playlist_ids[i],
+                source_playlist_name,
+                position=positions[i],
+                resume=resume,
+            )
+        except Exception as e:
+            results[i] = e
+            # Keep reading so the other destinations aren't held up
+            for _ in streams[i]:
+                pass
+
+    if len(destinations) == 1:
+        results[0] = transfer(
+            streams[0],
+            destinations[0],
+            dest_playlist_ids[0],
+            source_playlist_name,
+            position=positions[0],
+            resume=resume,
         )
     else:
-        print(
-            f"[-]: {destination} is an unrecognized destination. Use 'spotify', 'tidal' or 'youtube'"
-        )
-        sys.exit(1)
+        workers = [
+            threading.Thread(target=move, args=(i,), daemon=True)
+            for i in range(len(destinations))
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            print("\n[!] Operation cancelled by user.")
+            sys.exit(0)
+    total_not_found = 0
+    for destination, not_found in zip(destinations, results):
+        if isinstance(not_found, Exception):
+            message(f"{destination.code}-", f"Transfer failed: {not_found!r}")
+            continue
+        log_failures(source_playlist_name, not_found, source.name, destination.name)
+        total_not_found += len(not_found)
+    return total_not_found  # Return count of not found tracks
 
-    write_to_file(source_playlist_name, not_found, source, destination)
-    return len(not_found)  # Return count of not found tracks
+
+def retry_failed(wanted_run, source_name, destination):
+    # Search again, more broadly, for the tracks a previous run couldn't move
+    records = load_failures(source_name, destination.name, wanted_run)
+    if not records:
+        print(f"[i] No failed {source_name}->{destination.name} tracks to retry")
+        return 0
+    playlists = {}
+    for record in records:
+        playlists.setdefault(record["playlist"], []).append(record["track"])
+    total_not_found = 0
+    for playlist, tracks in playlists.items():
+        with phase(f"retry {playlist}"):
+            with stage("dest check"):
+                dest_playlist_id = destination.create(playlist)
+            not_found = transfer(
+                tracks, destination, dest_playlist_id, playlist, search=broad_search
+            )
+            log_failures(playlist, not_found, source_name, destination.name)
+            total_not_found += len(not_found)
+    return total_not_found
 
 
 def main():
     args = options()
-    if args.source == args.destination:
+    # -d takes one or more platforms, separated by spaces or commas
+    dest_names = []
+    for names in args.destination or []:
+        for name in names.split(","):
+            if name and name not in dest_names:
+                dest_names.append(name)
+    if args.source in dest_names:
         print(
             f"[-]: Nice try but no you can't move from {args.source} to {args.source}, they are the same platform"
         )
         sys.exit(1)
-    argz = [args.source, args.destination]
-    core_sessions = {}
-    if "youtube" in argz:
-        ytmusic = ytmusic_auth()
-        yt_lists = get_youtube_playlists(ytmusic)
-        change_name(ytmusic, yt_lists)
-        core_sessions["y"] = [ytmusic, yt_lists]
-    if "spotify" in argz:
-        spotify = spotify_auth()
-        spfy_id = spotify.me()["id"]
-        spfy_lists = get_spotify_playlists(spotify)
-        core_sessions["s"] = [spotify, spfy_lists, spfy_id]
-    if "tidal" in argz:
-        tidal = tidal_auth()
-        tidl_lists = get_tidal_playlists(tidal)
-        core_sessions["t"] = [tidal, tidl_lists]
-    if "apple" in argz:
-        apple = apple_auth()
-        apple_lists, apple_folders = get_apple_playlists(apple)
-        core_sessions["a"] = [apple, apple_lists, apple_folders]
+    if args.shards > 1 and not (args.A or args.P):
+        print("[-]: --shards splits the playlists of -A or -P between processes")
+        sys.exit(1)
+    if args.shard_index is not None and not 0 <= args.shard_index < args.shards:
+        print(f"[-]: --shard-index must be between 0 and {args.shards - 1}")
+        sys.exit(1)
+    if args.shards > 1 and args.shard_index is None:
+        sys.exit(run_shards(args.shards))
+    if args.profile:
+        configure_profiling(args.profile, output(args, args.profile_out))
+    if args.hedge:
+        enable_hedging()
+    if args.deadline:
+        set_deadline(args.deadline)
+    # Only the selected providers are imported, keeping --help and -L fast
+    source = load_provider(args.source)
+    destinations = [load_provider(name) for name in dest_names]
+    if args.shards > 1:
+        for provider in [source, *destinations]:
+            provider.share(args.shards)
+    if args.retry_failed and not destinations:
+        print("[-]: Select the destination platform to retry with -d")
+        sys.exit(1)
+    # Retries only touch the destinations, so the source isn't signed in to
+    providers = destinations if args.retry_failed else [*destinations, source]
+    for provider in providers:
+        with stage("auth"), phase(f"auth {provider.name}"):
+            provider.auth()
     if args.L:
-        if args.source == "spotify":
-            message("s+", "Displaying Playlists\n")
-            print("Your Likes")
-            display_playlists(spfy_lists)
-        elif args.source == "youtube":
-            message("y+", "Displaying Playlists\n")
-            display_playlists(yt_lists)
-        elif args.source == "tidal":
-            message("t+", "Displaying Playlists\n")
-            display_playlists(tidl_lists)
-        elif args.source == "apple":
-            message("a+", "Displaying Playlists\n")
-            display_playlists(apple_lists)
-        else:
-            print(
-                f"-s {args.source} is unrecognized. Use '-s youtube', '-s spotify' etc"
-            )
-            sys.exit(0)
-    elif args.p:
-        total_not_found = tunnel(args.p, args.source, args.destination, core_sessions)
-        report_sync_summary(total_not_found)
+        message(f"{source.code}+", "Displaying Playlists\n")
+        source.show_playlists()
+        return
+    if args.retry_failed:
+        wanted_run = None if args.retry_failed == "last" else args.retry_failed
+        total_not_found = 0
+        for destination in destinations:
+            total_not_found += retry_failed(wanted_run, source.name, destination)
+        finish(args, total_not_found, destinations)
+        return
+    # {playlist: {destination: (source tracks done with, mark of the last)}} of
+    # playlists cut short
+    progress = {}
+    if args.p:
+        playlist_names = [args.p]
     elif args.P:
         file_path = abspath(args.P)
-        playlist_names = []
         try:
-            with open(file_path) as ff:
-                for line in ff:
-                    playlist_names.append(line.strip())
+            playlist_names, progress = load_resume(file_path)
         except FileNotFoundError:
             print(f"[-] : {file_path} does not exist")
             sys.exit(1)
-        total_not_found = 0
-        for playlist in playlist_names:
-            total_not_found += tunnel(
-                playlist, args.source, args.destination, core_sessions
-            )
-        report_sync_summary(total_not_found)
     elif args.A:
-        total_not_found = 0
-        if args.source == "spotify":
-            total_not_found += tunnel(
-                "your likes", args.source, args.destination, core_sessions
+        playlist_names = source.all_playlists()
+    else:
+        return
+    if not destinations:
+        print("[-]: Select a destination platform with -d")
+        sys.exit(1)
+    if args.shard_index is not None:
+        playlist_names = select_shard(playlist_names, args.shards, args.shard_index)
+    playlist_names = order_playlists(playlist_names, source.size, args.order)
+
+    def work(playlist, slot):
+        with phase(f"tunnel {playlist}"):
+            resume = progress.setdefault(playlist, {})
+            return tunnel(playlist, source, *destinations, slot=slot, resume=resume)
+
+    def unfinished(playlist):
+        # transfer() drops a destination from resume once it's done
+        return bool(progress.get(playlist))
+
+    results, left = run_playlists(playlist_names, work, args.parallel, unfinished)
+    if left:
+        save_resume(left, output(args, resumefile), progress)
+    finish(args, sum(results), destinations)
+
+
+def run_shards(shards):
+    # --shards without --shard-index: run this command once per shard, each in
+    # its own process, and wait for all of them. They share one run id so
+    # --retry-failed picks up the failures of every shard.
+    env = {**os.environ, "SOUND_TUNNEL_RUN_ID": run_id()}
+    processes = [
+        subprocess.Popen(
+            [sys.executable, *sys.argv, "--shard-index", str(index)], env=env
+        )
+        for index in range(shards)
+    ]
+    try:
+        return max(process.wait() for process in processes)
+    except KeyboardInterrupt:
+        # Ctrl+C reached the shards too, they save their progress and stop
+        for process in processes:
+            process.wait()
+        print("\n[!] Operation cancelled by user.")
+        return 0
+
+
+def output(args, path):
+    # Each shard writes its own copy of a per run file
+    if args.shard_index is None:
+        return path
+    return shard_path(path, args.shard_index)
+
+
+def save_resume(playlist_names, path=resumefile, progress=None):
+    # The playlist cut short goes first, followed by a tab, how many of its
+    # source tracks each destination is done with and a mark of the last of
+    # them, e.g "Rock\ttidal=120:1f2e3d4c"
+    progress = progress or {}
+    lines = []
+    for name in playlist_names:
+        done = " ".join(
+            f"{dest}={count}:{last}" if last else f"{dest}={count}"
+            for dest, (count, last) in progress.get(name, {}).items()
+        )
+        lines.append(f"{name}\t{done}\n" if done else f"{name}\n")
+    with open(path, "w") as file:
+        file.write("".join(lines))
+    print(
+        f"\n[!] Deadline reached with {len(playlist_names)} playlist(s) to go, "
+        f"continue with -P {path}"
+    )
+
+
+def load_resume(path):
+    # Playlist names of a -P file and the progress save_resume() noted for them
+    playlist_names = []
+    progress = {}
+    with open(path) as file:
+        for line in file:
+            name, _, done = line.rstrip("\r\n").partition("\t")
+            name = name.strip()
+            playlist_names.append(name)
+            if done.strip():
+                progress[name] = {}
+                for item in done.split():
+                    dest, _, count = item.partition("=")
+                    count, _, last = count.partition(":")
+                    progress[name][dest] = (int(count), last or None)
+    return playlist_names, progress
+
+
+def finish(args, total_not_found, destinations=()):
+    # End of run reports
+    for destination in destinations:
+        if destination.reused:
+            message(
+                f"{destination.code}+",
+                f"{len(destination.resolved)} unique track(s) searched, "
+                f"{destination.reused} repeat(s) reused an earlier result",
             )
-            for playlist in spfy_lists:
-                total_not_found += tunnel(
-                    playlist, args.source, args.destination, core_sessions
-                )
-        elif args.source == "youtube":
-            for playlist in yt_lists:
-                total_not_found += tunnel(
-                    playlist, args.source, args.destination, core_sessions
-                )
-        elif args.source == "tidal":
-            for playlist in tidl_lists:
-                total_not_found += tunnel(
-                    playlist, args.source, args.destination, core_sessions
-                )
-        elif args.source == "apple":
-            for playlist in apple_lists:
-                total_not_found += tunnel(
-                    playlist, args.source, args.destination, core_sessions
-                )
-        report_sync_summary(total_not_found)
+    save_limits(destinations)
+    report_sync_summary(total_not_found, failedfile, run_id())
+    report_timings()
+    if args.metrics_out:
+        write_metrics(output(args, args.metrics_out))
+
+
+def duration(text):
+    # --deadline value in seconds, e.g "90", "45s", "30m" or "2h"
+    units = {"s": 1, "m": 60, "h": 3600}
+    try:
+        if text[-1:] in units:
+            return float(text[:-1]) * units[text[-1]]
+        return float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid duration: {text!r}") from None
 
 
 def options():
     parser = argparse.ArgumentParser(
-        description="Sound Tunnel. Move playlists back and forth between YTmusic, Spotify, Apple and Tidal"
+        description="Sound Tunnel. Move playlists back and forth between YTmusic, Spotify, Apple, Tidal and local files"
     )
     parser.add_argument(
         "-s",
         "--source",
         required=True,
-        help="Select source platform (spotify, apple, tidal or youtube) e.g -s spotify",
+        help="Select source platform (spotify, apple, tidal, youtube or file) e.g -s spotify",
     )
     parser.add_argument(
         "-d",
         "--destination",
-        help="Select destination platform (spotify,apple, tidal or youtube) e.g -d youtube",
+        nargs="+",
+        help="Select destination platforms (spotify, apple, tidal, youtube or file); the "
+        "source is read once for all of them e.g -d youtube or -d youtube,tidal,apple",
+    )
+
+    parser.add_argument(
+        "--metrics-out",
+        help="Write run metrics to a file, as JSON or as a Prometheus textfile "
+        "when the name ends in .prom e.g --metrics-out metrics.prom",
+    )
+
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Send a second copy of a search or read that is slower than usual "
+        "(its p95 so far) and use whichever answers first, adding at most 10%% "
+        "extra requests per platform",
+    )
+
+    parser.add_argument(
+        "--order",
+        choices=POLICIES,
+        default="listed",
+        help="Order of the playlists moved by -A or -P: as listed (default), "
+        "shortest first for early results, or largest first so a big playlist "
+        "doesn't finish alone at the end",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Move N playlists at once, sharing each platform's rate limit so "
+        "none of them sits idle while another playlist finishes (default: 1)",
+    )
+
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Split the playlists of -A or -P by name between N processes, "
+        "each with its share of every platform's rate limit (default: 1)",
+    )
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        metavar="I",
+        help="Only move the playlists of shard I (0 to N - 1) of --shards N, "
+        "e.g to spread a run over several machines; without it all N shards "
+        "are started here",
+    )
+
+    parser.add_argument(
+        "--deadline",
+        type=duration,
+        help="Stop starting new tracks after this long (e.g 45m or 2h), write "
+        f"what was matched so far and list the playlists left in {resumefile}",
+    )
+
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="pstats",
+        choices=["pstats", "collapsed"],
+        help="Profile authentication, listing and each playlist transfer. "
+        "'pstats' (default) records CPU time per function, 'collapsed' samples "
+        "wall-clock stacks of every thread, including time blocked on I/O. "
+        "With --parallel, playlists that start while another is profiled are "
+        "counted in its file rather than getting their own",
+    )
+    parser.add_argument(
+        "--profile-out",
+        default="profile",
+        help="Directory for --profile output, one file per phase (default: profile)",
     )
 
     group = parser.add_mutually_exclusive_group()
@@ -257,6 +407,14 @@ def options():
         action="store_true",
         help="Show user Playlists for Spotify, Tidal or Youtube",
     )
+    group.add_argument(
+        "--retry-failed",
+        nargs="?",
+        const="last",
+        metavar="RUN_ID",
+        help=f"Search again, more broadly, only for the tracks listed in {failedfile} "
+        "for this source and destination (default: the last run)",
+    )
     return parser.parse_args()
 
 
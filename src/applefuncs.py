@@ -1,23 +1,37 @@
+import base64
+import hashlib
 import json
-import re
+import os
 import sys
+import time
 from math import ceil
-from time import sleep
 
 import requests
-from tqdm import tqdm
 
-from config.config import applefile
-from src.mainfuncs import compare, message, what_to_move
+from config.config import apple_api, applecache, applefile, request_timeout
+from src.coalesce import shared_call
+from src.filelock import tmp_path
+from src.mainfuncs import compare, message, note_candidate
+from src.metrics import added, call, stage
+from src.normalize import featured_artist, track_string
+from src.providers import Provider
+from src.retry import get_json, retry_call, retry_write
+
+# The media user token carries no expiry, so a check is trusted for this long at most
+APPLE_AUTH_WINDOW = 12 * 60 * 60
 
 
 def apple_auth():
     try:
         with open(applefile) as f:
             cookies = json.load(f)
-        headers = apple_is_logged_in(
-            cookies["authorization"], cookies["media-user-token"]
-        )
+        bearer, media = cookies["authorization"], cookies["media-user-token"]
+        if apple_auth_cached(bearer, media):
+            headers = apple_headers(bearer, media)
+        else:
+            headers = apple_is_logged_in(bearer, media)
+            if headers:
+                save_apple_auth(bearer, media)
         if headers:
             message("a+", "Successfully Authenticated")
             return headers
@@ -27,9 +41,8 @@ def apple_auth():
     sys.exit(0)
 
 
-def apple_is_logged_in(bearer, media):
-    url = "https://amp-api.music.apple.com:443/v1/me/library/songs?limit=100&l=en-gb&platform=web"
-    headers = {
+def apple_headers(bearer, media):
+    return {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:102.0) Gecko/20100101 Firefox/102.0",
         "Accept": "*/*",
         "Accept-Language": "en-US,en;q=0.5",
@@ -43,19 +56,83 @@ def apple_is_logged_in(bearer, media):
         "Sec-Fetch-Site": "same-site",
         "Te": "trailers",
     }
-    r = requests.get(url, headers=headers)
+
+
+def apple_is_logged_in(bearer, media):
+    # The storefront is the smallest response that needs both tokens
+    url = f"{apple_api}/v1/me/storefront"
+    headers = apple_headers(bearer, media)
+    r = call(
+        "apple",
+        "auth check",
+        requests.get,
+        url,
+        headers=headers,
+        timeout=request_timeout,
+    )
     if r.status_code == 200:
         return headers
     return False
 
 
+def apple_token_expiry(bearer):
+    # Expiry timestamp from the developer token's JWT payload, None if unreadable
+    try:
+        payload = bearer.split()[-1].split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _apple_fingerprint(bearer, media):
+    # Ties the cached check to the tokens without writing them out a second time
+    return hashlib.sha256(f"{bearer}\n{media}".encode()).hexdigest()
+
+
+def apple_auth_cached(bearer, media):
+    # True while an earlier check of these tokens is still within its window
+    try:
+        with open(applecache) as f:
+            cached = json.load(f)
+        return (
+            cached["fingerprint"] == _apple_fingerprint(bearer, media)
+            and time.time() < cached["expires"]
+        )
+    except (OSError, KeyError, TypeError, ValueError):
+        return False
+
+
+def save_apple_auth(bearer, media, window=APPLE_AUTH_WINDOW):
+    # Remember a successful check until the token expires, at most `window` seconds
+    expires = time.time() + window
+    token_expiry = apple_token_expiry(bearer)
+    if token_expiry is not None:
+        expires = min(expires, token_expiry)
+    cached = {"fingerprint": _apple_fingerprint(bearer, media), "expires": expires}
+    tmp = tmp_path(applecache)
+    try:
+        with open(tmp, "w") as f:
+            json.dump(cached, f)
+        os.replace(tmp, applecache)
+    except OSError:
+        pass
+
+
 def appleapi_get_folder_info(folder_id, headers):
     """Get folder information by folder ID"""
-    url = f"https://amp-api.music.apple.com/v1/me/library/playlists/{folder_id}"
-    r = requests.get(url, headers=headers)
+    url = f"{apple_api}/v1/me/library/playlists/{folder_id}"
+    r = retry_call(
+        "apple",
+        "folder info",
+        get_json,
+        url,
+        headers=headers,
+        timeout=request_timeout,
+    )
 
     if r.status_code == 200:
-        data = r.json()
+        data = r.data
         if "data" in data and len(data["data"]) > 0:
             item = data["data"][0]
             # Apple Music doesn't always mark folders with folder=true
@@ -66,10 +143,17 @@ def appleapi_get_folder_info(folder_id, headers):
 
 
 def appleapi_user_playlists(headers):
-    url = "https://amp-api.music.apple.com/v1/me/library/playlists?include=parent"
-    r = requests.get(url, headers=headers)
+    url = f"{apple_api}/v1/me/library/playlists?include=parent"
+    r = retry_call(
+        "apple",
+        "playlists",
+        get_json,
+        url,
+        headers=headers,
+        timeout=request_timeout,
+    )
     if r.status_code == 200:
-        return r.json()
+        return r.data
     return {}
 
 
@@ -132,14 +216,22 @@ def apple_dest_check(apple_lists, apple, dest_playlist_name):
 
 
 def appleapi_create_playlist_folder(folder_name, headers):
-    url = "https://amp-api.music.apple.com:443/v1/me/library/playlists"
+    url = f"{apple_api}/v1/me/library/playlists"
     data = {"attributes": {"name": folder_name, "folder": True}}
-    r = requests.post(url, headers=headers, json=data)
+    r = retry_write(
+        "apple",
+        "create folder",
+        requests.post,
+        url,
+        headers=headers,
+        json=data,
+        timeout=request_timeout,
+    )
     return r.json()["data"][0]["id"]
 
 
 def appleapi_create_playlist(playlist_name, headers, parent_folder_id=None):
-    url = "https://amp-api.music.apple.com:443/v1/me/library/playlists"
+    url = f"{apple_api}/v1/me/library/playlists"
     data = {"attributes": {"name": playlist_name}}
     if parent_folder_id:
         data["relationships"] = {
@@ -147,92 +239,164 @@ def appleapi_create_playlist(playlist_name, headers, parent_folder_id=None):
                 "data": [{"id": parent_folder_id, "type": "library-playlist-folders"}]
             }
         }
-    r = requests.post(url, headers=headers, json=data)
+    r = retry_write(
+        "apple",
+        "create playlist",
+        requests.post,
+        url,
+        headers=headers,
+        json=data,
+        timeout=request_timeout,
+    )
     return r.json()["data"][0]["id"]
 
 
+def apple_track(song):
+    # Track string for an Apple Music library song
+    artist = []
+    artist.append(song["attributes"]["artistName"])
+    song_name = song["attributes"]["name"]
+    featured = featured_artist(song_name)
+    if featured is not None:
+        artist.append(featured)
+    album_name = song["attributes"]["albumName"]
+    artist = " ".join(artist)
+    return track_string(album_name, song_name, artist)
+
+
+def iter_apple_playlist_content(apple, source_id, page_size=100):
+    # Yields tracks on an Apple Music playlist a page at a time
+    for page in appleapi_iter_playlist_content(source_id, apple, page_size):
+        yield [apple_track(song) for song in page]
+
+
 def get_apple_playlist_content(apple, source_id):
-    playlist_content = appleapi_get_playlist_content(source_id, apple)
-    result = []
-    for song in playlist_content:
-        artist = []
-        artist.append(song["attributes"]["artistName"])
-        song_name = song["attributes"]["name"]
-        if "(feat. " in song_name:
-            artist_name = song_name.split("(feat. ")[1].split(")")[0]
-            artist.append(artist_name)
-        album_name = song["attributes"]["albumName"]
-        artist = " ".join(artist)
-        result.append(album_name + "&@#72" + song_name + "&@#72" + artist)
-    return result
+    return [
+        track
+        for page in iter_apple_playlist_content(apple, source_id)
+        for track in page
+    ]
 
 
-def appleapi_get_playlist_content(source_id, headers):
-    url = f"https://amp-api.music.apple.com:443/v1/me/library/playlists/{source_id}/tracks?l=en-GB"
-    r = requests.get(url, headers=headers)
-    if "errors" in r.json():
-        return []
-    total = r.json()["meta"]["total"]
-    return_data = r.json()["data"]
-    if total <= 100:
-        return return_data
-    total_requests = ceil(total / 100)
+def appleapi_iter_playlist_content(source_id, headers, page_size=100):
+    # Yields the raw song pages of a library playlist, page_size songs at a time
+    url = (
+        f"{apple_api}/v1/me/library/playlists/{source_id}/tracks"
+        f"?l=en-GB&limit={page_size}"
+    )
+    r = retry_call(
+        "apple",
+        "playlist items",
+        get_json,
+        url,
+        headers=headers,
+        timeout=request_timeout,
+    )
+    if r.data is None or "errors" in r.data:
+        return
+    total = r.data["meta"]["total"]
+    yield r.data["data"]
+    total_requests = ceil(total / page_size)
     for i in range(1, total_requests):
-        uri = url + f"&offset={i * 100}"
-        r = requests.get(uri, headers=headers)
-        return_data.extend(r.json()["data"])
-    return return_data
+        uri = url + f"&offset={i * page_size}"
+        r = retry_call(
+            "apple",
+            "playlist items",
+            get_json,
+            uri,
+            headers=headers,
+            timeout=request_timeout,
+        )
+        yield r.data["data"]
 
 
-def move_to_apple(apple, playlist_info, dest_id, playlist_name):
-    not_found = []
-    present_song = get_apple_playlist_content(apple, dest_id)
-    playlist_info = what_to_move(present_song, playlist_info)
-    try:
-        for i in tqdm(playlist_info, desc=f"Moving {playlist_name} to Apple Music"):
-            i = i.replace("&@#72", " ")
-            search = appleapi_music_search(i, apple)
-            if len(list(search["results"].keys())) == 0:
-                bk = i
-                i = re.sub(r"\(.*?\)", "", i)
-                search = appleapi_music_search(i, apple)
-                if len(list(search["results"].keys())) == 0:
-                    not_found.append(bk)
-                    continue
-            for song in search["results"]["song"]["data"]:
-                artist = []
-                artist.append(song["attributes"]["artistName"])
-                song_name = song["attributes"]["name"]
-                if "(feat. " in song_name:
-                    artist_name = song_name.split("(feat. ")[1].split(")")[0]
-                    artist.append(artist_name)
-                album_name = song["attributes"]["albumName"]
-                artist = " ".join(artist)
-                songid = song["id"]
-                found = album_name + " " + song_name + " " + artist
-                if compare(found, i):
-                    sleep(0.5)
-                    appleapi_add_playlist_item(dest_id, songid, apple)
-                    break
-            else:
-                not_found.append(i)
-        return not_found
-    except KeyboardInterrupt:
-        print("\n[!] Operation cancelled by user.")
-        sys.exit(0)
-    except Exception:
-        return not_found
+def appleapi_get_playlist_content(source_id, headers):
+    return [
+        song
+        for page in appleapi_iter_playlist_content(source_id, headers)
+        for song in page
+    ]
+
+
+def apple_query(apple, query, target, attempt=None):
+    # One catalog search, returning the id of the first result matching target
+    with stage("search"):
+        search = appleapi_music_search(query, apple)
+    songs = search.get("results", {}).get("song", {}).get("data", [])
+    for song in songs:
+        found = apple_track(song)
+        with stage("compare"):
+            matched = compare(found, target)
+        if matched:
+            return song["id"]
+        note_candidate(attempt, found, target)
+    return None
 
 
 def appleapi_music_search(query, headers):
-    url = f"https://amp-api.music.apple.com:443/v1/catalog/ng/search?term={query}&l=en-gb&platform=web&types=songs&limit=5&relate%5Beditorial-items%5D=contents&include[editorial-items]=contents&include[albums]=artists&include[songs]=artists&include[music-videos]=artists&extend=artistUrl&fields[artists]=url%2Cname%2Cartwork%2Chero&fields%5Balbums%5D=artistName%2CartistUrl%2Cartwork%2CcontentRating%2CeditorialArtwork%2Cname%2CplayParams%2CreleaseDate%2Curl&with=serverBubbles%2ClyricHighlights&art%5Burl%5D=c%2Cf&omit%5Bresource%5D=autos"
-    r = requests.get(url, headers=headers)
-    return r.json()
+    url = f"{apple_api}/v1/catalog/ng/search?term={query}&l=en-gb&platform=web&types=songs&limit=5&relate%5Beditorial-items%5D=contents&include[editorial-items]=contents&include[albums]=artists&include[songs]=artists&include[music-videos]=artists&extend=artistUrl&fields[artists]=url%2Cname%2Cartwork%2Chero&fields%5Balbums%5D=artistName%2CartistUrl%2Cartwork%2CcontentRating%2CeditorialArtwork%2Cname%2CplayParams%2CreleaseDate%2Curl&with=serverBubbles%2ClyricHighlights&art%5Burl%5D=c%2Cf&omit%5Bresource%5D=autos"
+    r = shared_call(
+        "apple",
+        "search",
+        query,
+        get_json,
+        url,
+        headers=headers,
+        timeout=request_timeout,
+    )
+    # An error status is a failed search, not a search without results
+    r.raise_for_status()
+    return r.data
 
 
 def appleapi_add_playlist_item(dest_id, songid, headers):
-    url = (
-        f"https://amp-api.music.apple.com:443/v1/me/library/playlists/{dest_id}/tracks"
+    appleapi_add_playlist_items(dest_id, [songid], headers)
+
+
+def appleapi_add_playlist_items(dest_id, songids, headers):
+    url = f"{apple_api}/v1/me/library/playlists/{dest_id}/tracks"
+    data = {"data": [{"id": songid, "type": "songs"} for songid in songids]}
+    return retry_write(
+        "apple",
+        "add items",
+        requests.post,
+        url,
+        headers=headers,
+        json=data,
+        timeout=request_timeout,
     )
-    data = {"data": [{"id": songid, "type": "songs"}]}
-    requests.post(url, headers=headers, json=data)
+
+
+class AppleProvider(Provider):
+    name = "apple"
+    code = "a"
+    label = "Apple Music"
+    batch_size = 100
+    page_size = 100
+    concurrency = 2
+    max_concurrency = 8
+    rate_limit = 5.0
+
+    def auth(self):
+        self.session = apple_auth()
+
+    def list_playlists(self):
+        apple_lists, self.folders = get_apple_playlists(self.session)
+        return apple_lists
+
+    def read_id(self, playlist_id):
+        return get_apple_playlist_content(self.session, playlist_id)
+
+    def pages_id(self, playlist_id):
+        return iter_apple_playlist_content(self.session, playlist_id, self.page_size)
+
+    def query(self, query, target, attempt=None):
+        return apple_query(self.session, query, target, attempt)
+
+    def add(self, dest_id, song_ids):
+        r = appleapi_add_playlist_items(dest_id, song_ids, self.session)
+        # One song Apple rejects fails the whole request
+        return [] if added(r) else list(song_ids)
+
+    def create(self, playlist_name, source=None):
+        return apple_dest_check(self.playlists, self.session, playlist_name)
@@ -0,0 +1,48 @@
+import threading
+
+from src.metrics import count
+from src.retry import retry_call
+
+# Requests in flight, keyed by (provider, operation, key)
+_lock = threading.Lock()
+_inflight = {}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def shared_call(provider, op, key, fn, *args, **kwargs):
+    """
+    retry_call() for read-only requests such as searches.
+
+    Concurrent callers passing the same provider, op and key share one request:
+    the first sends it and the others wait for its result, or its exception.
+    Only requests still in flight are shared, a later identical call is sent
+    again. Callers that piggybacked are counted as "coalesced".
+    """
+    flight_key = (provider, op, key)
+    with _lock:
+        flight = _inflight.get(flight_key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[flight_key] = _Flight()
+    if not leader:
+        count(provider, op, "coalesced")
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = retry_call(provider, op, fn, *args, **kwargs)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            del _inflight[flight_key]
+        flight.done.set()
@@ -0,0 +1,98 @@
+import json
+import os
+import secrets
+from datetime import datetime, timezone
+
+from config.config import failedfile
+from src.filelock import locked
+from src.normalize import strip_parentheticals, track_fields, transliterate
+
+_run_id = None
+
+
+def run_id():
+    # Identifier shared by every failure recorded in this run, and by every
+    # shard of a --shards run, which hands it down to them
+    global _run_id
+    if _run_id is None:
+        _run_id = os.environ.get("SOUND_TUNNEL_RUN_ID")
+    if _run_id is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        _run_id = f"{stamp}-{secrets.token_hex(3)}"
+    return _run_id
+
+
+def log_failures(playlist, misses, source, dest, path=None):
+    """
+    Append one JSON line per track that couldn't be moved.
+
+    misses are the attempt dicts returned by transfer(), holding the track, the
+    queries tried, the closest rejected candidate with its score and the reason.
+    """
+    if not misses:
+        return
+    time = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    lines = []
+    for miss in misses:
+        record = {
+            "run_id": run_id(),
+            "time": time,
+            "source": source,
+            "destination": dest,
+            "playlist": playlist,
+            "track": miss["track"],
+            **track_fields(miss["track"]),
+            "queries": miss.get("queries", []),
+            "best": miss.get("best"),
+            "score": miss.get("score"),
+            "reason": miss.get("reason", "not found"),
+            "error": miss.get("error"),
+        }
+        lines.append(json.dumps(record) + "\n")
+    # One locked write, so lines from other processes (--shards) can't interleave
+    path = path or failedfile
+    with locked(path), open(path, "a") as file:
+        file.write("".join(lines))
+
+
+def load_failures(source, dest, wanted_run=None, path=None):
+    """
+    Failure records of one run for a source and destination, oldest first.
+
+    Without wanted_run the most recent run that moved from source to dest is used.
+    """
+    path = path or failedfile
+    try:
+        with locked(path), open(path) as file:
+            records = [json.loads(line) for line in file if line.strip()]
+    except FileNotFoundError:
+        return []
+    records = [
+        record
+        for record in records
+        if record["source"] == source and record["destination"] == dest
+    ]
+    if wanted_run is None and records:
+        wanted_run = records[-1]["run_id"]
+    return [record for record in records if record["run_id"] == wanted_run]
+
+
+def retry_queries(dest, track):
+    """
+    Queries for --retry-failed, broader than any the first pass sent: the
+    title alone, transliterated, then with the album instead of the artist.
+    Results are still scored against the whole track.
+    """
+    fields = track_fields(track)
+    bare = strip_parentheticals(fields["title"])
+    queries = [bare, transliterate(bare), f"{bare} {fields['album']}"]
+    tried = set(dest.plan_queries(track))
+    queries = (query.strip() for query in queries)
+    return [query for query in dict.fromkeys(queries) if query and query not in tried]
+
+
+def broad_search(dest, track, attempt=None):
+    # Search used by --retry-failed in place of dest.search
+    from src.queries import cascade
+
+    return cascade(dest, track, attempt, retry_queries(dest, track))
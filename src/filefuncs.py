@@ -0,0 +1,194 @@
+import csv
+import json
+import os
+import re
+
+from config.config import playlistdir, playlistformat
+from src.filelock import tmp_path
+from src.mainfuncs import display_playlists, message
+from src.normalize import track_fields, track_string
+from src.providers import Provider
+
+FORMATS = ("json", "csv", "m3u")
+FIELDS = ("album", "title", "artist")
+
+
+def file_name(playlist_name):
+    # Playlist name as a file name, without path separators or reserved characters
+    return re.sub(r'[\\/:*?"<>|]', "_", playlist_name).strip() or "playlist"
+
+
+def stored_name(path):
+    # The playlist name a JSON or M3U file was written with, None when it has
+    # none (CSV, or a file from elsewhere)
+    ext = os.path.splitext(path)[1][1:].lower()
+    try:
+        with open(path, encoding="utf-8") as file:
+            if ext == "json":
+                data = json.load(file)
+                return (data.get("name") if isinstance(data, dict) else None) or None
+            if ext == "m3u":
+                for line in file:
+                    line = line.strip()
+                    if line.startswith("#PLAYLIST:"):
+                        return line[len("#PLAYLIST:") :] or None
+                    if line and not line.startswith("#"):
+                        return None
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+def get_file_playlists(directory):
+    # {playlist name: path} of the playlist files in directory. File names lose
+    # characters such as "/", so the name stored in the file wins
+    playlists = {}
+    if not os.path.isdir(directory):
+        return playlists
+    for entry in sorted(os.listdir(directory)):
+        name, ext = os.path.splitext(entry)
+        if ext[1:].lower() in FORMATS:
+            path = os.path.join(directory, entry)
+            playlists.setdefault(stored_name(path) or name, path)
+    return playlists
+
+
+def _m3u_track(info, album):
+    # "#EXTINF:-1,Artist - Title" or a bare "Artist - Title" entry
+    artist, _, title = info.rpartition(" - ")
+    return track_string(album, title.strip(), artist.strip())
+
+
+def iter_m3u(file):
+    album = ""
+    info = None
+    for line in file:
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            info = line.split(",", 1)[1] if "," in line else ""
+        elif line.startswith("#EXTALB:"):
+            album = line[len("#EXTALB:") :]
+        elif line and not line.startswith("#"):
+            # Plain M3U lists file paths, named "Artist - Title.mp3" at best
+            if info is None:
+                info = os.path.splitext(os.path.basename(line))[0]
+            yield _m3u_track(info, album)
+            album, info = "", None
+
+
+def iter_file_tracks(path):
+    # Yields the tracks of a playlist file as they are read
+    ext = os.path.splitext(path)[1][1:].lower()
+    with open(path, newline="" if ext == "csv" else None, encoding="utf-8") as file:
+        if ext == "json":
+            for song in json.load(file).get("tracks", []):
+                yield track_string(*(song.get(field, "") for field in FIELDS))
+        elif ext == "csv":
+            for row in csv.DictReader(file):
+                yield track_string(*(row.get(field) or "" for field in FIELDS))
+        else:
+            yield from iter_m3u(file)
+
+
+def write_file_tracks(path, tracks, playlist_name):
+    # Add tracks to a playlist file, creating it when missing
+    ext = os.path.splitext(path)[1][1:].lower()
+    songs = [track_fields(track) for track in tracks]
+    exists = os.path.exists(path)
+    if ext == "json":
+        # Rewritten whole, then renamed so a cancelled run can't truncate it
+        data = {"name": playlist_name, "tracks": []}
+        if exists:
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+        data["tracks"] += songs
+        tmp = tmp_path(path)
+        with open(tmp, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+        return
+    with open(
+        path, "a", newline="" if ext == "csv" else None, encoding="utf-8"
+    ) as file:
+        if ext == "csv":
+            writer = csv.DictWriter(file, FIELDS)
+            if not exists:
+                writer.writeheader()
+            writer.writerows(songs)
+            return
+        if not exists:
+            file.write(f"#EXTM3U\n#PLAYLIST:{playlist_name}\n")
+        for song in songs:
+            entry = f"{song['artist']} - {song['title']}"
+            file.write(f"#EXTINF:-1,{entry}\n#EXTALB:{song['album']}\n{entry}\n")
+
+
+class FileProvider(Provider):
+    """
+    Playlists kept as local JSON, CSV or M3U files, one per playlist.
+
+    Reading one needs no network at all, so a library exported once can be
+    moved to several platforms later. As a destination tracks are written as
+    they come, without searching.
+    """
+
+    name = "file"
+    code = "f"
+    label = "Files"
+    batch_size = 1000
+    page_size = 1000
+    rate_limit = 0
+
+    def __init__(self, directory=None, fmt=None):
+        super().__init__()
+        self.directory = directory or playlistdir
+        self.format = fmt or playlistformat
+        # Playlist name of each file written to, stored in the files it creates
+        self.names = {}
+        if self.format not in FORMATS:
+            message("f-", f"Unknown playlist format {self.format}, use json")
+            self.format = "json"
+
+    def auth(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def list_playlists(self):
+        return get_file_playlists(self.directory)
+
+    def show_playlists(self):
+        display_playlists(self.playlists)
+
+    def read_id(self, playlist_id):
+        if not os.path.exists(playlist_id):
+            return []
+        return list(iter_file_tracks(playlist_id))
+
+    def pages_id(self, playlist_id):
+        # One read of the file, handed on page_size tracks at a time
+        page = []
+        for track in iter_file_tracks(playlist_id):
+            page.append(track)
+            if len(page) == self.page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def search(self, track, attempt=None):
+        # A file takes tracks as they are, the track string is its own id
+        return track
+
+    def add(self, dest_id, song_ids):
+        write_file_tracks(dest_id, song_ids, self.names.get(dest_id, ""))
+        return []
+
+    def create(self, playlist_name, source=None):
+        if playlist_name in self.playlists:
+            path = self.playlists[playlist_name]
+        else:
+            path = os.path.join(
+                self.directory, f"{file_name(playlist_name)}.{self.format}"
+            )
+            message("f+", f"Writing {playlist_name} to {path}")
+        self.names[path] = playlist_name
+        return path
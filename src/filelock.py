@@ -0,0 +1,40 @@
+import os
+import sys
+from contextlib import contextmanager
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def locked(path):
+    """
+    Hold an exclusive lock on path + ".lock" while the block runs.
+
+    Several processes (e.g --shards) append to and rewrite the same files, the
+    lock keeps their reads and writes from interleaving.
+    """
+    lock_path = f"{path}.lock"
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    with open(lock_path, "a+b") as file:
+        if sys.platform == "win32":
+            # Locks the first byte, msvcrt retries for up to 10 seconds
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def tmp_path(path):
+    # A temporary name next to path that no other process writes to
+    return f"{path}.{os.getpid()}.tmp"
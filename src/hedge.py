@@ -0,0 +1,96 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.metrics import call, count, latency
+
+# Latency samples an endpoint needs before it is hedged, and how often its
+# p95 is worked out again
+MIN_SAMPLES = 20
+REFRESH = 50
+
+# Most duplicates per request actually sent to a provider, 0 turns hedging off
+_ratio = 0.0
+_lock = threading.Lock()
+_sent = {}
+_hedges = {}
+_thresholds = {}
+_pool = None
+
+
+def enable_hedging(ratio=0.1):
+    # Called by main for --hedge
+    global _ratio
+    _ratio = ratio
+
+
+def reset():
+    global _ratio
+    with _lock:
+        _ratio = 0.0
+        _sent.clear()
+        _hedges.clear()
+        _thresholds.clear()
+
+
+def _threshold(provider, op):
+    # The endpoint's p95 in seconds, None until there are enough samples
+    key = (provider, op)
+    seconds, samples = _thresholds.get(key, (None, 0))
+    if seconds is None or samples + REFRESH <= _sent.get(key, 0):
+        p95, samples = latency(provider, op, 95)
+        seconds = p95 if samples >= MIN_SAMPLES else None
+        _thresholds[key] = (seconds, samples)
+    return seconds
+
+
+def _may_hedge(provider):
+    # Spend the provider's hedge budget, False once it is used up
+    with _lock:
+        if _hedges.get(provider, 0) + 1 > _ratio * _sent.get(provider, 0):
+            return False
+        _hedges[provider] = _hedges.get(provider, 0) + 1
+        return True
+
+
+def _executor():
+    global _pool
+    with _lock:
+        if _pool is None:
+            # Every hedged request runs here, so size it for many searchers
+            _pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix="hedge")
+        return _pool
+
+
+def hedged_call(provider, op, fn, *args, **kwargs):
+    """
+    call() for idempotent requests, duplicated when it runs long.
+
+    Once a request has taken longer than its endpoint's p95, a second copy is
+    sent and whichever answers first is used. Duplicates are capped at
+    enable_hedging()'s ratio of the requests sent to each provider.
+    """
+    with _lock:
+        hedging = _ratio > 0
+        if hedging:
+            _sent[provider] = _sent.get(provider, 0) + 1
+            _sent[(provider, op)] = _sent.get((provider, op), 0) + 1
+            threshold = _threshold(provider, op)
+    if not hedging or threshold is None:
+        return call(provider, op, fn, *args, **kwargs)
+
+    pool = _executor()
+    pending = {pool.submit(call, provider, op, fn, *args, **kwargs)}
+    done, pending = wait(pending, timeout=threshold)
+    if not done and _may_hedge(provider):
+        count(provider, op, "hedged")
+        pending.add(pool.submit(call, provider, op, fn, *args, **kwargs))
+    errors = []
+    while True:
+        for future in done:
+            if future.exception() is None:
+                # The slower copy is left to finish, its answer is dropped
+                return future.result()
+            errors.append(future.exception())
+        if not pending:
+            raise errors[0]
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
@@ -1,6 +1,10 @@
-import json
 from difflib import SequenceMatcher
 
+from src.normalize import flatten, normalize
+
+# Least similarity for two song infos to count as the same song
+MATCH_THRESHOLD = 0.45
+
 
 def message(bit, msg):
     code = bit[1]
@@ -14,6 +18,8 @@ def message(bit, msg):
         output = output + "Tidal: "
     elif plat.lower() == "a":
         output = output + "Apple: "
+    elif plat.lower() == "f":
+        output = output + "File: "
     output = output + msg
     print(output)
 
@@ -49,27 +55,35 @@ def confirm_playlist_exist(source_playlist_name, plat_list, platform=""):
     return None
 
 
-def what_to_move(old, new):
-    return list(set(new) - set(old))
+def similarity(first, second):
+    # Share of the two song infos that match, between 0 and 1, once both are
+    # normalize()d so accents, case and version tags don't count against them
+    return SequenceMatcher(None, normalize(first), normalize(second)).ratio()
 
 
 def compare(first, second):
     # Compare 2 song info to make sure it's the same song
-    match = SequenceMatcher(None, first, second).ratio()
     # if match is less than 45%, not a match
-    return match > 0.45
+    return similarity(first, second) > MATCH_THRESHOLD
+
+
+def note_query(attempt, query):
+    # Record a search query for the failure log
+    if attempt is not None:
+        attempt.setdefault("queries", []).append(query)
 
 
-def write_to_file(play_name, songs, source, dest):
-    # Write not found songs to file
-    key = f"{source}->{dest} '{play_name}'"
-    content = {key: songs}
-    with open("notfound.txt", "a") as file:
-        file.write(json.dumps(content))
-        file.write("\n")
+def note_candidate(attempt, found, query):
+    # Keep the closest rejected search result for the failure log
+    if attempt is None:
+        return
+    score = round(similarity(found, query), 3)
+    if score > attempt.get("score", -1.0):
+        attempt["best"] = flatten(found)
+        attempt["score"] = score
 
 
-def report_sync_summary(total_not_found):
+def report_sync_summary(total_not_found, failed_log="failed.jsonl", run_id=None):
     # Report sync summary at the end
     if total_not_found == 0:
         print(
@@ -78,5 +92,6 @@ def report_sync_summary(total_not_found):
     else:
         print(f"\n[!] Sync completed. {total_not_found} track(s) could not be found.")
         print(
-            "[i] Check 'notfound.txt' for details about tracks that couldn't be transferred."
+            f"[i] Check '{failed_log}' for details about tracks that couldn't be "
+            f"transferred, or retry just those with --retry-failed {run_id or ''}".rstrip()
         )
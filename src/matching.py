@@ -0,0 +1,148 @@
+import heapq
+import os
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from itertools import chain
+from math import ceil
+
+from src.mainfuncs import MATCH_THRESHOLD
+from src.normalize import SEPARATOR, normalize, track_fields
+
+# Fewer comparisons than this are scored in this process, starting workers
+# would take longer than the scoring itself
+MIN_PARALLEL = 20000
+# Chunks handed to each worker, enough to even out uneven candidate lists
+CHUNKS_PER_WORKER = 4
+# Characters per n-gram of the track index
+GRAM = 3
+# Trigrams in more postings than this (or 2% of the index) are left out of
+# candidates() when the track has enough rarer ones
+RARE = 100
+
+
+def best_match(track, candidates, threshold=MATCH_THRESHOLD):
+    """
+    (index, score) of the candidate most similar to track, None when none is
+    above threshold. Scores are similarity(candidate, track); ties keep the
+    first candidate.
+    """
+    # SequenceMatcher caches what it learns about its second sequence, so the
+    # track goes there once and only the candidate changes
+    matcher = SequenceMatcher(None, "", normalize(track))
+    best, best_score = None, threshold
+    for index, candidate in enumerate(candidates):
+        matcher.set_seq1(normalize(candidate))
+        # Cheap upper bounds first, most candidates can't beat the best so far
+        if matcher.real_quick_ratio() <= best_score:
+            continue
+        if matcher.quick_ratio() <= best_score:
+            continue
+        score = matcher.ratio()
+        if score > best_score:
+            best, best_score = index, score
+    if best is None:
+        return None
+    return best, best_score
+
+
+def _score_pair(pair):
+    track, candidates = pair
+    return best_match(track, candidates)
+
+
+def best_matches(pairs, workers=None):
+    """
+    best_match() for many (track, candidates) pairs, in order.
+
+    Large batches, such as a whole library to match, are scored on a process
+    pool in a few chunks per worker. A candidate list shared by several pairs
+    is pickled once per chunk rather than once per pair.
+    """
+    pairs = list(pairs)
+    workers = workers or os.cpu_count() or 1
+    comparisons = sum(len(candidates) for _, candidates in pairs)
+    if workers <= 1 or len(pairs) <= 1 or comparisons < MIN_PARALLEL:
+        return [_score_pair(pair) for pair in pairs]
+    # Imported here so that every run (providers keep a TrackIndex) doesn't pay
+    # for multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = min(workers, len(pairs))
+    chunksize = ceil(len(pairs) / (workers * CHUNKS_PER_WORKER))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_score_pair, pairs, chunksize=chunksize))
+
+
+def index_text(track):
+    # Title and artist as normalize() keys
+    fields = track_fields(track)
+    return normalize(f"{fields['title']}{SEPARATOR}{fields['artist']}")
+
+
+def trigrams(text):
+    # Padded so the first and last letters of a word count as much as the rest
+    text = f" {text} "
+    return {text[i : i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class TrackIndex:
+    """
+    Character trigram index over the title and artist of tracks already
+    fetched, e.g a destination library, to match against it without a search
+    request per track.
+
+    candidates() ranks tracks by the trigrams they share with the one looked
+    up, lookup() then checks the best of them with the usual matcher. Tracks
+    can be added at any time, including while other threads look up.
+    """
+
+    def __init__(self, tracks=()):
+        self._postings = defaultdict(list)
+        self._tracks = []
+        self._values = []
+        self._sizes = []
+        for track in tracks:
+            self.add(track)
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def add(self, track, value=None):
+        # value is handed back by lookup(), e.g the track's id on the platform
+        grams = trigrams(index_text(track))
+        self._tracks.append(track)
+        self._values.append(value)
+        self._sizes.append(len(grams))
+        position = len(self._tracks) - 1
+        for gram in grams:
+            self._postings[gram].append(position)
+
+    def candidates(self, track, k=10):
+        # Positions of the k tracks sharing the most trigrams, best first
+        grams = trigrams(index_text(track))
+        postings = [self._postings[gram] for gram in grams if gram in self._postings]
+        # Grams most tracks share say little and cost the most to count, only
+        # the rarest ones are counted once there are enough of them
+        postings.sort(key=len)
+        common = max(RARE, len(self._tracks) // 50)
+        rare = [posting for posting in postings if len(posting) <= common]
+        shared = Counter(chain.from_iterable(rare if len(rare) >= 3 else postings))
+        sizes = self._sizes
+
+        def dice(item):
+            position, count = item
+            return 2 * count / (len(grams) + sizes[position])
+
+        return [position for position, _ in heapq.nlargest(k, shared.items(), dice)]
+
+    def lookup(self, track, k=10):
+        """
+        (track, value) of the indexed track that matches, None when none of
+        the top k candidates passes compare().
+        """
+        positions = self.candidates(track, k)
+        match = best_match(track, [self._tracks[position] for position in positions])
+        if match is None:
+            return None
+        position = positions[match[0]]
+        return self._tracks[position], self._values[position]
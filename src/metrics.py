@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from math import ceil
+from time import perf_counter
+
+from src.filelock import tmp_path
+
+# Samples are kept for the whole run, keyed by (provider, operation) for API
+# calls and by name for tunnel() stages
+_lock = threading.Lock()
+_calls = defaultdict(list)
+_stages = defaultdict(list)
+_counters = defaultdict(int)
+
+
+def reset():
+    with _lock:
+        _calls.clear()
+        _stages.clear()
+        _counters.clear()
+
+
+def status_of(obj):
+    # requests responses carry status_code, spotipy errors http_status and
+    # requests errors the response they were raised for
+    for target in (obj, getattr(obj, "response", None)):
+        for attr in ("status_code", "http_status", "status"):
+            status = getattr(target, attr, None)
+            if isinstance(status, int):
+                return status
+    return None
+
+
+def added(response):
+    # Whether a write request went through, going by its HTTP status
+    status = status_of(response)
+    return status is None or 200 <= status < 300
+
+
+def record(provider, op, seconds, status=None):
+    key = (provider, op)
+    with _lock:
+        _calls[key].append(seconds)
+        if status == 429:
+            _counters[key + ("throttled",)] += 1
+        elif status is not None and status >= 500:
+            _counters[key + ("errors",)] += 1
+
+
+def count(provider, op, name, amount=1):
+    # Bump a per-call counter such as "retries" or "errors"
+    with _lock:
+        _counters[(provider, op, name)] += amount
+
+
+def call(provider, op, fn, *args, **kwargs):
+    # Run a provider API call, timing it and recording its HTTP status
+    start = perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        status = status_of(e)
+        record(provider, op, perf_counter() - start, status)
+        if status is None:
+            count(provider, op, "errors")
+        raise
+    record(provider, op, perf_counter() - start, status_of(result))
+    return result
+
+
+@contextmanager
+def stage(name):
+    # Time a tunnel() stage such as "source read" or "compare"
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        with _lock:
+            _stages[name].append(elapsed)
+
+
+def percentile(samples, q):
+    # Nearest-rank percentile of an unsorted list
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def latency(provider, op, q):
+    # q-th percentile of an API call's latency so far and its number of samples
+    with _lock:
+        samples = list(_calls.get((provider, op), ()))
+    return percentile(samples, q), len(samples)
+
+
+def _describe(samples):
+    return {
+        "count": len(samples),
+        "total": sum(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+    }
+
+
+def summary():
+    with _lock:
+        calls = {key: list(samples) for key, samples in _calls.items()}
+        stages = {name: list(samples) for name, samples in _stages.items()}
+        counters = dict(_counters)
+    result = {"calls": [], "stages": []}
+    for (provider, op), samples in sorted(calls.items()):
+        entry = {"provider": provider, "op": op, **_describe(samples)}
+        for name in ("retries", "throttled", "errors", "coalesced", "hedged"):
+            entry[name] = counters.get((provider, op, name), 0)
+        result["calls"].append(entry)
+    for name, samples in stages.items():
+        result["stages"].append({"stage": name, **_describe(samples)})
+    return result
+
+
+def report_timings():
+    # Print per-stage and per-call timings at the end of a run
+    data = summary()
+    if not data["calls"] and not data["stages"]:
+        return
+    print(
+        f"\n{'stage':<22}{'count':>8}{'total s':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    )
+    for row in data["stages"]:
+        print(
+            f"{row['stage']:<22}{row['count']:>8}{row['total']:>10.2f}"
+            f"{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}"
+            f"{row['p99'] * 1000:>10.1f}"
+        )
+    print(
+        f"\n{'api call':<22}{'count':>8}{'total s':>10}{'p50 ms':>10}"
+        f"{'p95 ms':>10}{'p99 ms':>10}{'retries':>9}{'429s':>6}{'errors':>8}"
+        f"{'shared':>8}{'hedged':>8}"
+    )
+    for row in data["calls"]:
+        name = f"{row['provider']}.{row['op']}"
+        print(
+            f"{name:<22}{row['count']:>8}{row['total']:>10.2f}"
+            f"{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}"
+            f"{row['p99'] * 1000:>10.1f}{row['retries']:>9}"
+            f"{row['throttled']:>6}{row['errors']:>8}{row['coalesced']:>8}"
+            f"{row['hedged']:>8}"
+        )
+
+
+def _prometheus(data):
+    lines = [
+        "# HELP sound_tunnel_api_request_seconds Provider API call latency",
+        "# TYPE sound_tunnel_api_request_seconds summary",
+    ]
+    for row in data["calls"]:
+        labels = f'provider="{row["provider"]}",op="{row["op"]}"'
+        for q in ("50", "95", "99"):
+            lines.append(
+                f'sound_tunnel_api_request_seconds{{{labels},quantile="0.{q}"}} '
+                f"{row['p' + q]:.6f}"
+            )
+        lines.append(
+            f"sound_tunnel_api_request_seconds_sum{{{labels}}} {row['total']:.6f}"
+        )
+        lines.append(
+            f"sound_tunnel_api_request_seconds_count{{{labels}}} {row['count']}"
+        )
+    for name in ("retries", "throttled", "errors", "coalesced", "hedged"):
+        lines.append(f"# TYPE sound_tunnel_api_{name}_total counter")
+        for row in data["calls"]:
+            labels = f'provider="{row["provider"]}",op="{row["op"]}"'
+            lines.append(f"sound_tunnel_api_{name}_total{{{labels}}} {row[name]}")
+    lines += [
+        "# HELP sound_tunnel_stage_seconds Time spent in each tunnel() stage",
+        "# TYPE sound_tunnel_stage_seconds summary",
+    ]
+    for row in data["stages"]:
+        labels = f'stage="{row["stage"]}"'
+        for q in ("50", "95", "99"):
+            lines.append(
+                f'sound_tunnel_stage_seconds{{{labels},quantile="0.{q}"}} '
+                f"{row['p' + q]:.6f}"
+            )
+        lines.append(f"sound_tunnel_stage_seconds_sum{{{labels}}} {row['total']:.6f}")
+        lines.append(f"sound_tunnel_stage_seconds_count{{{labels}}} {row['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    # Write the run's metrics as JSON, or as a Prometheus textfile for *.prom
+    data = summary()
+    if path.endswith(".prom"):
+        content = _prometheus(data)
+    else:
+        content = json.dumps(data, indent=2)
+    # Write then rename so collectors never read a half written file
+    tmp = tmp_path(path)
+    with open(tmp, "w") as file:
+        file.write(content)
+    os.replace(tmp, path)
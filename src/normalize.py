@@ -0,0 +1,118 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+# Separator between the album, title and artist of a track string
+SEPARATOR = "&@#72"
+
+# Results kept per cached function, the same titles and artists come back on
+# every query, candidate and retry of a run
+CACHE_SIZE = 1 << 16
+
+# Letters NFKD doesn't decompose into an ASCII base
+_FOLD = str.maketrans(
+    {"ß": "ss", "æ": "ae", "Æ": "AE", "ø": "o", "Ø": "O", "đ": "d", "Đ": "D"}
+)
+_FOLD.update(str.maketrans({"ł": "l", "Ł": "L", "œ": "oe", "Œ": "OE", "þ": "th"}))
+
+_BRACKETS = re.compile(r"\s*[\(\[].*?[\)\]]")
+_DASH_SUFFIX = re.compile(r"\s+-\s+.*$")
+_FEATURED = re.compile(r"\(feat\. ([^)]*)")
+_COLLABORATION = re.compile(r",|&| feat\.? | ft\.? | x | with ")
+# Bracketed credits and version tags, "(feat. X)", "[Live]", "(2011 Remaster)"
+_TAG_WORDS = (
+    r"feat|ft|featuring|with|remaster(?:ed)?|live|demo|mono|stereo|"
+    r"(?:radio|single|album|extended) (?:edit|version|mix)|bonus track|explicit|"
+    r"clean|deluxe"
+)
+_TAGS = re.compile(rf"\s*[\(\[][^\)\]]*\b(?:{_TAG_WORDS})\b[^\)\]]*[\)\]]", re.I)
+_DASH_TAGS = re.compile(rf"\s+-\s+[^-]*\b(?:{_TAG_WORDS}|edit|version|mix)\b.*$", re.I)
+_WORDS = re.compile(r"\w+")
+# Tags telling recordings of a song apart, unlike feat. credits or "explicit"
+_VERSIONS = re.compile(
+    r"\b(remaster|live|demo|mono|acoustic|instrumental|remix|edit|version)(?:ed)?\b",
+    re.I,
+)
+
+
+def track_string(album, title, artist):
+    # The album, title and artist of a track as one string, what every
+    # provider reads playlists into
+    return f"{album}{SEPARATOR}{title}{SEPARATOR}{artist}"
+
+
+def track_fields(track):
+    # Split a track string back into its album, title and artist
+    parts = track.split(SEPARATOR)
+    if len(parts) != 3:
+        return {"album": "", "title": track, "artist": ""}
+    album, title, artist = parts
+    return {"album": album, "title": title, "artist": artist}
+
+
+def flatten(track):
+    # Track string as plain words, what searches and compare() work with
+    return track.replace(SEPARATOR, " ")
+
+
+def featured_artist(song_name):
+    # "Song (feat. Artist)" -> "Artist", None without a credit
+    match = _FEATURED.search(song_name)
+    return match.group(1) if match else None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def drop_brackets(title):
+    # "Song (Remastered 2011) [Live]" -> "Song"
+    return _BRACKETS.sub("", title).strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def strip_parentheticals(title):
+    # "Song (Remastered 2011) [Live] - Radio Edit" -> "Song"
+    return _DASH_SUFFIX.sub("", _BRACKETS.sub("", title)).strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def primary_artist(artist):
+    # First credited artist when the credit spells out a collaboration
+    return _COLLABORATION.split(artist, maxsplit=1)[0].strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def transliterate(text):
+    # Fold accents and ligatures to plain ASCII, "Beyoncé" -> "Beyonce"
+    text = unicodedata.normalize("NFKD", text.translate(_FOLD))
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def track_key(track):
+    """
+    Identity of a track across platforms: accents folded, lower case and
+    without punctuation, field by field. Unlike normalize() version tags stay,
+    "Halo" and "Halo (Live)" are different tracks.
+    """
+    fields = (transliterate(field).lower() for field in track.split(SEPARATOR))
+    return SEPARATOR.join(" ".join(_WORDS.findall(field)) for field in fields)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def versions(title):
+    # The version tags normalize() drops, "Halo (Live) - 2011 Remaster" ->
+    # {"live", "remaster"}
+    return frozenset(tag.lower() for tag in _VERSIONS.findall(transliterate(title)))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize(text):
+    """
+    Comparison key of a title, an artist or a whole track string: accents
+    folded, lower case, without feat. credits, remaster/live/edit tags and
+    punctuation. "Halo (Live) - 2011 Remaster" -> "halo"
+    """
+    if SEPARATOR in text:
+        fields = (normalize(field) for field in text.split(SEPARATOR))
+        return " ".join(field for field in fields if field)
+    text = _DASH_TAGS.sub("", _TAGS.sub("", text))
+    return " ".join(_WORDS.findall(transliterate(text).lower()))
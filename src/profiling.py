@@ -0,0 +1,160 @@
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter, process_time
+
+# Set by configure_profiling() from main.py's --profile / --profile-out options
+_settings = {"format": None, "out": "profile", "phases": 0}
+
+# Before 3.12 cProfile only sees the thread that enabled it, so every thread
+# started while pstats profiling is on (searchers, query pools) gets its own
+# profiler, merged into each phase's output
+_PER_THREAD = sys.version_info < (3, 12)
+_lock = threading.Lock()
+_thread_profilers = []
+# Name of the phase being profiled. Phases started inside it, or in other
+# threads meanwhile (e.g --parallel playlists), are part of it rather than
+# profiled on their own: cProfile and the sampler see every thread, so work
+# running side by side can't be told apart. Their names are kept in _merged
+_active = [None]
+_merged = []
+
+
+def configure_profiling(fmt, out_dir="profile"):
+    # fmt is "pstats", "collapsed" or None to disable profiling
+    _settings["format"] = fmt
+    _settings["out"] = out_dir
+    _settings["phases"] = 0
+    with _lock:
+        _thread_profilers.clear()
+    threading.setprofile(_profile_thread if fmt == "pstats" and _PER_THREAD else None)
+
+
+def _profile_thread(frame, event, arg):
+    # threading.setprofile() hook, hands the new thread a profiler of its own
+    sys.setprofile(None)
+    profiler = cProfile.Profile()
+    with _lock:
+        _thread_profilers.append(profiler)
+    profiler.enable()
+
+
+class _Snapshot:
+    # A thread's stats so far, read without disabling its profiler, which only
+    # the thread itself may do
+    def __init__(self, profiler):
+        profiler.snapshot_stats()
+        self.stats = profiler.stats
+
+    def create_stats(self):
+        pass
+
+
+def _out_path(name, extension):
+    _settings["phases"] += 1
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "phase"
+    os.makedirs(_settings["out"], exist_ok=True)
+    return os.path.join(
+        _settings["out"], f"{_settings['phases']:03d}-{slug}.{extension}"
+    )
+
+
+class _Sampler(threading.Thread):
+    # Samples the stacks of every thread at a fixed interval. Wall-clock samples
+    # include time spent blocked on sockets, unlike cProfile's CPU view
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename)
+                    stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def phase(name):
+    # Profile one phase of a run (auth, listing or a tunnel() call) and write
+    # its output to its own file in the --profile-out directory
+    fmt = _settings["format"]
+    with _lock:
+        nested = _active[0] is not None
+        if fmt is not None and nested:
+            _merged.append(name)
+        elif fmt is not None:
+            _active[0] = name
+            _merged.clear()
+    if fmt is None or nested:
+        yield
+        return
+    try:
+        with _profile(name, fmt):
+            yield
+    finally:
+        _active[0] = None
+
+
+@contextmanager
+def _profile(name, fmt):
+    wall_start, cpu_start = perf_counter(), process_time()
+    if fmt == "collapsed":
+        sampler = _Sampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            path = _out_path(name, "folded")
+            with open(path, "w") as file:
+                for stack, samples in sampler.stacks.most_common():
+                    file.write(f"{stack} {samples}\n")
+    else:
+        with _lock:
+            workers = list(_thread_profilers)
+        # Worker threads outlive phases, only this phase's calls are kept
+        for worker in workers:
+            worker.clear()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            stats = pstats.Stats(profiler)
+            with _lock:
+                workers = list(_thread_profilers)
+            for worker in workers:
+                snapshot = _Snapshot(worker)
+                if snapshot.stats:
+                    stats.add(snapshot)
+            path = _out_path(name, "pstats")
+            stats.dump_stats(path)
+    wall = perf_counter() - wall_start
+    cpu = process_time() - cpu_start
+    waiting = max(0.0, 1 - cpu / wall) * 100 if wall else 0.0
+    with _lock:
+        merged = [other for other in _merged if other != name]
+    also = f", also covering {', '.join(merged)}" if merged else ""
+    print(
+        f"[i] Profile '{name}'{also}: wall {wall:.2f}s, cpu {cpu:.2f}s "
+        f"({waiting:.0f}% waiting on I/O) -> {path}"
+    )
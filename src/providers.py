@@ -0,0 +1,322 @@
+import importlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+
+from config.config import limitsfile
+from src.filelock import locked, tmp_path
+from src.mainfuncs import confirm_playlist_exist, display_playlists
+from src.matching import TrackIndex
+from src.metrics import stage, status_of
+from src.normalize import track_key
+from src.profiling import phase
+
+# Provider classes are imported on first use so that runs only pay for the
+# client libraries (spotipy, ytmusicapi, tidalapi, requests, tqdm) they need
+PROVIDERS = {
+    "spotify": ("src.spfyfuncs", "SpotifyProvider"),
+    "youtube": ("src.ytfuncs", "YouTubeProvider"),
+    "tidal": ("src.tidalfuncs", "TidalProvider"),
+    "apple": ("src.applefuncs", "AppleProvider"),
+    "file": ("src.filefuncs", "FileProvider"),
+}
+
+
+def load_provider(name):
+    # Import the module implementing the named platform and return a provider
+    if name not in PROVIDERS:
+        print(f"[-]: {name} is an unrecognized platform. Use {', '.join(PROVIDERS)}")
+        sys.exit(1)
+    module_name, class_name = PROVIDERS[name]
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)()
+
+
+_pool_lock = threading.Lock()
+
+# Gate of each provider that has searched, told by retry about every throttled
+# or failed attempt, including those a later attempt recovers from
+_gates = {}
+
+
+def report_failure(provider, error):
+    gate = _gates.get(provider)
+    if gate is not None:
+        gate.failed(error)
+
+
+class RateLimiter:
+    """Spaces calls out so that at most `rate` start per second across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            sleep(slot - now)
+
+
+class AdaptiveLimit:
+    """
+    Caps the requests in flight, adjusting the cap from how they went (AIMD).
+
+    Every success raises the limit by 1/limit, about one more slot per round of
+    requests. A 429, a 5xx or any failure without a status, or a request taking
+    over LATENCY_FACTOR times the usual latency, cuts the limit by BACKOFF, at
+    most once per round trip so one burst of errors doesn't floor it.
+    """
+
+    BACKOFF = 0.5
+    LATENCY_FACTOR = 2.0
+    WARMUP = 10  # successes needed before latency counts as a signal
+
+    def __init__(self, limit, ceiling, floor=1):
+        self.floor = floor
+        self.ceiling = max(ceiling, floor)
+        self.limit = float(min(max(limit, floor), self.ceiling))
+        self._active = 0
+        self._latency = None  # moving average of successful requests
+        self._samples = 0
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self._active >= int(self.limit):
+                self._cond.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def succeeded(self, seconds):
+        with self._cond:
+            slow = (
+                self._samples >= self.WARMUP
+                and seconds > self.LATENCY_FACTOR * self._latency
+            )
+            if self._latency is None:
+                self._latency = seconds
+            else:
+                self._latency += 0.1 * (seconds - self._latency)
+            self._samples += 1
+            if slow:
+                self._cut()
+            else:
+                self.limit = min(self.ceiling, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def failed(self, error):
+        # Errors with a 4xx status other than 429 say nothing about load
+        status = status_of(error)
+        if status is not None and status != 429 and status < 500:
+            return
+        with self._cond:
+            self._cut()
+
+    def _cut(self):
+        now = monotonic()
+        if now - self._last_cut < (self._latency or 0.0):
+            return
+        self._last_cut = now
+        self.limit = max(self.floor, self.limit * self.BACKOFF)
+
+
+def learned_limits(path=limitsfile):
+    # Concurrency limits saved by earlier runs, {provider name: limit}
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_limits(providers, path=limitsfile):
+    # Keep each provider's current limit as the next run's starting point
+    current = {
+        provider.name: round(provider._gate.limit, 2)
+        for provider in providers
+        if provider._gate is not None
+    }
+    if not current:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Locked so shards finishing together don't drop each other's limits
+    with locked(path):
+        limits = {**learned_limits(path), **current}
+        # Write then rename so an interrupted run can't leave a broken file
+        tmp = tmp_path(path)
+        with open(tmp, "w") as file:
+            json.dump(limits, file, indent=2)
+        os.replace(tmp, path)
+
+
+class Provider:
+    """
+    A streaming platform as seen by the transfer engine.
+
+    Subclasses wrap their module's functions and declare the platform's limits,
+    which the engine uses to size add batches, search worker pools and request
+    pacing instead of moving one track at a time.
+    """
+
+    name = ""
+    code = ""  # platform letter used by message()
+    label = ""  # name shown on progress bars
+    batch_size = 1  # most tracks accepted by one add request
+    page_size = 100  # items returned per listing/read page
+    concurrency = 1  # searches in parallel when nothing has been learned yet
+    max_concurrency = 0  # most the adaptive limit may grow to, 0 keeps concurrency
+    rate_limit = 2.0  # requests per second
+
+    def __init__(self):
+        self.session = None
+        self._playlists = None
+        self._query_pool = None
+        self._gate = None
+        # Track counts by playlist name, for the listings that include them
+        self.sizes = {}
+        self.limiter = RateLimiter(self.rate_limit)
+        # Search results for the whole run, track -> (song id, attempt), and
+        # the tracks matched so far indexed to find them under other spellings
+        self.resolved = {}
+        self.index = TrackIndex()
+        self.reused = 0
+
+    def auth(self):
+        raise NotImplementedError
+
+    def list_playlists(self):
+        # Return a {playlist name: playlist id} dictionary
+        raise NotImplementedError
+
+    @property
+    def playlists(self):
+        # Listed on first use, so -p runs only pay for it when a name is resolved
+        if self._playlists is None:
+            with stage("listing"), phase(f"listing {self.name}"):
+                self._playlists = self.list_playlists()
+        return self._playlists
+
+    def all_playlists(self):
+        # Playlist names moved by -A
+        return list(self.playlists)
+
+    def show_playlists(self):
+        # Print the playlist names for -L
+        display_playlists(self.playlists)
+
+    def size(self, playlist_name):
+        # Number of tracks in a playlist, None when the listing doesn't say
+        playlists = self.playlists  # sizes are filled in by the listing
+        return self.sizes.get(playlist_name) if playlist_name in playlists else None
+
+    def resolve(self, playlist_name):
+        # Id of a playlist by name, None if it doesn't exist
+        return confirm_playlist_exist(playlist_name, self.playlists, self.name)
+
+    def read(self, playlist_name):
+        # Tracks of a playlist by name, None if it doesn't exist
+        pages = self.pages(playlist_name)
+        if pages is None:
+            return None
+        return [track for page in pages for track in page]
+
+    def pages(self, playlist_name):
+        # Pages of a playlist's tracks by name, None if it doesn't exist
+        playlist_id = self.resolve(playlist_name)
+        if playlist_id is None:
+            return None
+        return self.pages_id(playlist_id)
+
+    def read_id(self, playlist_id):
+        raise NotImplementedError
+
+    def pages_id(self, playlist_id):
+        # Providers with paged APIs yield each page as soon as it arrives
+        yield self.read_id(playlist_id)
+
+    def diff(self, dest_id, tracks):
+        # Tracks not yet present in the destination playlist, in source order.
+        # Compared by track_key(), as each platform spells tracks its own way
+        return _unseen(tracks, {track_key(track) for track in self.read_id(dest_id)})
+
+    def search(self, track, attempt=None):
+        # Song id matching a track string, None if nothing matched. Queries tried
+        # and the closest rejected result are noted in the attempt dict if given
+        from src.queries import cascade
+
+        return cascade(self, track, attempt)
+
+    def plan_queries(self, track):
+        # Search queries cascade() runs concurrently for a track
+        from src.queries import plan_queries
+
+        return plan_queries(track)
+
+    def query(self, query, target, attempt=None):
+        # Song id of the first result of one search that matches the target text
+        raise NotImplementedError
+
+    def share(self, shards):
+        # One of shards processes moving playlists at once, each gets a part
+        # of the rate limit so together they keep to it
+        self.limiter = RateLimiter(self.rate_limit / shards)
+
+    @property
+    def ceiling(self):
+        # Most searches that may ever run in parallel
+        return max(self.concurrency, self.max_concurrency)
+
+    @property
+    def query_pool(self):
+        # Shared by every search and sized for the ceiling, gate sets the pace
+        if self._query_pool is None:
+            with _pool_lock:
+                if self._query_pool is None:
+                    self._query_pool = ThreadPoolExecutor(
+                        max_workers=self.ceiling,
+                        thread_name_prefix=f"{self.name}-query",
+                    )
+        return self._query_pool
+
+    @property
+    def gate(self):
+        # Adaptive cap on searches in flight, starting from the last run's limit
+        if self._gate is None:
+            with _pool_lock:
+                if self._gate is None:
+                    start = learned_limits().get(self.name, self.concurrency)
+                    self._gate = AdaptiveLimit(start, self.ceiling)
+                    _gates[self.name] = self._gate
+        return self._gate
+
+    def add(self, dest_id, song_ids):
+        # Add up to batch_size songs, returning the ids that failed
+        raise NotImplementedError
+
+    def create(self, playlist_name, source=None):
+        # Id of the destination playlist, creating it when missing
+        raise NotImplementedError
+
+
+def _unseen(tracks, seen):
+    # Streams tracks whose track_key() is missing from seen, dropping
+    # duplicates as it goes
+    for track in tracks:
+        key = track_key(track)
+        if key not in seen:
+            seen.add(key)
+            yield track
@@ -0,0 +1,104 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from time import perf_counter
+
+from src.normalize import (
+    primary_artist,
+    strip_parentheticals,
+    track_fields,
+    transliterate,
+)
+
+
+def plan_queries(track, qualified=None):
+    """
+    Search queries for a track, most specific first and without repeats.
+
+    qualified(title, artist) builds the provider's field-qualified query, e.g
+    Spotify's `track:"..." artist:"..."`, tried ahead of the plain ones.
+    """
+    fields = track_fields(track)
+    title, artist = fields["title"], fields["artist"]
+    first = primary_artist(artist)
+    bare = strip_parentheticals(title)
+    queries = [
+        qualified(title, first) if qualified else f"{title} {artist}",
+        f"{title} {first}",
+        f"{bare} {first}",
+        transliterate(f"{bare} {first}"),
+    ]
+    return list(dict.fromkeys(query.strip() for query in queries if query.strip()))
+
+
+def _merge(attempt, result):
+    # Fold one query's notes into the track's attempt
+    if attempt is None:
+        return
+    if result.get("score", -1.0) > attempt.get("score", -1.0):
+        attempt["best"] = result["best"]
+        attempt["score"] = result["score"]
+    if "error" in result:
+        attempt["error"] = result["error"]
+
+
+def cascade(provider, track, attempt=None, queries=None):
+    """
+    Run every planned query for a track at once and keep the first hit.
+
+    Queries share the provider's query pool, at most provider.gate.limit are in
+    flight and each waits on the rate limiter. As soon as one returns a
+    candidate above the match threshold the queries still queued are cancelled.
+    queries replaces the provider's plan, e.g for --retry-failed.
+    """
+    if queries is None:
+        queries = provider.plan_queries(track)
+    if not queries:
+        return None
+    target = track
+    for query in queries:
+        if attempt is not None:
+            attempt.setdefault("queries", []).append(query)
+
+    # Set by the worker that finds a match, so queries a worker picks up before
+    # the cancellation below lands are skipped instead of sent
+    hit = threading.Event()
+
+    def run(query, notes):
+        with provider.gate:
+            if hit.is_set():
+                return None
+            provider.limiter.wait()
+            start = perf_counter()
+            try:
+                song_id = provider.query(query, target, notes)
+            except Exception as e:
+                notes["error"] = repr(e)
+                provider.gate.failed(e)
+                raise
+            provider.gate.succeeded(perf_counter() - start)
+            if song_id is not None:
+                hit.set()
+            return song_id
+
+    pending = {}
+    for query in queries:
+        notes = {}
+        pending[provider.query_pool.submit(run, query, notes)] = notes
+    errors = []
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            _merge(attempt, pending.pop(future))
+            if future.cancelled():
+                continue
+            if future.exception() is not None:
+                errors.append(future.exception())
+                continue
+            if future.result() is not None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+    # Only an outage, not a plain miss, is reported as an error
+    if errors and len(errors) == len(queries):
+        raise errors[0]
+    return None
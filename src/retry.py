@@ -0,0 +1,192 @@
+import json
+import random
+import threading
+from time import monotonic, sleep
+
+import requests
+
+from config.config import request_timeout
+from src.hedge import hedged_call
+from src.metrics import call, count, status_of
+from src.providers import report_failure
+
+# Tries per request, and the backoff between them (full jitter, doubling)
+ATTEMPTS = 4
+BASE_DELAY = 0.5
+MAX_DELAY = 8.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Failures in a row that pause a provider, and for how long at first
+THRESHOLD = 5
+COOLDOWN = 30.0
+MAX_COOLDOWN = 300.0
+
+_lock = threading.Lock()
+_breakers = {}
+
+
+class CircuitBreaker:
+    """
+    Pauses every request to a provider after THRESHOLD failures in a row.
+
+    Once the cooldown is over a single probe request goes through: if it
+    succeeds the provider resumes, if not the pause starts again, twice as long.
+    """
+
+    def __init__(self, name, threshold=THRESHOLD, cooldown=COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = None
+        self._pause = cooldown
+        self._probing = False
+        self._cond = threading.Condition()
+
+    def wait(self):
+        # Block while the circuit is open, then let one probe through
+        with self._cond:
+            while self.open_until is not None:
+                remaining = self.open_until - monotonic()
+                if remaining <= 0 and not self._probing:
+                    self._probing = True
+                    return
+                self._cond.wait(remaining if remaining > 0 else None)
+
+    def success(self):
+        with self._cond:
+            self.failures = 0
+            self.open_until = None
+            self._pause = self.cooldown
+            self._probing = False
+            self._cond.notify_all()
+
+    def failure(self):
+        with self._cond:
+            self.failures += 1
+            if not self._probing and self.failures < self.threshold:
+                return
+            if self._probing:
+                self._pause = min(self._pause * 2, MAX_COOLDOWN)
+            self._probing = False
+            self.open_until = monotonic() + self._pause
+            self._cond.notify_all()
+        print(f"\n[!] {self.name} keeps failing, pausing it for {self._pause:.0f}s")
+
+
+class TimeoutSession(requests.Session):
+    """A requests session that applies config's timeouts unless told otherwise."""
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", request_timeout)
+        return super().request(*args, **kwargs)
+
+
+def breaker(provider):
+    # The circuit breaker shared by every request to a provider
+    with _lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(provider)
+        return _breakers[provider]
+
+
+def reset():
+    with _lock:
+        _breakers.clear()
+
+
+def backoff(attempt, retry_after=None):
+    # Seconds to wait before try attempt + 1, honouring Retry-After when given
+    delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2**attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, MAX_DELAY))
+    return delay
+
+
+def _retry_after(obj):
+    # Retry-After seconds of a 429 response or error, None when absent
+    response = getattr(obj, "response", obj)
+    try:
+        return float(response.headers["Retry-After"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _retryable(error, idempotent):
+    status = status_of(error)
+    if status is not None:
+        return status == 429 or (idempotent and status in RETRY_STATUSES)
+    # Dropped connections, timeouts and truncated bodies, none of which tell
+    # whether a write went through
+    return idempotent and isinstance(error, (OSError, json.JSONDecodeError))
+
+
+def _send(provider, op, idempotent, fn, args, kwargs):
+    gate = breaker(provider)
+    for attempt in range(ATTEMPTS):
+        last = attempt == ATTEMPTS - 1
+        gate.wait()
+        # Reads may be hedged (--hedge), writes are always sent once
+        send = hedged_call if idempotent else call
+        try:
+            result = send(provider, op, fn, *args, **kwargs)
+        except Exception as e:
+            if not _retryable(e, idempotent):
+                # The API answered, so the provider itself is up
+                gate.success()
+                raise
+            gate.failure()
+            report_failure(provider, e)
+            if last:
+                raise
+            count(provider, op, "retries")
+            sleep(backoff(attempt, _retry_after(e)))
+            continue
+        if not _retryable(result, idempotent):
+            gate.success()
+            return result
+        gate.failure()
+        report_failure(provider, result)
+        if last:
+            if idempotent:
+                # Out of retries, a read raises rather than handing an error
+                # page on as if it were data
+                raise requests.HTTPError(
+                    f"{status_of(result)} from {provider} {op}", response=result
+                )
+            # Callers check the status of the writes they send
+            return result
+        count(provider, op, "retries")
+        sleep(backoff(attempt, _retry_after(result)))
+    return None
+
+
+def get_json(*args, **kwargs):
+    """
+    requests.get for retry_call() and shared_call(), with the body decoded in
+    the same attempt and kept as response.data. A truncated or garbled body of
+    a successful response raises, so it's sent again like a dropped
+    connection; error responses that aren't JSON get data None.
+    """
+    response = requests.get(*args, **kwargs)
+    try:
+        response.data = response.json()
+    except ValueError:
+        status = status_of(response)
+        if status is None or 200 <= status < 300:
+            raise
+        response.data = None
+    return response
+
+
+def retry_call(provider, op, fn, *args, **kwargs):
+    """
+    call() for reads and searches, sent again on 429s, 5xx responses, dropped
+    connections and unreadable bodies, with jittered exponential backoff.
+    """
+    return _send(provider, op, True, fn, args, kwargs)
+
+
+def retry_write(provider, op, fn, *args, **kwargs):
+    # Writes are only sent again when the API said it didn't act on them (429)
+    return _send(provider, op, False, fn, args, kwargs)
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import sys
+import threading
+
+from src.transfer import expired
+
+POLICIES = ("listed", "shortest", "largest")
+
+
+def shard_of(playlist_name, shards):
+    # Same shard on every run and machine, unlike hash() which is salted per process
+    digest = hashlib.blake2b(playlist_name.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def select_shard(playlist_names, shards, index):
+    """
+    The playlists of a bulk run (-A or -P) that shard index of shards moves.
+
+    Playlists are split by a hash of their name, so every shard picks the same
+    ones from the same list and together they cover it exactly once.
+    """
+    return [name for name in playlist_names if shard_of(name, shards) == index]
+
+
+def shard_path(path, index):
+    # Output file or directory of one shard, e.g resume.txt -> resume.shard2.txt
+    # and profile/ -> profile.shard2
+    root, ext = os.path.splitext(path.rstrip("/\\") or path)
+    return f"{root}.shard{index}{ext}"
+
+
+def order_playlists(playlist_names, size, policy="listed"):
+    """
+    Order the playlists of a bulk run (-A or -P).
+
+    "shortest" moves small playlists first so finished ones show up early,
+    "largest" starts the big ones first so they don't run on alone at the end
+    while the other --parallel slots sit idle. size(name) gives a playlist's
+    track count, or None; playlists of unknown size keep their listed order
+    after the others.
+    """
+    if policy == "listed":
+        return list(playlist_names)
+    sign = 1 if policy == "shortest" else -1
+    sizes = {name: size(name) for name in playlist_names}
+    # sorted() is stable, so ties and unknown sizes stay in listed order
+    return sorted(
+        playlist_names,
+        key=lambda name: (sizes[name] is None, sign * (sizes[name] or 0)),
+    )
+
+
+def run_playlists(playlist_names, work, parallel=1, unfinished=None):
+    """
+    Call work(name, slot) for every playlist, parallel playlists at a time.
+
+    Each destination's rate limiter and concurrency gate are shared by every
+    playlist in flight, so while one playlist waits on a slow provider another
+    keeps the rest busy. slot (0 to parallel - 1) tells the playlists running
+    side by side apart, e.g for progress bar lines.
+
+    Returns work's results and the playlists left once the --deadline passed:
+    those cut short first, then those never started. unfinished(name) tells
+    whether a playlist that returned after the deadline was cut short or got
+    through anyway; without it every such playlist counts as cut short.
+    """
+    todo = list(playlist_names)
+    results = []
+    cut_short = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(slot):
+        while True:
+            with lock:
+                if not todo or errors or expired():
+                    return
+                name = todo.pop(0)
+            try:
+                result = work(name, slot)
+            except BaseException as e:
+                # Includes sys.exit() for a playlist that doesn't exist
+                with lock:
+                    errors.append(e)
+                return
+            with lock:
+                results.append(result)
+                if expired() and (unfinished is None or unfinished(name)):
+                    cut_short.append(name)
+
+    if parallel <= 1:
+        worker(None)
+    else:
+        threads = [
+            threading.Thread(target=worker, args=(slot,), daemon=True)
+            for slot in range(parallel)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            print("\n[!] Operation cancelled by user.")
+            sys.exit(0)
+    if errors:
+        raise errors[0]
+    order = {name: i for i, name in enumerate(playlist_names)}
+    return results, sorted(cut_short, key=order.get) + todo
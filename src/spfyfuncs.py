@@ -1,13 +1,26 @@
-import re
 import sys
-from math import ceil
-from time import sleep
 
 import spotipy
-from tqdm import tqdm
 
-from config.config import CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SCOPE
-from src.mainfuncs import compare, message, what_to_move
+from config.config import (
+    CLIENT_ID,
+    CLIENT_SECRET,
+    REDIRECT_URI,
+    SCOPE,
+    request_timeout,
+)
+from src.coalesce import shared_call
+from src.mainfuncs import (
+    compare,
+    display_playlists,
+    message,
+    note_candidate,
+)
+from src.metrics import stage
+from src.normalize import track_string
+from src.providers import Provider
+from src.queries import plan_queries
+from src.retry import retry_call, retry_write
 
 
 def spotify_auth():
@@ -19,7 +32,8 @@ def spotify_auth():
                 client_secret=CLIENT_SECRET,
                 redirect_uri=REDIRECT_URI,
                 scope=SCOPE,
-            )
+            ),
+            requests_timeout=request_timeout,
         )
         message("s+", "Successfully Authenticated")
         return spotify
@@ -30,9 +44,9 @@ def spotify_auth():
     # why? because wsl2 sucks
 
 
-def get_spotify_playlists(spotify):
-    # Gets user spotify playlists
-    user_playlists = spotify.current_user_playlists()
+def get_spotify_playlists(spotify, sizes=None):
+    # Gets user spotify playlists, and their track counts into sizes if given
+    user_playlists = retry_call("spotify", "playlists", spotify.current_user_playlists)
     spfy_lists = {}
     try:
         for i in user_playlists["items"]:
@@ -40,46 +54,75 @@ def get_spotify_playlists(spotify):
             playlist_id = i["id"]
             # Add playlist name and ids to dictionary
             spfy_lists[playlist_name] = playlist_id
+            if sizes is not None and "tracks" in i:
+                sizes[playlist_name] = i["tracks"]["total"]
     except KeyError:
         # Triggered for malformed response
         pass
     return spfy_lists
 
 
+def spfy_track(song):
+    # Track string for a Spotify playlist/likes item
+    song_name = song["track"]["name"]
+    album_name = song["track"]["album"]["name"]
+    artist_name = []
+    for i in song["track"]["artists"]:
+        artist = i["name"]
+        artist_name.append(artist)
+    artist = " ".join(artist_name)
+    return track_string(album_name, song_name, artist)
+
+
+def iter_spfy_likes(spotify, page_size=50):
+    # Yields tracks on spotify liked list a page at a time, the endpoint takes
+    # at most 50 per request
+    page_size = min(page_size, 50)
+    offset = 0
+    while True:
+        like = retry_call(
+            "spotify",
+            "likes",
+            spotify.current_user_saved_tracks,
+            limit=page_size,
+            offset=offset,
+        )
+        yield [spfy_track(song) for song in like["items"]]
+        offset += len(like["items"])
+        if not like["items"] or offset >= like["total"]:
+            return
+
+
 def get_spfy_likes(spotify):
     # Gets track on spotify liked list
-    test_likes = spotify.current_user_saved_tracks(limit=50)
-    no_of_liked_songs = test_likes["total"]
-    total_requests = ceil(no_of_liked_songs / 50)
-    result = []
-    for i in range(total_requests):
-        like = spotify.current_user_saved_tracks(limit=50, offset=50 * i)
-        for song in like["items"]:
-            song_name = song["track"]["name"]
-            album_name = song["track"]["album"]["name"]
-            artist_name = []
-            for i in song["track"]["artists"]:
-                artist = i["name"]
-                artist_name.append(artist)
-            artist = " ".join(artist_name)
-            result.append(album_name + "&@#72" + song_name + "&@#72" + artist)
-    return result
+    return [track for page in iter_spfy_likes(spotify) for track in page]
+
+
+def iter_spfy_playlist_content(spotify, source_id, page_size=100):
+    # Yields tracks on spotify playlist a page at a time
+    offset = 0
+    while True:
+        playlist_content = retry_call(
+            "spotify",
+            "playlist items",
+            spotify.playlist_items,
+            f"spotify:playlist:{source_id}",
+            limit=page_size,
+            offset=offset,
+        )
+        yield [spfy_track(song) for song in playlist_content["items"]]
+        offset += len(playlist_content["items"])
+        if not playlist_content["items"] or offset >= playlist_content.get("total", 0):
+            return
 
 
 def get_spfy_playlist_content(spotify, source_id):
     # Gets track on spotify playlist
-    playlist_content = spotify.playlist_items(f"spotify:playlist:{source_id}")
-    result = []
-    for song in playlist_content["items"]:
-        song_name = song["track"]["name"]
-        album_name = song["track"]["album"]["name"]
-        artist_name = []
-        for i in song["track"]["artists"]:
-            artist = i["name"]
-            artist_name.append(artist)
-        artist = " ".join(artist_name)
-        result.append(album_name + "&@#72" + song_name + "&@#72" + artist)
-    return result
+    return [
+        track
+        for page in iter_spfy_playlist_content(spotify, source_id)
+        for track in page
+    ]
 
 
 def spfy_dest_check(spfy_lists, spotify, spfy_id, dest_playlist_name):
@@ -87,7 +130,10 @@ def spfy_dest_check(spfy_lists, spotify, spfy_id, dest_playlist_name):
         dest_playlist_id = spfy_lists[dest_playlist_name]
         message("s+", "Playlist exists, adding missing songs")
     else:
-        create_playlist = spotify.user_playlist_create(
+        create_playlist = retry_write(
+            "spotify",
+            "create playlist",
+            spotify.user_playlist_create,
             spfy_id,
             dest_playlist_name,
             public=False,
@@ -99,42 +145,79 @@ def spfy_dest_check(spfy_lists, spotify, spfy_id, dest_playlist_name):
     return dest_playlist_id
 
 
-def move_to_spfy(spotify, playlist_info, dest_id, playlist_name):
-    not_found = []
-    present_song = get_spfy_playlist_content(spotify, dest_id)
-    playlist_info = what_to_move(present_song, playlist_info)
-    try:
-        for i in tqdm(playlist_info, desc=f"Moving {playlist_name} to Spotify"):
-            i = i.replace("&@#72", " ")
-            try:
-                search = spotify.search(i, limit=5, type="track")
-            except Exception:
-                bk = i
-                i = re.sub(r"\(.*?\)", "", i)
-                try:
-                    search = spotify.search(i, limit=5, type="track")
-                except Exception:
-                    not_found.append(bk)
-                    continue
-            for song in search["tracks"]["items"]:
-                album_name = song["album"]["name"]
-                song_name = song["name"]
-                artist_name = []
-                for j in song["artists"]:
-                    artist = j["name"]
-                    artist_name.append(artist)
-                artist = " ".join(artist_name)
-                found = album_name + " " + song_name + " " + artist
-                songid = [song["id"]]
-                if compare(found, i):
-                    sleep(0.5)
-                    spotify.playlist_add_items(dest_id, songid)
-                    break
-            else:
-                not_found.append(i)
-        return not_found
-    except KeyboardInterrupt:
-        print("\n[!] Operation cancelled by user.")
-        sys.exit(0)
-    except Exception:
-        return not_found
+def spfy_query(spotify, query, target, attempt=None):
+    # One Spotify search, returning the id of the first result matching target
+    with stage("search"):
+        search = shared_call(
+            "spotify", "search", query, spotify.search, query, limit=5, type="track"
+        )
+    for song in search["tracks"]["items"]:
+        album_name = song["album"]["name"]
+        song_name = song["name"]
+        artist = " ".join(j["name"] for j in song["artists"])
+        found = track_string(album_name, song_name, artist)
+        with stage("compare"):
+            matched = compare(found, target)
+        if matched:
+            return song["id"]
+        note_candidate(attempt, found, target)
+    return None
+
+
+def spfy_qualified(title, artist):
+    # Spotify's field filters narrow results to the exact title and artist
+    title, artist = title.replace('"', ""), artist.replace('"', "")
+    return f'track:"{title}" artist:"{artist}"'
+
+
+class SpotifyProvider(Provider):
+    name = "spotify"
+    code = "s"
+    label = "Spotify"
+    batch_size = 100
+    page_size = 100
+    concurrency = 4
+    max_concurrency = 16
+    rate_limit = 10.0
+
+    def auth(self):
+        self.session = spotify_auth()
+        self.user_id = retry_call("spotify", "me", self.session.me)["id"]
+
+    def list_playlists(self):
+        return get_spotify_playlists(self.session, self.sizes)
+
+    def all_playlists(self):
+        return ["your likes", *self.playlists]
+
+    def show_playlists(self):
+        print("Your Likes")
+        display_playlists(self.playlists)
+
+    def pages(self, playlist_name):
+        if playlist_name.lower() == "your likes":
+            return iter_spfy_likes(self.session, self.page_size)
+        return super().pages(playlist_name)
+
+    def read_id(self, playlist_id):
+        return get_spfy_playlist_content(self.session, playlist_id)
+
+    def pages_id(self, playlist_id):
+        return iter_spfy_playlist_content(self.session, playlist_id, self.page_size)
+
+    def plan_queries(self, track):
+        return plan_queries(track, spfy_qualified)
+
+    def query(self, query, target, attempt=None):
+        return spfy_query(self.session, query, target, attempt)
+
+    def add(self, dest_id, song_ids):
+        retry_write(
+            "spotify", "add items", self.session.playlist_add_items, dest_id, song_ids
+        )
+        return []
+
+    def create(self, playlist_name, source=None):
+        return spfy_dest_check(
+            self.playlists, self.session, self.user_id, playlist_name
+        )
@@ -1,45 +1,64 @@
-import re
+import os
 import sys
-from datetime import datetime
-from time import sleep
+import threading
+from datetime import datetime, timedelta, timezone
 
 import requests
 import tidalapi
-from tqdm import tqdm
 
-from config.config import tidalfile
-from src.mainfuncs import compare, message, what_to_move
+from config.config import request_timeout, tidal_api, tidalfile
+from src.coalesce import shared_call
+from src.filelock import tmp_path
+from src.mainfuncs import (
+    compare,
+    confirm_playlist_exist,
+    message,
+    note_candidate,
+)
+from src.metrics import added, call, stage
+from src.normalize import track_string
+from src.providers import Provider
+from src.retry import TimeoutSession, get_json, retry_call, retry_write
 
 # Cache for folders created/found in this session
 _session_folders_cache = {}
 
+# Access tokens are renewed this long before they expire
+TIDAL_REFRESH_MARGIN = timedelta(minutes=5)
+
+# Only one search thread renews an expiring token
+_refresh_lock = threading.Lock()
+
 
 def tidal_auth():
     # Attempt to authenticate Tidal
     try:
         tidal = tidalapi.Session()
+        tidal.request_session = TimeoutSession()
         try:
             with open(tidalfile) as file:
                 cred = [line.rstrip() for line in file]
+            token_type, access_token, refresh_token = cred[0], cred[1], cred[2]
             expiry_time: datetime = datetime.strptime(cred[3], "%m/%d/%Y, %H:%M:%S.%f")
-            if expiry_time > datetime.now() and tidal.load_oauth_session(
-                cred[0], cred[1], cred[2], expiry_time
+            if expiry_time - TIDAL_REFRESH_MARGIN <= _utcnow():
+                # Trade the stored refresh token for a new access token rather
+                # than sending the user through the device login again
+                tidal.refresh_token = refresh_token
+                if not tidal_refresh(tidal):
+                    raise ValueError
+                token_type, access_token = tidal.token_type, tidal.access_token
+                expiry_time = tidal.expiry_time
+            if tidal.load_oauth_session(
+                token_type, access_token, refresh_token, expiry_time
             ):
                 message("t+", "Successfully Authenticated")
                 return tidal
-        except (FileNotFoundError, ValueError):
+        except (FileNotFoundError, IndexError, ValueError):
             pass
         tidal.login_oauth_simple()
         if tidal.check_login():
             message("t+", "Successfully Authenticated")
-            creds = [
-                tidal.token_type,
-                tidal.access_token,
-                tidal.refresh_token,
-                tidal.expiry_time.strftime("%m/%d/%Y, %H:%M:%S.%f"),
-            ]
-            with open(tidalfile, "w") as file:
-                file.write("\n".join(creds))
+            save_tidal_creds(tidal)
             return tidal
         message("t-", "Authentication Failed")
         raise TimeoutError
@@ -48,12 +67,63 @@ def tidal_auth():
         sys.exit(0)
 
 
-def get_tidal_playlists(session):
-    """Returns a dictionary of playlist names and their IDs, including those in folders."""
-    user_playlists = session.user.playlists()
+def _utcnow():
+    # tidalapi keeps expiry times as naive UTC datetimes
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def save_tidal_creds(tidal):
+    # Write through a temporary file so an interrupted run can't truncate the creds
+    creds = [
+        tidal.token_type,
+        tidal.access_token,
+        tidal.refresh_token,
+        tidal.expiry_time.strftime("%m/%d/%Y, %H:%M:%S.%f"),
+    ]
+    tmp = tmp_path(tidalfile)
+    with open(tmp, "w") as file:
+        file.write("\n".join(creds))
+    os.replace(tmp, tidalfile)
+
+
+def tidal_refresh(tidal):
+    # Renew the access token with the refresh token and persist it
+    try:
+        refreshed = call(
+            "tidal", "token refresh", tidal.token_refresh, tidal.refresh_token
+        )
+    except Exception:
+        return False
+    if refreshed:
+        save_tidal_creds(tidal)
+    return bool(refreshed)
+
+
+def tidal_keep_fresh(tidal):
+    # Renew the access token before it expires so long runs keep working
+    with _refresh_lock:
+        expiry_time = getattr(tidal, "expiry_time", None)
+        if (
+            isinstance(expiry_time, datetime)
+            and expiry_time - TIDAL_REFRESH_MARGIN <= _utcnow()
+        ):
+            tidal_refresh(tidal)
+
+
+def get_tidal_user_playlists(session, sizes=None):
+    """Returns a dictionary of top level playlist names and their IDs."""
+    user_playlists = retry_call("tidal", "playlists", session.user.playlists)
     playlists = {}
     for playlist in user_playlists:
         playlists[playlist.name] = playlist.id
+        if sizes is not None and isinstance(playlist.num_tracks, int):
+            sizes[playlist.name] = playlist.num_tracks
+    return playlists
+
+
+def get_tidal_playlists(session, sizes=None):
+    """Returns a dictionary of playlist names and their IDs, including those in folders."""
+    playlists = get_tidal_user_playlists(session, sizes)
 
     # Try to get playlists from folders using direct API calls (more reliable)
     try:
@@ -64,14 +134,18 @@ def get_tidal_playlists(session):
         }
 
         # Get existing folders from API
-        folders_response = requests.get(
-            "https://listen.tidal.com/v2/my-collection/playlists/folders",
+        folders_response = retry_call(
+            "tidal",
+            "folders",
+            get_json,
+            f"{tidal_api}/v2/my-collection/playlists/folders",
             headers=headers,
             params={"countryCode": "NG", "locale": "en_US", "deviceType": "BROWSER"},
+            timeout=request_timeout,
         )
 
         if folders_response.status_code == 200:
-            folders_data = folders_response.json()
+            folders_data = folders_response.data
             # Look for folders in the items array, not a separate folders array
             items = folders_data.get("items", [])
             folders = [item for item in items if item.get("itemType") == "FOLDER"]
@@ -85,15 +159,21 @@ def get_tidal_playlists(session):
                 # Cache this folder for future use
                 if folder_name:
                     try:
-                        folder_obj = session.folder(folder_id)
+                        folder_obj = retry_call(
+                            "tidal", "folder", session.folder, folder_id
+                        )
                         _session_folders_cache[folder_name] = folder_obj
                     except Exception:
                         pass
 
                 # Get playlists in this folder
                 try:
-                    folder_obj = session.folder(folder_id)
-                    folder_playlists = folder_obj.items()
+                    folder_obj = retry_call(
+                        "tidal", "folder", session.folder, folder_id
+                    )
+                    folder_playlists = retry_call(
+                        "tidal", "folder items", folder_obj.items
+                    )
                     for item in folder_playlists:
                         if hasattr(item, "name"):  # Check if it's a playlist
                             folder_playlist_key = f"{folder_name}/{item.name}"
@@ -107,7 +187,7 @@ def get_tidal_playlists(session):
 
     # Fallback: Try using tidalapi library methods
     try:
-        user_folders = session.user.folders()
+        user_folders = retry_call("tidal", "folders", session.user.folders)
         for folder in user_folders:
             folder_name = folder.name
             # Cache this folder for future use
@@ -137,13 +217,21 @@ def tidal_dest_check(playlists, session, playlist_name, apple_folders=None):
             if folder_name in _session_folders_cache:
                 folder_obj = _session_folders_cache[folder_name]
                 message("t+", f"Creating new playlist: {new_playlist_name}")
-                playlist = session.user.create_playlist(new_playlist_name, "")
+                playlist = retry_write(
+                    "tidal",
+                    "create playlist",
+                    session.user.create_playlist,
+                    new_playlist_name,
+                    "",
+                )
                 message(
                     "t+",
                     f"Adding playlist to existing folder: {folder_name} (from session cache)",
                 )
                 try:
-                    folder_obj.add_items([playlist.id])
+                    retry_write(
+                        "tidal", "add to folder", folder_obj.add_items, [playlist.id]
+                    )
                     message("t+", "Successfully added playlist to existing folder")
                     # Update the playlists cache
                     playlists[playlist_name] = playlist.id
@@ -161,19 +249,23 @@ def tidal_dest_check(playlists, session, playlist_name, apple_folders=None):
                 }
 
                 # Get existing folders from API
-                folders_response = requests.get(
-                    "https://listen.tidal.com/v2/my-collection/playlists/folders",
+                folders_response = retry_call(
+                    "tidal",
+                    "folders",
+                    get_json,
+                    f"{tidal_api}/v2/my-collection/playlists/folders",
                     headers=headers,
                     params={
                         "countryCode": "NG",
                         "locale": "en_US",
                         "deviceType": "BROWSER",
                     },
+                    timeout=request_timeout,
                 )
 
                 folder_id = None
                 if folders_response.status_code == 200:
-                    folders_data = folders_response.json()
+                    folders_data = folders_response.data
                     # Look for folders in the items array, not a separate folders array
                     items = folders_data.get("items", [])
                     folders = [
@@ -191,18 +283,31 @@ def tidal_dest_check(playlists, session, playlist_name, apple_folders=None):
 
                 # Create playlist first
                 message("t+", f"Creating new playlist: {new_playlist_name}")
-                playlist = session.user.create_playlist(new_playlist_name, "")
+                playlist = retry_write(
+                    "tidal",
+                    "create playlist",
+                    session.user.create_playlist,
+                    new_playlist_name,
+                    "",
+                )
 
                 if folder_id:
                     # Folder exists in API, try to use it
                     try:
-                        folder_obj = session.folder(folder_id)
+                        folder_obj = retry_call(
+                            "tidal", "folder", session.folder, folder_id
+                        )
                         # Cache this folder for future use
                         _session_folders_cache[folder_name] = folder_obj
                         message(
                             "t+", f"Adding playlist to existing folder: {folder_name}"
                         )
-                        folder_obj.add_items([playlist.id])
+                        retry_write(
+                            "tidal",
+                            "add to folder",
+                            folder_obj.add_items,
+                            [playlist.id],
+                        )
                         message("t+", "Successfully added playlist to existing folder")
                         # Update the playlists cache
                         playlists[playlist_name] = playlist.id
@@ -213,10 +318,17 @@ def tidal_dest_check(playlists, session, playlist_name, apple_folders=None):
 
                 # Create new folder and add playlist to it
                 message("t+", f"Creating new folder: {folder_name}")
-                folder_obj = session.user.create_folder(title=folder_name)
+                folder_obj = retry_write(
+                    "tidal",
+                    "create folder",
+                    session.user.create_folder,
+                    title=folder_name,
+                )
                 # Cache this folder for future use
                 _session_folders_cache[folder_name] = folder_obj
-                folder_obj.add_items([playlist.id])
+                retry_write(
+                    "tidal", "add to folder", folder_obj.add_items, [playlist.id]
+                )
                 message("t+", "Successfully created folder and added playlist")
 
                 # Update the playlists cache
@@ -244,13 +356,21 @@ def tidal_dest_check(playlists, session, playlist_name, apple_folders=None):
         if folder_name in _session_folders_cache:
             folder_obj = _session_folders_cache[folder_name]
             message("t+", f"Creating new playlist: {new_playlist_name}")
-            playlist = session.user.create_playlist(new_playlist_name, "")
+            playlist = retry_write(
+                "tidal",
+                "create playlist",
+                session.user.create_playlist,
+                new_playlist_name,
+                "",
+            )
             message(
                 "t+",
                 f"Adding playlist to existing folder: {folder_name} (from session cache)",
             )
             try:
-                folder_obj.add_items([playlist.id])
+                retry_write(
+                    "tidal", "add to folder", folder_obj.add_items, [playlist.id]
+                )
                 message("t+", "Successfully added playlist to existing folder")
                 # Update the playlists cache
                 playlists[playlist_name] = playlist.id
@@ -269,89 +389,100 @@ def tidal_dest_check(playlists, session, playlist_name, apple_folders=None):
     return dest_playlist_id
 
 
+def tidal_track(song):
+    # Track string for a tidalapi track
+    song_name = song.name
+    album_name = song.album.name
+    artist_name = []
+    for i in song.artists:
+        artist = i.name
+        artist_name.append(artist)
+    artist = " ".join(artist_name)
+    return track_string(album_name, song_name, artist)
+
+
+def iter_tidal_playlist_content(session, playlist_id, page_size=100):
+    # Yields tracks on a Tidal playlist a page at a time
+    playlist = retry_call("tidal", "playlist", session.playlist, playlist_id)
+    offset = 0
+    while True:
+        page = retry_call(
+            "tidal", "playlist items", playlist.tracks, limit=page_size, offset=offset
+        )
+        yield [tidal_track(song) for song in page]
+        offset += len(page)
+        if len(page) < page_size:
+            return
+
+
 def get_tidal_playlist_content(session, playlist_id):
-    playlist = session.playlist(playlist_id)
-    playlist_content = playlist.tracks()
-    result = []
-    for song in playlist_content:
-        song_name = song.name
-        album_name = song.album.name
-        artist_name = []
-        for i in song.artists:
-            artist = i.name
-            artist_name.append(artist)
-        artist = " ".join(artist_name)
-        result.append(album_name + "&@#72" + song_name + "&@#72" + artist)
-    return result
-
-
-def move_to_tidal(tidal, playlist_info, dest_id, playlist_name):
-    not_found = []
-    present_song = get_tidal_playlist_content(tidal, dest_id)
-    playlist_info = what_to_move(present_song, playlist_info)
-    not_found = []
-    try:
-        for i in tqdm(playlist_info, desc=f"Moving {playlist_name} to Tidal"):
-            op = i.replace("&@#72", " ")
-            i = " ".join(i.split("&@#72")[1:])
-            search = tidal_search_playlist(i, tidal.access_token)
-            if len(str(search)) == 408:
-                bk = i
-                i = re.sub(r"\(.*?\)", "", i)
-                search = tidal_search_playlist(i, tidal.access_token)
-                if len(list(search)) == 408:
-                    not_found.append(bk)
-                    continue
-            for song in search["tracks"]["items"]:
-                album_name = song["album"]["title"]
-                song_name = song["title"]
-                artist_name = []
-                for j in song["artists"]:
-                    artist = j["name"]
-                    artist_name.append(artist)
-                artist = " ".join(artist_name)
-                found = album_name + " " + song_name + " " + artist
-                songid = song["id"]
-                if compare(found, op):
-                    sleep(0.5)
-                    tidal_add_song_to_playlist(dest_id, songid, tidal.access_token)
-                    break
-            else:
-                not_found.append(i)
-        return not_found
-    except KeyboardInterrupt:
-        print("\n[!] Operation cancelled by user.")
-        sys.exit(0)
-    except Exception:
-        return not_found
+    return [
+        track
+        for page in iter_tidal_playlist_content(session, playlist_id)
+        for track in page
+    ]
+
+
+def tidal_query(tidal, query, target, attempt=None):
+    # One Tidal search, returning the id of the first result matching target
+    tidal_keep_fresh(tidal)
+    with stage("search"):
+        search = tidal_search_playlist(query, tidal.access_token)
+    for song in search.get("tracks", {}).get("items", []):
+        artist = " ".join(j["name"] for j in song["artists"])
+        found = track_string(song["album"]["title"], song["title"], artist)
+        with stage("compare"):
+            matched = compare(found, target)
+        if matched:
+            return song["id"]
+        note_candidate(attempt, found, target)
+    return None
 
 
 def tidal_create_playlist(playlist_name, playlist_desc, access_token):
-    tidal_create_playlist_url = f"https://listen.tidal.com/v2/my-collection/playlists/folders/create-playlist?description={playlist_desc}&folderId=root&name={playlist_name}&countryCode=NG&locale=en_US&deviceType=BROWSER"
+    tidal_create_playlist_url = f"{tidal_api}/v2/my-collection/playlists/folders/create-playlist?description={playlist_desc}&folderId=root&name={playlist_name}&countryCode=NG&locale=en_US&deviceType=BROWSER"
     headers = {
         "authority": "listen.tidal.com",
         "authorization": f"Bearer {access_token}",
         "origin": "https://listen.tidal.com",
         "referer": "https://listen.tidal.com/my-collection/playlists",
     }
-    r = requests.put(tidal_create_playlist_url, headers=headers)
+    r = retry_write(
+        "tidal",
+        "create playlist",
+        requests.put,
+        tidal_create_playlist_url,
+        headers=headers,
+        timeout=request_timeout,
+    )
     return r.json()["data"]["uuid"]
 
 
 def tidal_search_playlist(search_query, access_token):
-    tidal_search_playlist_url = f"https://listen.tidal.com/v1/search/top-hits?query={search_query}&limit=5&offset=0&types=TRACKS&includeContributors=true&countryCode=NG&locale=en_US&deviceType=BROWSER"
+    tidal_search_playlist_url = f"{tidal_api}/v1/search/top-hits?query={search_query}&limit=5&offset=0&types=TRACKS&includeContributors=true&countryCode=NG&locale=en_US&deviceType=BROWSER"
     headers = {
         "authority": "listen.tidal.com",
         "authorization": f"Bearer {access_token}",
         "origin": "https://listen.tidal.com",
         "referer": "https://listen.tidal.com/my-collection/playlists",
     }
-    r = requests.get(tidal_search_playlist_url, headers=headers)
-    return r.json()
+    r = shared_call(
+        "tidal",
+        "search",
+        search_query,
+        get_json,
+        tidal_search_playlist_url,
+        headers=headers,
+        timeout=request_timeout,
+    )
+    # An error status is a failed search, not a search without results
+    r.raise_for_status()
+    return r.data
 
 
 def tidal_add_song_to_playlist(playlist_id, song_id, access_token):
-    tidal_get_request = f"https://listen.tidal.com/v1/playlists/{playlist_id}?countryCode=NG&locale=en_US&deviceType=BROWSER"
+    # song_id may also be a comma separated list of ids to add in one request
+    tidal_get_request = f"{tidal_api}/v1/playlists/{playlist_id}?countryCode=NG&locale=en_US&deviceType=BROWSER"
     get_headers = {
         "Host": "listen.tidal.com",
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:102.0) Gecko/20100101 Firefox/102.0",
@@ -365,9 +496,16 @@ def tidal_add_song_to_playlist(playlist_id, song_id, access_token):
         "origin": "https://listen.tidal.com",
         "referer": "https://listen.tidal.com/my-collection/playlists",
     }
-    rasd = requests.get(tidal_get_request, headers=get_headers)
+    rasd = retry_call(
+        "tidal",
+        "playlist etag",
+        requests.get,
+        tidal_get_request,
+        headers=get_headers,
+        timeout=request_timeout,
+    )
     etag = rasd.headers["Etag"]
-    tidal_add_song_url = f"https://listen.tidal.com/v1/playlists/{playlist_id}/items?countryCode=NG&locale=en_US&deviceType=BROWSER"
+    tidal_add_song_url = f"{tidal_api}/v1/playlists/{playlist_id}/items?countryCode=NG&locale=en_US&deviceType=BROWSER"
     headers = {
         "authority": "listen.tidal.com",
         "authorization": f"Bearer {access_token}",
@@ -376,5 +514,75 @@ def tidal_add_song_to_playlist(playlist_id, song_id, access_token):
         "dnt": "1",
         "if-none-match": etag,
     }
-    data = {"onArtifactNotFound": "FAIL", "onDupes": "FAIL", "trackIds": f"{song_id}"}
-    requests.post(tidal_add_song_url, headers=headers, data=data)
+    data = {"onArtifactNotFound": "FAIL", "onDupes": "SKIP", "trackIds": f"{song_id}"}
+    return retry_write(
+        "tidal",
+        "add items",
+        requests.post,
+        tidal_add_song_url,
+        headers=headers,
+        data=data,
+        timeout=request_timeout,
+    )
+
+
+class TidalProvider(Provider):
+    name = "tidal"
+    code = "t"
+    label = "Tidal"
+    batch_size = 50
+    page_size = 100
+    concurrency = 2
+    max_concurrency = 8
+    rate_limit = 5.0
+
+    def __init__(self):
+        super().__init__()
+        self._top_playlists = None
+
+    def auth(self):
+        self.session = tidal_auth()
+
+    def list_playlists(self):
+        return get_tidal_playlists(self.session, self.sizes)
+
+    def lookup(self, playlist_name):
+        # Only "folder/playlist" names need the folder crawl of the full listing
+        if "/" in playlist_name or self._playlists is not None:
+            return self.playlists
+        if self._top_playlists is None:
+            with stage("listing"):
+                self._top_playlists = get_tidal_user_playlists(self.session)
+        return self._top_playlists
+
+    def resolve(self, playlist_name):
+        return confirm_playlist_exist(
+            playlist_name, self.lookup(playlist_name), self.name
+        )
+
+    def read_id(self, playlist_id):
+        tidal_keep_fresh(self.session)
+        return get_tidal_playlist_content(self.session, playlist_id)
+
+    def pages_id(self, playlist_id):
+        tidal_keep_fresh(self.session)
+        return iter_tidal_playlist_content(self.session, playlist_id, self.page_size)
+
+    def query(self, query, target, attempt=None):
+        return tidal_query(self.session, query, target, attempt)
+
+    def add(self, dest_id, song_ids):
+        tidal_keep_fresh(self.session)
+        r = tidal_add_song_to_playlist(
+            dest_id, ",".join(str(i) for i in song_ids), self.session.access_token
+        )
+        # A song Tidal can't find fails the whole request
+        return [] if added(r) else list(song_ids)
+
+    def create(self, playlist_name, source=None):
+        # Recreate Apple Music folders when moving from Apple
+        apple_folders = getattr(source, "folders", None)
+        tidal_keep_fresh(self.session)
+        return tidal_dest_check(
+            self.lookup(playlist_name), self.session, playlist_name, apple_folders
+        )
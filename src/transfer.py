@@ -0,0 +1,361 @@
+import hashlib
+import queue
+import sys
+import threading
+from itertools import chain, islice
+from time import monotonic
+
+from src.matching import index_text
+from src.metrics import stage
+from src.normalize import track_fields, track_key, versions
+
+# Tracks buffered between pipeline stages, so memory stays flat however large
+# the source playlist is
+QUEUE_SIZE = 256
+
+# Marks the end of a queue's input, one per consumer
+_DONE = object()
+
+# monotonic() time after which no new track is started, None for no limit
+_deadline = None
+
+
+def set_deadline(seconds):
+    # Budget for the whole run from now, for --deadline
+    global _deadline
+    _deadline = None if seconds is None else monotonic() + seconds
+
+
+def expired():
+    return _deadline is not None and monotonic() >= _deadline
+
+
+def stream(pages):
+    # Flatten source pages into tracks, fetching the next page only when needed
+    pages = iter(pages)
+    while True:
+        with stage("source read"):
+            page = next(pages, None)
+        if page is None:
+            return
+        yield from page
+
+
+def fan_out(tracks, count, queue_size=QUEUE_SIZE):
+    """
+    Split one track stream into count streams while reading the source once.
+
+    A feeder thread copies every track into a bounded queue per stream, so the
+    slowest consumer sets the pace and memory stays flat. Source errors are
+    raised in every stream once its queue is drained.
+    """
+    queues = [queue.Queue(queue_size) for _ in range(count)]
+    errors = []
+
+    def feed():
+        try:
+            for track in tracks:
+                for copy in queues:
+                    copy.put(track)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            for copy in queues:
+                copy.put(_DONE)
+
+    def drain(copy):
+        while True:
+            track = copy.get()
+            if track is _DONE:
+                if errors:
+                    raise errors[0]
+                return
+            yield track
+
+    threading.Thread(target=feed, daemon=True).start()
+    return [drain(copy) for copy in queues]
+
+
+def _search(dest, track, search):
+    # Returns the song id and the attempt dict describing the search. A failing
+    # search only loses its own track, not the rest of the playlist. Each query
+    # the search sends waits on the rate limiter itself
+    attempt = {"track": track, "queries": []}
+    try:
+        song_id = search(dest, track, attempt)
+    except Exception as e:
+        # An outage rather than a miss, the track may well be there
+        attempt["error"] = repr(e)
+        attempt["reason"] = "error"
+        return None, attempt
+    if song_id is None:
+        attempt["reason"] = "not found"
+    return song_id, attempt
+
+
+def _add(dest, dest_id, song_ids):
+    # Ids the destination didn't take, every request paced by its rate limiter
+    dest.limiter.wait()
+    with stage("write"):
+        try:
+            failed = set(dest.add(dest_id, song_ids))
+        except Exception:
+            return set(song_ids)
+    if len(song_ids) > 1 and failed >= set(song_ids):
+        # One song a platform rejects can fail the whole request, so the
+        # batch's songs are tried again one at a time
+        failed = {song_id for song_id in song_ids if _add(dest, dest_id, [song_id])}
+    return failed
+
+
+def _write(dest, dest_id, batch, progress):
+    # Add one batch of (position, attempt, song id), returning attempts that failed
+    failed = _add(dest, dest_id, [song_id for _, _, song_id in batch])
+    rejected = []
+    for position, attempt, song_id in batch:
+        progress.finish(position)
+        if song_id in failed:
+            attempt["reason"] = "add failed"
+            rejected.append(attempt)
+    return rejected
+
+
+def _default_search(dest, track, attempt):
+    return dest.search(track, attempt)
+
+
+def mark(track):
+    # Short fingerprint of a track for the resume file, the same however a
+    # platform spells it
+    return hashlib.blake2b(track_key(track).encode(), digest_size=4).hexdigest()
+
+
+def _resume_from(tracks, skip, last):
+    # The source tracks left after the skip a previous run got through, and the
+    # number skipped. They are only skipped when the last of them is still the
+    # track marked last: a source that changed since (e.g Spotify likes, newest
+    # first) is diffed in full instead
+    if not skip:
+        return tracks, 0
+    tracks = iter(tracks)
+    done = list(islice(tracks, skip))
+    if len(done) == skip and mark(done[-1]) == last:
+        return tracks, skip
+    return chain(done, tracks), 0
+
+
+class _Progress:
+    """
+    Source positions of the tracks a transfer has started but not finished.
+
+    Counts the source tracks diff() reads, which yields each track as soon as
+    it reads it, so a track's position is known when it comes out of diff().
+    The track before each started one is kept with it, to mark where the next
+    run picks up.
+    """
+
+    def __init__(self, tracks):
+        self.read = 0
+        self._tracks = tracks
+        self._previous = None
+        self._current = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        for track in self._tracks:
+            self.read += 1
+            self._previous, self._current = self._current, track
+            yield track
+
+    def start(self):
+        # Position of the track diff() just handed on
+        position = self.read - 1
+        with self._lock:
+            self._pending[position] = self._previous
+        return position
+
+    def finish(self, position):
+        with self._lock:
+            self._pending.pop(position, None)
+
+    def first_unfinished(self):
+        # Source tracks before this position are all done with, None if all are,
+        # and the track just before it (None for the first track read)
+        with self._lock:
+            if not self._pending:
+                return None, None
+            position = min(self._pending)
+            return position, self._pending[position]
+
+
+def _indexed(dest, track):
+    # Song id of a track matched earlier in the run under another spelling or
+    # from another album, e.g "Song - 2011 Remaster" vs "Song (2011 Remaster)",
+    # None when there is none. Close isn't enough here: the title and artist
+    # must be the same once normalized, and a live or remixed recording isn't
+    # the song itself
+    with stage("index"):
+        hit = dest.index.lookup(track)
+    if hit is None:
+        return None
+    match, song_id = hit
+    if index_text(match) != index_text(track):
+        return None
+    if versions(track_fields(match)["title"]) != versions(track_fields(track)["title"]):
+        return None
+    return song_id
+
+
+def _feed(dest, tracks, todo, found, workers, errors, progress):
+    # Reader stage: push tracks to the searchers, then an end marker for each.
+    # Tracks already resolved earlier in the run skip the search entirely, and
+    # past the deadline the rest of the source is left for the next run
+    try:
+        for track in tracks:
+            position = progress.start()
+            if expired():
+                break
+            if track in dest.resolved:
+                song_id, attempt = dest.resolved[track]
+                dest.reused += 1
+                found.put((position, song_id, dict(attempt)))
+            elif (song_id := _indexed(dest, track)) is not None:
+                dest.reused += 1
+                found.put((position, song_id, {"track": track, "queries": []}))
+            else:
+                todo.put((position, track))
+    except Exception as e:
+        errors.append(e)
+    finally:
+        for _ in range(workers):
+            todo.put(_DONE)
+
+
+def _searcher(dest, todo, found, search):
+    # Search stage: resolve tracks to destination song ids until told to stop
+    while True:
+        item = todo.get()
+        if item is _DONE:
+            found.put(_DONE)
+            return
+        # Queued tracks aren't started once the deadline has passed
+        if not expired():
+            position, track = item
+            found.put((position, *_search(dest, track, search)))
+
+
+def transfer(
+    tracks,
+    dest,
+    dest_id,
+    playlist_name,
+    queue_size=QUEUE_SIZE,
+    search=None,
+    position=None,
+    resume=None,
+):
+    """
+    Move tracks into a destination playlist and return the attempts that failed.
+
+    tracks may be any iterable, including a generator still paging through the
+    source. A reader thread diffs it against the destination, dest.ceiling
+    searchers look the tracks up and this thread adds matches dest.batch_size at
+    a time, with bounded queues between the stages. Requests are paced by the
+    destination's rate limiter and its adaptive concurrency gate.
+
+    Search results are kept in dest.resolved for the rest of the run, so a song
+    that appears in many playlists (e.g with -A) is only searched for once.
+    Matches also go into dest.index, where the same song spelled another way
+    in a later playlist is found without a search.
+
+    Each failure is a dict with the track, the queries tried, the closest
+    rejected candidate and its score, and the reason, ready for log_failures().
+    Once the --deadline passes no new track is searched. Searches already sent
+    finish and their matches are written before returning; tracks that weren't
+    reached are neither added nor reported as failures.
+
+    search(dest, track, attempt) replaces dest.search, e.g for --retry-failed.
+    position sets the progress bar's line when several transfers run at once.
+
+    resume is a {destination name: (source tracks done with, mark() of the
+    last of them)} dict for the playlist. The tracks a previous run got through
+    are skipped without a diff(), whose string comparison can't always tell
+    another platform's spelling of a track apart, as long as the last of them
+    is still where it was. When the deadline cuts this run short, the entry is
+    updated for the next run; once the playlist is done it's removed.
+    """
+    search = search or _default_search
+    # Imported here so that `main.py --help` doesn't pay for it
+    from tqdm import tqdm
+
+    skip, last = (resume or {}).get(dest.name, (0, None))
+    tracks, skip = _resume_from(tracks, skip, last)
+    progress = _Progress(tracks)
+    with stage("diff"):
+        todo_tracks = dest.diff(dest_id, progress)
+    todo = queue.Queue(queue_size)
+    found = queue.Queue(queue_size)
+    errors = []
+    # Daemon threads so a cancelled run doesn't wait on blocked stages
+    workers = [
+        threading.Thread(
+            target=_searcher, args=(dest, todo, found, search), daemon=True
+        )
+        for _ in range(dest.ceiling)
+    ]
+    reader = threading.Thread(
+        target=_feed,
+        args=(dest, todo_tracks, todo, found, len(workers), errors, progress),
+        daemon=True,
+    )
+    for thread in [reader, *workers]:
+        thread.start()
+
+    not_found = []
+    batch = []
+    bar = tqdm(
+        desc=f"Moving {playlist_name} to {dest.label}", unit="track", position=position
+    )
+    try:
+        running = len(workers)
+        while running:
+            item = found.get()
+            if item is _DONE:
+                running -= 1
+                continue
+            bar.update()
+            position, song_id, attempt = item
+            # Searches that errored are tried again if the song comes up later
+            track = attempt["track"]
+            if "error" not in attempt and track not in dest.resolved:
+                dest.resolved[track] = (song_id, dict(attempt))
+                if song_id is not None:
+                    dest.index.add(track, song_id)
+            if song_id is None:
+                progress.finish(position)
+                not_found.append(attempt)
+                continue
+            batch.append((position, attempt, song_id))
+            if len(batch) >= dest.batch_size:
+                not_found += _write(dest, dest_id, batch, progress)
+                batch = []
+        if batch:
+            not_found += _write(dest, dest_id, batch, progress)
+    except KeyboardInterrupt:
+        print("\n[!] Operation cancelled by user.")
+        sys.exit(0)
+    finally:
+        bar.close()
+    if errors:
+        raise errors[0]
+    if resume is not None:
+        first, previous = progress.first_unfinished()
+        if first is None:
+            resume.pop(dest.name, None)
+        elif previous is not None:
+            resume[dest.name] = (skip + first, mark(previous))
+        else:
+            # Cut short on the first track read, still where the last run was
+            resume[dest.name] = (skip, last if skip else None)
+    return not_found
@@ -0,0 +1,80 @@
+"""
+Bulk matching of two whole libraries with NumPy, which is optional.
+
+Tracks become hashed trigram count vectors and whole blocks of them are
+compared at once with a matrix product, leaving compare() only the few pairs
+whose cosine similarity is high enough. Install numpy to use it.
+"""
+
+import zlib
+from collections import defaultdict
+
+from src.matching import best_match, index_text, trigrams
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Width of the hashed vectors. Title + artist keys have a few dozen trigrams,
+# so collisions stay rare, and candidates are rescored exactly by best_match()
+DIMENSIONS = 1024
+# Least cosine similarity for a pair to be checked with compare()
+THRESHOLD = 0.4
+# Source rows compared against every target per matrix product
+BLOCK = 1024
+# Most candidate targets per source checked with compare()
+TOP = 10
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Bulk matching needs NumPy: pip install numpy")
+
+
+def embed(tracks):
+    # One L2-normalised row of hashed trigram counts per track
+    _require_numpy()
+    matrix = np.zeros((len(tracks), DIMENSIONS), dtype=np.float32)
+    for row, track in enumerate(tracks):
+        for gram in trigrams(index_text(track)):
+            # crc32 rather than hash(), which is salted per process
+            matrix[row, zlib.crc32(gram.encode()) % DIMENSIONS] += 1
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def similar_pairs(sources, targets, threshold=THRESHOLD, block=BLOCK):
+    """
+    Yield (source index, target index, cosine similarity) for every pair of
+    tracks above threshold.
+
+    Targets are embedded once, DIMENSIONS float32 each (4KB a track). Sources
+    are embedded a block at a time, each block freed once its block x
+    len(targets) scores are checked, so sources add no memory per track.
+    """
+    target_vectors = embed(targets).T
+    for start in range(0, len(sources), block):
+        scores = embed(sources[start : start + block]) @ target_vectors
+        rows, columns = np.nonzero(scores >= threshold)
+        for row, column in zip(rows.tolist(), columns.tolist()):
+            yield start + row, column, float(scores[row, column])
+
+
+def reconcile(sources, targets, threshold=THRESHOLD, top=TOP):
+    """
+    For every source track, (target index, score) of its match in targets or
+    None, like best_match() against the whole of targets but scoring only the
+    top candidates by cosine similarity.
+    """
+    candidates = defaultdict(list)
+    for source, target, cosine in similar_pairs(sources, targets, threshold):
+        candidates[source].append((cosine, target))
+    matches = []
+    for source, track in enumerate(sources):
+        ranked = sorted(candidates.get(source, ()), reverse=True)[:top]
+        # Checked in target order so ties resolve like best_match()
+        indexes = sorted(target for _, target in ranked)
+        match = best_match(track, [targets[i] for i in indexes])
+        matches.append(None if match is None else (indexes[match[0]], match[1]))
+    return matches
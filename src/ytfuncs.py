@@ -1,17 +1,21 @@
 import sys
-from time import sleep
 
-from tqdm import tqdm
 from ytmusicapi import YTMusic
 
 from config.config import ytfile
-from src.mainfuncs import message, what_to_move
+from src.coalesce import shared_call
+from src.mainfuncs import compare, message, note_candidate
+from src.metrics import stage
+from src.normalize import track_string
+from src.providers import Provider
+from src.retry import TimeoutSession, retry_call, retry_write
 
 
 def ytmusic_auth():
     # Attempt to authenticate Youtube music
     try:
-        ytmusic = YTMusic(ytfile)
+        # ytmusicapi takes no timeout, only a session to send requests with
+        ytmusic = YTMusic(ytfile, requests_session=TimeoutSession())
         message("y+", "Successfully Authenticated")
         return ytmusic
     except Exception:
@@ -19,44 +23,51 @@ def ytmusic_auth():
         sys.exit(0)
 
 
-def get_youtube_playlists(ytmusic):
-    # Gets user youtube music playlists
-    user_playlists = ytmusic.get_library_playlists(1000)
+def get_youtube_playlists(ytmusic, sizes=None):
+    # Gets user youtube music playlists, and their track counts into sizes if given
+    user_playlists = retry_call(
+        "youtube", "playlists", ytmusic.get_library_playlists, 1000
+    )
     yt_lists = {}
     for i in user_playlists:
         playlist_name = i["title"]
         playlist_id = i["playlistId"]
         yt_lists[playlist_name] = playlist_id
+        # The count comes as text such as "1,024", or not at all
+        count = str(i.get("count", "")).replace(",", "")
+        if sizes is not None and count.isdigit():
+            sizes[playlist_name] = int(count)
     return yt_lists
 
 
 def change_name(ytmusic, yt_lists):
     # Changes spfy2yt to sound-tunnel for users of old script
-    for i in yt_lists:
+    for i in list(yt_lists):
         if "spfy2yt" in i:
             new_name = i.replace("spfy2yt", "sound-tunnel")
             id = yt_lists[i]
-            success = ytmusic.edit_playlist(id, new_name)
+            success = retry_write(
+                "youtube", "edit playlist", ytmusic.edit_playlist, id, new_name
+            )
             if success == "STATUS_SUCCEEDED":
+                yt_lists[new_name] = yt_lists.pop(i)
                 message("y+", f"Renamed {i} to {new_name} to fit new script")
 
 
 def get_yt_playlist_content(ytmusic, source_id):
-    playlist_content = ytmusic.get_playlist(source_id)
-    result = []
-    for song in playlist_content["tracks"]:
-        song_name = song["title"]
-        try:
-            album_name = song["album"]["name"]
-        except KeyError:
-            album_name = ""
-        artist_name = []
-        for i in song["artists"]:
-            artist = i["name"]
-            artist_name.append(artist)
-        artist = " ".join(artist_name)
-        result.append(album_name + "&" + song_name + "&" + artist)
-    return result
+    # limit=None reads every track, ytmusicapi stops at 100 by default
+    playlist_content = retry_call(
+        "youtube", "playlist items", ytmusic.get_playlist, source_id, limit=None
+    )
+    return [yt_track_string(song) for song in playlist_content["tracks"]]
+
+
+def yt_track_string(song):
+    # Same separator as the other platforms, so diff() can spot songs moved.
+    # Singles and videos come without an album, or with None for one
+    album_name = (song.get("album") or {}).get("name") or ""
+    artist = " ".join(i["name"] for i in song["artists"])
+    return track_string(album_name, song["title"], artist)
 
 
 def yt_dest_check(ytmusic, yt_lists, dest_playlist_name):
@@ -64,36 +75,76 @@ def yt_dest_check(ytmusic, yt_lists, dest_playlist_name):
         dest_playlist_id = yt_lists[dest_playlist_name]
         message("y+", "Playlist exists, adding missing songs")
     else:
-        dest_playlist_id = ytmusic.create_playlist(
-            dest_playlist_name, "Sound Tunnel playlist"
+        dest_playlist_id = retry_write(
+            "youtube",
+            "create playlist",
+            ytmusic.create_playlist,
+            dest_playlist_name,
+            "Sound Tunnel playlist",
         )
         message("y+", "Playlist created")
     return dest_playlist_id
 
 
-def move_to_ytmusic(ytmusic, playlist_info, dest_id, playlist_name):
-    not_found = []
-    present_song = get_yt_playlist_content(ytmusic, dest_id)
-    playlist_info = what_to_move(present_song, playlist_info)
-    not_found = []
-    try:
-        for i in tqdm(playlist_info, desc=f"Moving {playlist_name} to YouTube Music"):
-            i = i.replace("&", " ")
-            search = ytmusic.search(i, "songs")
-            songid = [search[0]["videoId"]]
-            sleep(0.5)
-            add_success = ytmusic.add_playlist_items(dest_id, songid)
-            # Didn't add compare since yt has everything and has good search algo
-            if (
-                "song is already in the playlist" in add_success
-                or "SUCCEEDED" in add_success
-            ):
-                pass
-            else:
-                not_found.append(i)
-        return not_found
-    except KeyboardInterrupt:
-        print("\n[!] Operation cancelled by user.")
-        sys.exit(0)
-    except Exception:
-        return not_found
+def yt_query(ytmusic, query, target, attempt=None):
+    # One YouTube search, returning the id of the first result matching target.
+    # Title-only queries bring up covers and namesakes, so results are scored
+    # like every other platform's
+    with stage("search"):
+        search = shared_call("youtube", "search", query, ytmusic.search, query, "songs")
+    for song in search[:5]:
+        found = yt_track_string(song)
+        with stage("compare"):
+            matched = compare(found, target)
+        if matched:
+            return song["videoId"]
+        note_candidate(attempt, found, target)
+    return None
+
+
+class YouTubeProvider(Provider):
+    name = "youtube"
+    code = "y"
+    label = "YouTube Music"
+    batch_size = 50
+    page_size = 100
+    concurrency = 2
+    max_concurrency = 8
+    rate_limit = 5.0
+
+    def auth(self):
+        self.session = ytmusic_auth()
+
+    def list_playlists(self):
+        return get_youtube_playlists(self.session, self.sizes)
+
+    def all_playlists(self):
+        # Old spfy2yt names are only fixed up when the whole library is shown or moved
+        change_name(self.session, self.playlists)
+        return super().all_playlists()
+
+    def show_playlists(self):
+        change_name(self.session, self.playlists)
+        super().show_playlists()
+
+    def read_id(self, playlist_id):
+        return get_yt_playlist_content(self.session, playlist_id)
+
+    def query(self, query, target, attempt=None):
+        return yt_query(self.session, query, target, attempt)
+
+    def add(self, dest_id, song_ids):
+        add_success = retry_write(
+            "youtube", "add items", self.session.add_playlist_items, dest_id, song_ids
+        )
+        # Batches report a single status for every song in them
+        status = str(add_success)
+        if "SUCCEEDED" in status:
+            return []
+        if "song is already in the playlist" in status and len(song_ids) == 1:
+            return []
+        # One duplicate makes YouTube drop the whole batch
+        return list(song_ids)
+
+    def create(self, playlist_name, source=None):
+        return yt_dest_check(self.session, self.playlists, playlist_name)
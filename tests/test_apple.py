@@ -1,20 +1,28 @@
+import base64
+import json
 import os
 import sys
+import tempfile
 import unittest
 from unittest.mock import Mock, patch
 
 import pytest
+import requests
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from src import retry
 from src.applefuncs import (
     apple_auth,
+    apple_auth_cached,
     apple_dest_check,
     apple_is_logged_in,
+    apple_token_expiry,
     get_apple_playlist_content,
     get_apple_playlists,
-    move_to_apple,
+    iter_apple_playlist_content,
+    save_apple_auth,
 )
 
 
@@ -186,6 +194,58 @@ class TestAppleFunctions(unittest.TestCase):
 
         assert not result
 
+    @patch("requests.get")
+    def test_apple_is_logged_in_uses_storefront(self, mock_get):
+        """Test the credential check requests the storefront, not the library."""
+        mock_get.return_value = Mock(status_code=200)
+
+        apple_is_logged_in("Bearer test_token", "test_media_token")
+
+        assert mock_get.call_args[0][0].endswith("/v1/me/storefront")
+
+    def test_apple_token_expiry(self):
+        """Test the expiry is read from the developer token's JWT payload."""
+        payload = base64.urlsafe_b64encode(json.dumps({"exp": 1900000000}).encode())
+        bearer = f"Bearer header.{payload.decode().rstrip('=')}.signature"
+
+        assert apple_token_expiry(bearer) == 1900000000
+        assert apple_token_expiry("Bearer not-a-jwt") is None
+
+    def test_apple_auth_cache(self):
+        """Test a successful check is trusted only for the same unexpired tokens."""
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = os.path.join(tmp, "i_auth_valid.json")
+            with patch("src.applefuncs.applecache", cache):
+                assert not apple_auth_cached("Bearer a", "media")
+
+                save_apple_auth("Bearer a", "media")
+                assert apple_auth_cached("Bearer a", "media")
+                assert not apple_auth_cached("Bearer b", "media")
+
+                save_apple_auth("Bearer a", "media", window=-1)
+                assert not apple_auth_cached("Bearer a", "media")
+
+    @patch("requests.get")
+    def test_apple_auth_skips_check_when_cached(self, mock_get):
+        """Test repeated runs inside the validity window make no auth request."""
+        mock_get.return_value = Mock(status_code=200)
+        credentials = {"authorization": "Bearer a", "media-user-token": "media"}
+        with tempfile.TemporaryDirectory() as tmp:
+            creds = os.path.join(tmp, "i_auth.txt")
+            with open(creds, "w") as f:
+                json.dump(credentials, f)
+            with (
+                patch("src.applefuncs.applefile", creds),
+                patch("src.applefuncs.applecache", os.path.join(tmp, "valid.json")),
+                patch("src.applefuncs.message"),
+            ):
+                first = apple_auth()
+                second = apple_auth()
+
+        assert mock_get.call_count == 1
+        assert first == second
+        assert second["Media-User-Token"] == "media"
+
     @patch("requests.get")
     def test_get_apple_playlists(self, mock_get):
         """Test retrieving Apple Music playlists."""
@@ -255,17 +315,17 @@ class TestAppleFunctions(unittest.TestCase):
         assert playlists == expected_playlists
         assert folders == expected_folders
 
+    @patch("src.retry.sleep")
     @patch("requests.get")
-    def test_get_apple_playlists_api_failure(self, mock_get):
-        """Test handling API failure when retrieving playlists."""
+    def test_get_apple_playlists_api_failure(self, mock_get, mock_sleep):
+        """Test a listing that keeps failing raises instead of looking empty."""
         mock_response = Mock()
         mock_response.status_code = 500
         mock_get.return_value = mock_response
 
-        playlists, folders = get_apple_playlists(self.mock_headers)
-
-        assert playlists == {}
-        assert folders == {}
+        with pytest.raises(requests.HTTPError):
+            get_apple_playlists(self.mock_headers)
+        assert mock_get.call_count == retry.ATTEMPTS
 
     def test_apple_dest_check_existing_playlist(self):
         """Test checking for existing destination playlist."""
@@ -308,6 +368,24 @@ class TestAppleFunctions(unittest.TestCase):
         ]
         assert result == expected
 
+    @patch("requests.get")
+    def test_iter_apple_playlist_content_pages(self, mock_get):
+        """Test playlists are read page_size songs at a time."""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            **self.mock_playlist_content,
+            "meta": {"total": 5},
+        }
+        mock_get.return_value = mock_response
+
+        pages = list(iter_apple_playlist_content(self.mock_headers, "p.123", 2))
+
+        assert len(pages) == 3
+        urls = [call.args[0] for call in mock_get.call_args_list]
+        assert all("limit=2" in url for url in urls)
+        assert urls[-1].endswith("&offset=4")
+
     @patch("requests.get")
     def test_get_apple_playlist_content_empty(self, mock_get):
         """Test retrieving content from empty playlist."""
@@ -334,134 +412,6 @@ class TestAppleFunctions(unittest.TestCase):
 
         assert result == []
 
-    @patch("src.applefuncs.get_apple_playlist_content")
-    @patch("src.applefuncs.what_to_move")
-    @patch("src.applefuncs.tqdm")
-    @patch("src.applefuncs.appleapi_music_search")
-    @patch("src.applefuncs.appleapi_add_playlist_item")
-    def test_move_to_apple(
-        self, mock_add_song, mock_search, mock_tqdm, mock_what_to_move, mock_get_content
-    ):
-        """Test moving songs to Apple Music playlist."""
-        # Mock existing playlist content
-        mock_get_content.return_value = []
-
-        # Mock songs to move
-        playlist_info = [
-            "A Night at the Opera&@#72Bohemian Rhapsody&@#72Queen",
-            "Imagine&@#72Imagine&@#72John Lennon",
-        ]
-        mock_what_to_move.return_value = playlist_info
-
-        # Mock search results
-        mock_search.return_value = {
-            "results": {
-                "song": {
-                    "data": [
-                        {
-                            "id": "song_123",
-                            "attributes": {
-                                "name": "Bohemian Rhapsody",
-                                "albumName": "A Night at the Opera",
-                                "artistName": "Queen",
-                            },
-                        }
-                    ]
-                }
-            }
-        }
-
-        # Mock tqdm to return the input directly
-        mock_tqdm.return_value = playlist_info
-
-        with (
-            patch("src.applefuncs.compare", return_value=True),
-            patch("src.applefuncs.sleep"),
-        ):
-            move_to_apple(self.mock_headers, playlist_info, "p.123", "Test Playlist")
-
-            # Should call add song to playlist
-            mock_add_song.assert_called()
-
-    @patch("src.applefuncs.get_apple_playlist_content")
-    @patch("src.applefuncs.what_to_move")
-    @patch("src.applefuncs.tqdm")
-    @patch("src.applefuncs.appleapi_music_search")
-    def test_move_to_apple_song_not_found(
-        self, mock_search, mock_tqdm, mock_what_to_move, mock_get_content
-    ):
-        """Test moving songs to Apple Music when some songs are not found."""
-        mock_get_content.return_value = []
-
-        playlist_info = ["Unknown Album&@#72Unknown Song&@#72Unknown Artist"]
-        mock_what_to_move.return_value = playlist_info
-        mock_tqdm.return_value = playlist_info
-
-        # Mock empty search results
-        mock_search.return_value = {"results": {}}
-
-        result = move_to_apple(
-            self.mock_headers, playlist_info, "p.123", "Test Playlist"
-        )
-
-        # Should return the song that wasn't found
-        assert result == ["Unknown Album Unknown Song Unknown Artist"]
-
-    @patch("src.applefuncs.get_apple_playlist_content")
-    @patch("src.applefuncs.what_to_move")
-    @patch("src.applefuncs.tqdm")
-    @patch("src.applefuncs.appleapi_music_search")
-    def test_move_to_apple_with_parentheses_removal(
-        self, mock_search, mock_tqdm, mock_what_to_move, mock_get_content
-    ):
-        """Test moving songs with parentheses removal fallback."""
-        mock_get_content.return_value = []
-
-        playlist_info = ["Album&@#72Song (Remix)&@#72Artist"]
-        mock_what_to_move.return_value = playlist_info
-        mock_tqdm.return_value = playlist_info
-
-        # First search returns empty, second search returns results
-        empty_result = {"results": {}}
-        success_result = {
-            "results": {
-                "song": {
-                    "data": [
-                        {
-                            "id": "song_123",
-                            "attributes": {
-                                "name": "Song",
-                                "albumName": "Album",
-                                "artistName": "Artist",
-                            },
-                        }
-                    ]
-                }
-            }
-        }
-        mock_search.side_effect = [empty_result, success_result]
-
-        with (
-            patch("src.applefuncs.compare", return_value=True),
-            patch("src.applefuncs.sleep"),
-            patch("src.applefuncs.appleapi_add_playlist_item"),
-        ):
-            move_to_apple(self.mock_headers, playlist_info, "p.123", "Test Playlist")
-
-            # Should have called search twice (with and without parentheses)
-            assert mock_search.call_count == 2
-
-    @patch("sys.exit")
-    def test_move_to_apple_keyboard_interrupt(self, mock_exit):
-        """Test handling keyboard interrupt during move operation."""
-        with (
-            patch("src.applefuncs.get_apple_playlist_content", return_value=[]),
-            patch("src.applefuncs.what_to_move", return_value=["test"]),
-            patch("src.applefuncs.tqdm", side_effect=KeyboardInterrupt()),
-        ):
-            move_to_apple(self.mock_headers, ["test"], "p.123", "Test Playlist")
-            mock_exit.assert_called_with(0)
-
     @patch("requests.post")
     def test_appleapi_create_playlist(self, mock_post):
         """Test creating a new Apple Music playlist via API."""
@@ -507,6 +457,22 @@ class TestAppleFunctions(unittest.TestCase):
 
         mock_post.assert_called_once()
 
+    @patch("requests.post")
+    def test_add_batch_rejected(self, mock_post):
+        """Test every song of a batch Apple rejects is reported."""
+        from src.applefuncs import AppleProvider
+
+        def post(url, json=None, **kwargs):
+            ids = [item["id"] for item in json["data"]]
+            return Mock(status_code=400 if "bad" in ids else 204)
+
+        mock_post.side_effect = post
+        provider = AppleProvider()
+        provider.session = self.mock_headers
+
+        assert provider.add("p.123", ["s1", "bad", "s3"]) == ["s1", "bad", "s3"]
+        assert mock_post.call_count == 1
+
     @patch("requests.get")
     def test_appleapi_get_folder_info(self, mock_get):
         """Test retrieving folder information by ID."""
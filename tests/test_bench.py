@@ -0,0 +1,95 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import pytest
+import requests
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.mockserver import MockServer, MockState
+from bench.runner import connect, run_pair
+
+
+@pytest.mark.api
+@pytest.mark.slow
+class TestMockServer(unittest.TestCase):
+    """Test suite for the offline benchmark mock server and runner."""
+
+    def setUp(self):
+        """Start a mock server with a small catalog."""
+        self.state = MockState(catalog_size=50)
+        self.server = MockServer(self.state).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_search_finds_catalog_song(self):
+        """Test searching the catalog by title and artist."""
+        song = self.state.catalog[7]
+        query = f"{song['title']} {song['artists'][0]}"
+
+        r = requests.get(f"{self.server.url}/spotify/v1/search", params={"q": query})
+
+        assert r.status_code == 200
+        assert r.json()["tracks"]["items"][0]["id"] == "7"
+        assert self.state.requests["spotify"] == 1
+
+    def test_rate_429_injection(self):
+        """Test every request is throttled when rate_429 is 1."""
+        self.state.rate_429 = 1.0
+
+        r = requests.get(f"{self.server.url}/tidal/v1/search/top-hits?query=x")
+
+        assert r.status_code == 429
+        assert self.state.throttled["tidal"] == 1
+
+    def test_unknown_route(self):
+        """Test unmocked endpoints answer 404."""
+        r = requests.get(f"{self.server.url}/apple/v1/unknown")
+
+        assert r.status_code == 404
+
+    def test_run_pair_spotify_to_apple(self):
+        """Test a full tunnel() run against the mock server."""
+        with (
+            patch("src.applefuncs.apple_api", f"{self.server.url}/apple"),
+            patch("main.log_failures"),
+        ):
+            row = run_pair(self.server, "spotify", "apple", 5)
+
+        assert row["not_found"] == 0
+        assert row["requests"] > 0
+        (playlist,) = self.state.playlists["apple"].values()
+        assert sorted(playlist["tracks"]) == ["0", "1", "2", "3", "4"]
+
+    def test_tunnel_fans_out_to_several_destinations(self):
+        """Test one source read feeds every destination."""
+        from main import tunnel
+
+        self.state.add_playlist("spotify", "fan out", range(5))
+        with (
+            patch("src.applefuncs.apple_api", f"{self.server.url}/apple"),
+            patch("main.log_failures"),
+        ):
+            providers = connect(self.server.url, ["spotify", "apple", "youtube"])
+            before = self.state.requests["spotify"]
+            not_found = tunnel(
+                "fan out",
+                providers["spotify"],
+                providers["apple"],
+                providers["youtube"],
+            )
+
+        assert not_found == 0
+        # One listing to resolve the name and one page of tracks
+        assert self.state.requests["spotify"] - before == 2
+        for provider in ["apple", "youtube"]:
+            (playlist,) = self.state.playlists[provider].values()
+            assert sorted(playlist["tracks"]) == ["0", "1", "2", "3", "4"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import Mock
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import metrics
+from src.coalesce import shared_call
+
+
+def _blocking(release, result=None, error=None):
+    # A request that stays in flight until release is set
+    def fn(*args, **kwargs):
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+
+    return Mock(side_effect=fn)
+
+
+def _run_concurrently(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def _wait_for_followers(count):
+    # Spin until count callers have joined the request in flight
+    for _ in range(500):
+        rows = metrics.summary()["calls"]
+        coalesced = sum(row["coalesced"] for row in rows)
+        if coalesced >= count:
+            return
+        threading.Event().wait(0.01)
+
+
+@pytest.mark.main
+class TestCoalesce(unittest.TestCase):
+    """Test suite for sharing identical in-flight requests."""
+
+    def setUp(self):
+        """Start every test from an empty registry."""
+        metrics.reset()
+        # A row for the provider exists before the leader's call is recorded
+        metrics.record("spotify", "search", 0.0)
+
+    def test_identical_calls_share_one_request(self):
+        """Test concurrent callers with the same key send one request."""
+        release = threading.Event()
+        fn = _blocking(release, result={"tracks": []})
+
+        threads, results, errors = _run_concurrently(
+            4, lambda: shared_call("spotify", "search", "song", fn, "song")
+        )
+        _wait_for_followers(3)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert fn.call_count == 1
+        assert errors == [None] * 4
+        assert all(result is results[0] for result in results)
+        (row,) = metrics.summary()["calls"]
+        assert row["coalesced"] == 3
+
+    def test_different_keys_are_not_shared(self):
+        """Test callers with different queries each send their own request."""
+        fn = Mock(return_value=[])
+
+        shared_call("spotify", "search", "one", fn, "one")
+        shared_call("spotify", "search", "two", fn, "two")
+
+        assert fn.call_count == 2
+        assert metrics.summary()["calls"][0]["coalesced"] == 0
+
+    def test_finished_calls_are_sent_again(self):
+        """Test only requests still in flight are shared."""
+        fn = Mock(return_value=[])
+
+        shared_call("spotify", "search", "song", fn, "song")
+        shared_call("spotify", "search", "song", fn, "song")
+
+        assert fn.call_count == 2
+
+    def test_errors_are_shared(self):
+        """Test followers see the exception the shared request raised."""
+        release = threading.Event()
+        fn = _blocking(release, error=Exception("boom"))
+
+        threads, _, errors = _run_concurrently(
+            3, lambda: shared_call("spotify", "search", "song", fn, "song")
+        )
+        _wait_for_followers(2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert fn.call_count == 1
+        assert [str(error) for error in errors] == ["boom"] * 3
+        # The key is free again once the request finished
+        with pytest.raises(Exception, match="boom"):
+            shared_call("spotify", "search", "song", fn, "song")
+        assert fn.call_count == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from main import retry_failed
+from src.failures import (
+    load_failures,
+    log_failures,
+    retry_queries,
+    run_id,
+)
+from src.providers import Provider
+from src.spfyfuncs import spfy_query
+
+
+def _log_many(path, shard):
+    # One shard's worth of failures, logged from a separate process
+    misses = [{"track": f"Album&@#72Title {shard}-{i}&@#72Artist"} for i in range(50)]
+    for i in range(0, len(misses), 5):
+        log_failures(f"Shard {shard}", misses[i : i + 5], "spotify", "tidal", path)
+
+
+class FakeProvider(Provider):
+    name = "tidal"
+    label = "Fake"
+    batch_size = 10
+    rate_limit = 0
+
+    def __init__(self, catalog):
+        super().__init__()
+        self.catalog = catalog
+        self.searched = []
+        self.added = []
+
+    def read_id(self, playlist_id):
+        return []
+
+    def query(self, query, target, attempt=None):
+        self.searched.append(query)
+        return self.catalog.get(query)
+
+    def add(self, dest_id, song_ids):
+        self.added += song_ids
+        return []
+
+    def create(self, playlist_name, source=None):
+        return f"id-{playlist_name}"
+
+
+@pytest.mark.migration
+class TestFailures(unittest.TestCase):
+    """Test suite for the failure log and --retry-failed."""
+
+    def setUp(self):
+        """Log failures into a fresh temporary file."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "failed.jsonl")
+        self.patcher = patch("src.failures.failedfile", self.path)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp.cleanup()
+
+    def test_log_failures_structure(self):
+        """Test every failure is written with its fields, search details and run."""
+        miss = {
+            "track": "A Night at the Opera&@#72Bohemian Rhapsody&@#72Queen",
+            "queries": ["A Night at the Opera Bohemian Rhapsody Queen"],
+            "best": "Greatest Hits Bohemian Rhapsody Queen",
+            "score": 0.42,
+            "reason": "not found",
+        }
+
+        log_failures("Rock", [miss], "spotify", "tidal")
+
+        with open(self.path) as file:
+            (record,) = [json.loads(line) for line in file]
+        assert record["run_id"] == run_id()
+        assert record["playlist"] == "Rock"
+        assert record["album"] == "A Night at the Opera"
+        assert record["title"] == "Bohemian Rhapsody"
+        assert record["artist"] == "Queen"
+        assert record["queries"] == miss["queries"]
+        assert record["best"] == miss["best"]
+        assert record["score"] == 0.42
+
+    def test_log_failures_keeps_errors(self):
+        """Test a track lost to an outage is logged with its error, not as a miss."""
+        miss = {
+            "track": "Abbey Road&@#72Something&@#72The Beatles",
+            "queries": [],
+            "error": "ConnectionError('reset')",
+            "reason": "error",
+        }
+
+        log_failures("Rock", [miss], "spotify", "tidal")
+
+        with open(self.path) as file:
+            (record,) = [json.loads(line) for line in file]
+        assert record["reason"] == "error"
+        assert record["error"] == "ConnectionError('reset')"
+
+    def test_log_failures_from_several_processes(self):
+        """Test shards logging at once never interleave or lose lines."""
+        processes = [
+            multiprocessing.Process(target=_log_many, args=(self.path, shard))
+            for shard in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        with open(self.path) as file:
+            records = [json.loads(line) for line in file]
+        assert len(records) == 200
+        assert len({record["track"] for record in records}) == 200
+
+    def test_load_failures_latest_run(self):
+        """Test the last run for a source and destination is loaded by default."""
+        with open(self.path, "w") as file:
+            for run, source, track in [
+                ("run-1", "spotify", "a"),
+                ("run-2", "spotify", "b"),
+                ("run-2", "spotify", "c"),
+                ("run-3", "apple", "d"),
+            ]:
+                record = {
+                    "run_id": run,
+                    "source": source,
+                    "destination": "tidal",
+                    "track": track,
+                }
+                file.write(json.dumps(record) + "\n")
+
+        latest = load_failures("spotify", "tidal")
+        older = load_failures("spotify", "tidal", "run-1")
+
+        assert [record["track"] for record in latest] == ["b", "c"]
+        assert [record["track"] for record in older] == ["a"]
+        assert load_failures("youtube", "tidal") == []
+
+    def test_retry_queries(self):
+        """Test retries only send queries broader than the first pass did."""
+        dest = FakeProvider({})
+        track = "Abbey Road&@#72Come Together (2019 Mix)&@#72The Beatles"
+
+        queries = retry_queries(dest, track)
+
+        assert queries == ["Come Together", "Come Together Abbey Road"]
+        assert not set(queries) & set(dest.plan_queries(track))
+        assert retry_queries(dest, "Álbum&@#72Canción&@#72Artista") == [
+            "Canción",
+            "Cancion",
+            "Canción Álbum",
+        ]
+
+    def test_search_records_best_candidate(self):
+        """Test a rejected search keeps its closest candidate."""
+        spotify = Mock()
+        spotify.search.return_value = {
+            "tracks": {
+                "items": [
+                    {
+                        "id": "1",
+                        "name": "Yesterday",
+                        "album": {"name": "Help!"},
+                        "artists": [{"name": "The Beatles"}],
+                    }
+                ]
+            }
+        }
+        attempt = {}
+
+        target = "Let It Be&@#72Let It Be&@#72The Beatles"
+        with patch("src.spfyfuncs.compare", return_value=False):
+            assert spfy_query(spotify, "Let It Be Beatles", target, attempt) is None
+
+        assert attempt["best"] == "Help! Yesterday The Beatles"
+        assert 0 < attempt["score"] < 1
+
+    @patch("builtins.print")
+    def test_retry_failed(self, mock_print):
+        """Test only the logged tracks are retried, with the broader queries."""
+        log_failures(
+            "Rock",
+            [{"track": "Abbey Road&@#72Something (Remastered)&@#72Beatles"}],
+            "spotify",
+            "tidal",
+        )
+        dest = FakeProvider({"Something Abbey Road": "42"})
+
+        assert retry_failed(None, "spotify", dest) == 0
+        assert "Something Abbey Road" in dest.searched
+        assert set(dest.searched) <= {"Something", "Something Abbey Road"}
+        assert dest.added == ["42"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.filefuncs import FileProvider, file_name, iter_file_tracks
+from src.providers import load_provider
+from src.transfer import transfer
+
+TRACKS = [
+    "A Night at the Opera&@#72Bohemian Rhapsody&@#72Queen",
+    "Thriller&@#72Billie Jean&@#72Michael Jackson",
+    "Rumours&@#72Dreams, Part 2&@#72Fleetwood Mac",
+]
+
+
+@pytest.mark.file
+class TestFileProvider(unittest.TestCase):
+    """Test suite for playlists kept as local files."""
+
+    def setUp(self):
+        """Point the provider at a fresh temporary directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.print_patcher = patch("builtins.print")
+        self.print_patcher.start()
+
+    def tearDown(self):
+        self.print_patcher.stop()
+        self.tmp.cleanup()
+
+    def provider(self, fmt="json"):
+        provider = FileProvider(self.tmp.name, fmt)
+        provider.auth()
+        return provider
+
+    def test_load_provider(self):
+        """Test the file platform is selectable like the others."""
+        with patch("src.filefuncs.playlistdir", self.tmp.name):
+            provider = load_provider("file")
+
+        assert isinstance(provider, FileProvider)
+        assert provider.directory == self.tmp.name
+
+    def test_round_trip(self):
+        """Test every format reads back the tracks written to it."""
+        for fmt in ("json", "csv", "m3u"):
+            with self.subTest(fmt=fmt):
+                writer = self.provider(fmt)
+                path = writer.create(f"Mix {fmt}")
+                writer.add(path, TRACKS[:2])
+                writer.add(path, TRACKS[2:])
+
+                reader = self.provider(fmt)
+                assert reader.read(f"Mix {fmt}") == TRACKS
+
+    def test_json_layout(self):
+        """Test JSON files keep the playlist name and each track's fields."""
+        provider = self.provider()
+        path = provider.create("Rock")
+        provider.add(path, TRACKS[:1])
+
+        with open(path) as file:
+            data = json.load(file)
+        assert data["name"] == "Rock"
+        assert data["tracks"] == [
+            {
+                "album": "A Night at the Opera",
+                "title": "Bohemian Rhapsody",
+                "artist": "Queen",
+            }
+        ]
+
+    def test_plain_m3u(self):
+        """Test M3U files without #EXTINF lines are read from their paths."""
+        path = os.path.join(self.tmp.name, "Old.m3u")
+        with open(path, "w") as file:
+            file.write("# made by hand\nmusic/Queen - Bohemian Rhapsody.mp3\n")
+
+        assert list(iter_file_tracks(path)) == ["&@#72Bohemian Rhapsody&@#72Queen"]
+
+    def test_pages(self):
+        """Test a playlist is read once and handed on a page at a time."""
+        writer = self.provider("csv")
+        writer.add(writer.create("Mix"), TRACKS)
+        reader = self.provider("csv")
+        reader.page_size = 2
+
+        pages = list(reader.pages("Mix"))
+
+        assert pages == [TRACKS[:2], TRACKS[2:]]
+        assert self.provider().pages("Missing") is None
+
+    def test_file_name(self):
+        """Test playlist names with path characters make safe file names."""
+        assert file_name("AC/DC: Live?") == "AC_DC_ Live_"
+        provider = self.provider()
+        assert provider.create("AC/DC") == os.path.join(self.tmp.name, "AC_DC.json")
+
+    def test_stored_names(self):
+        """Test playlists are listed by the name stored in them, not the file's."""
+        for fmt in ("json", "m3u"):
+            with self.subTest(fmt=fmt):
+                writer = self.provider(fmt)
+                path = writer.create(f"Rock/Classic {fmt}")
+                writer.add(path, TRACKS)
+
+                reader = self.provider(fmt)
+                assert reader.read(f"Rock/Classic {fmt}") == TRACKS
+                assert reader.create(f"Rock/Classic {fmt}") == path
+        # CSV has nowhere to keep one, its file name is all there is
+        writer = self.provider("csv")
+        writer.add(writer.create("Rock/Classic"), TRACKS)
+        assert "Rock_Classic" in self.provider("csv").playlists
+
+    def test_transfer_skips_tracks_present(self):
+        """Test a file destination takes tracks as they are, once each."""
+        provider = self.provider()
+        path = provider.create("Mix")
+        provider.add(path, TRACKS[:1])
+
+        not_found = transfer(TRACKS + TRACKS[:1], provider, path, "Mix")
+
+        assert not_found == []
+        assert self.provider().read("Mix") == TRACKS
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import Mock
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import hedge, metrics
+from src.hedge import enable_hedging, hedged_call
+
+
+def _warm_up(provider, op, seconds=0.01):
+    # Give the endpoint enough latency samples for a p95
+    for _ in range(hedge.MIN_SAMPLES):
+        metrics.record(provider, op, seconds)
+
+
+def _slow_then_fast(release):
+    # The first copy hangs until release is set, any later copy answers at once
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return "slow"
+        return "fast"
+
+    return fn, calls
+
+
+@pytest.mark.main
+class TestHedge(unittest.TestCase):
+    """Test suite for hedged reads."""
+
+    def setUp(self):
+        """Start every test with hedging off and empty metrics."""
+        hedge.reset()
+        metrics.reset()
+
+    def test_disabled_sends_once(self):
+        """Test requests go straight through unless --hedge is on."""
+        _warm_up("apple", "search")
+        fn = Mock(return_value="ok")
+
+        assert hedged_call("apple", "search", fn, "query") == "ok"
+        fn.assert_called_once_with("query")
+
+    def test_slow_request_is_hedged(self):
+        """Test a request past its p95 gets a second copy that can win."""
+        enable_hedging(1.0)
+        _warm_up("apple", "search")
+        release = threading.Event()
+        fn, calls = _slow_then_fast(release)
+
+        try:
+            assert hedged_call("apple", "search", fn) == "fast"
+        finally:
+            release.set()
+        assert len(calls) == 2
+        assert metrics.summary()["calls"][0]["hedged"] == 1
+
+    def test_unknown_latency_is_not_hedged(self):
+        """Test endpoints without enough samples are never duplicated."""
+        enable_hedging(1.0)
+        release = threading.Event()
+        fn, calls = _slow_then_fast(release)
+        threading.Timer(0.1, release.set).start()
+
+        assert hedged_call("tidal", "search", fn) == "slow"
+        assert len(calls) == 1
+
+    def test_hedges_are_capped(self):
+        """Test duplicates stop once the provider's budget is spent."""
+        enable_hedging(0.1)
+        _warm_up("tidal", "search")
+        release = threading.Event()
+        fn, calls = _slow_then_fast(release)
+        threading.Timer(0.1, release.set).start()
+
+        # One request sent so far, a 10% budget doesn't cover a duplicate
+        assert hedged_call("tidal", "search", fn) == "slow"
+        assert len(calls) == 1
+
+    def test_error_waits_for_the_other_copy(self):
+        """Test a failing copy doesn't win over one that still answers."""
+        enable_hedging(1.0)
+        _warm_up("apple", "search")
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(5)
+                return "slow"
+            raise ConnectionError("reset")
+
+        threading.Timer(0.1, release.set).start()
+        assert hedged_call("apple", "search", fn) == "slow"
+        assert len(calls) == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
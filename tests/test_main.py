@@ -1,5 +1,7 @@
+import argparse
 import os
 import sys
+import tempfile
 import unittest
 from unittest.mock import call, patch
 
@@ -8,12 +10,12 @@ import pytest
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from main import duration, load_resume, save_resume
 from src.mainfuncs import (
     compare,
     confirm_playlist_exist,
     display_playlists,
     message,
-    what_to_move,
 )
 
 
@@ -105,45 +107,6 @@ class TestMainFunctions(unittest.TestCase):
             "s+", "Selected Nonexistent Playlist Playlist does not exist"
         )
 
-    def test_what_to_move_all_new(self):
-        """Test what_to_move when all songs are new."""
-        old_songs = ["Song1", "Song2"]
-        new_songs = ["Song3", "Song4", "Song5"]
-
-        result = what_to_move(old_songs, new_songs)
-
-        expected = ["Song3", "Song4", "Song5"]
-        assert sorted(result) == sorted(expected)
-
-    def test_what_to_move_some_overlap(self):
-        """Test what_to_move when some songs already exist."""
-        old_songs = ["Song1", "Song2"]
-        new_songs = ["Song1", "Song3", "Song4"]
-
-        result = what_to_move(old_songs, new_songs)
-
-        expected = ["Song3", "Song4"]
-        assert sorted(result) == sorted(expected)
-
-    def test_what_to_move_no_new_songs(self):
-        """Test what_to_move when no new songs to add."""
-        old_songs = ["Song1", "Song2", "Song3"]
-        new_songs = ["Song1", "Song2"]
-
-        result = what_to_move(old_songs, new_songs)
-
-        assert result == []
-
-    def test_what_to_move_duplicates_in_new(self):
-        """Test what_to_move with duplicates in new songs list."""
-        old_songs = ["Song1"]
-        new_songs = ["Song2", "Song2", "Song3", "Song3"]
-
-        result = what_to_move(old_songs, new_songs)
-
-        expected = ["Song2", "Song3"]
-        assert sorted(result) == sorted(expected)
-
     def test_compare_exact_match(self):
         """Test compare function with exact match."""
         result = compare("Bohemian Rhapsody Queen", "Bohemian Rhapsody Queen")
@@ -186,5 +149,45 @@ class TestMainFunctions(unittest.TestCase):
         # The function should return consistent results
 
 
+@pytest.mark.main
+class TestDeadline(unittest.TestCase):
+    """Test suite for the --deadline option."""
+
+    def test_duration(self):
+        """Test deadlines accept seconds, minutes and hours."""
+        assert duration("90") == 90
+        assert duration("45s") == 45
+        assert duration("30m") == 1800
+        assert duration("2h") == 7200
+        with pytest.raises(argparse.ArgumentTypeError):
+            duration("soon")
+
+    @patch("builtins.print")
+    def test_save_resume(self, mock_print):
+        """Test the playlists left are written in a file -P can read."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "resume.txt")
+            save_resume(["Cut Short", "Not Started"], path)
+
+            with open(path) as file:
+                assert file.read().splitlines() == ["Cut Short", "Not Started"]
+
+    @patch("builtins.print")
+    def test_resume_keeps_progress(self, mock_print):
+        """Test how far each destination got is read back with the names."""
+        progress = {
+            "Cut Short": {"tidal": (120, "1f2e3d4c"), "apple": (95, None)},
+            "Not Started": {},
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "resume.txt")
+            save_resume(["Cut Short", "Not Started"], path, progress)
+
+            names, saved = load_resume(path)
+
+        assert names == ["Cut Short", "Not Started"]
+        assert saved == {"Cut Short": {"tidal": (120, "1f2e3d4c"), "apple": (95, None)}}
+
+
 if __name__ == "__main__":
     unittest.main()
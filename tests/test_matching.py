@@ -0,0 +1,117 @@
+import os
+import random
+import sys
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.mainfuncs import compare, similarity
+from src.matching import TrackIndex, best_match, best_matches
+
+LIBRARY = [
+    "Abbey Road Come Together The Beatles",
+    "A Night at the Opera Bohemian Rhapsody Queen",
+    "Thriller Billie Jean Michael Jackson",
+    "Rumours Dreams Fleetwood Mac",
+]
+
+
+@pytest.mark.main
+class TestMatching(unittest.TestCase):
+    """Test suite for batch scoring of candidates."""
+
+    def test_best_match(self):
+        """Test the most similar candidate wins with its similarity."""
+        track = "Greatest Hits Bohemian Rhapsody Queen"
+
+        index, score = best_match(track, LIBRARY)
+
+        assert index == 1
+        assert score == similarity(LIBRARY[1], track)
+        assert compare(LIBRARY[1], track)
+
+    def test_no_match(self):
+        """Test nothing is returned when no candidate passes compare()."""
+        assert best_match("Kind of Blue So What Miles Davis", LIBRARY) is None
+        assert best_match("Anything", []) is None
+
+    def test_ties_keep_the_first(self):
+        """Test equal scores resolve to the earliest candidate."""
+        assert best_match("Dreams", ["Dreams", "Dreams"]) == (0, 1.0)
+
+    def test_same_as_scoring_every_candidate(self):
+        """Test the quick bounds never change which candidate wins."""
+        rng = random.Random(7)
+        words = ["love", "night", "blue", "road", "queen", "dream", "live", "mix"]
+        library = [" ".join(rng.choices(words, k=5)) for _ in range(200)]
+        for _ in range(50):
+            track = " ".join(rng.choices(words, k=5))
+            scores = [similarity(candidate, track) for candidate in library]
+            top = max(scores)
+
+            assert best_match(track, library) == (scores.index(top), top)
+
+    def test_process_pool_keeps_order(self):
+        """Test batches scored on worker processes match scoring inline."""
+        pairs = [(track, LIBRARY) for track in LIBRARY * 5]
+
+        inline = best_matches(pairs, workers=1)
+        with patch("src.matching.MIN_PARALLEL", 0):
+            pooled = best_matches(pairs, workers=2)
+
+        assert pooled == inline
+        assert [match[0] for match in pooled] == [0, 1, 2, 3] * 5
+
+
+@pytest.mark.main
+class TestTrackIndex(unittest.TestCase):
+    """Test suite for the trigram track index."""
+
+    def setUp(self):
+        """Index a small library with the ids lookup() hands back."""
+        self.index = TrackIndex()
+        for i, track in enumerate(
+            [
+                "Abbey Road&@#72Come Together&@#72The Beatles",
+                "A Night at the Opera&@#72Bohemian Rhapsody&@#72Queen",
+                "Thriller&@#72Billie Jean&@#72Michael Jackson",
+                "Rumours&@#72Dreams&@#72Fleetwood Mac",
+                "Dangerous&@#72Black or White&@#72Michael Jackson",
+            ]
+        ):
+            self.index.add(track, f"id-{i}")
+
+    def test_lookup(self):
+        """Test spelling and album differences still find the track."""
+        found = self.index.lookup("Greatest Hits&@#72Bohemian Rhapsody&@#72Queen")
+        assert found == ("A Night at the Opera&@#72Bohemian Rhapsody&@#72Queen", "id-1")
+
+        found = self.index.lookup("&@#72Billie Jean (Remastered)&@#72Michaël Jackson")
+        assert found[1] == "id-2"
+
+    def test_candidates_rank_by_shared_grams(self):
+        """Test the closest title and artist come first."""
+        positions = self.index.candidates("&@#72Black or White&@#72Michael Jackson", 2)
+
+        assert positions == [4, 2]
+
+    def test_no_match(self):
+        """Test candidates that fail compare() aren't returned."""
+        assert self.index.lookup("Kind of Blue&@#72So What&@#72Miles Davis") is None
+        assert TrackIndex().lookup("Rumours&@#72Dreams&@#72Fleetwood Mac") is None
+
+    def test_incremental_add(self):
+        """Test tracks added later are found like the others."""
+        track = "Kind of Blue&@#72So What&@#72Miles Davis"
+        self.index.add(track, "id-5")
+
+        assert len(self.index) == 6
+        assert self.index.lookup(track) == (track, "id-5")
+
+
+if __name__ == "__main__":
+    unittest.main()
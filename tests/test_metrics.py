@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import metrics
+
+
+@pytest.mark.main
+class TestMetrics(unittest.TestCase):
+    """Test suite for the run metrics layer."""
+
+    def setUp(self):
+        """Start every test from an empty registry."""
+        metrics.reset()
+
+    def test_call_returns_result_and_records(self):
+        """Test call() passes the result through and counts the call."""
+        response = Mock(status_code=200)
+        fn = Mock(return_value=response)
+
+        result = metrics.call("apple", "search", fn, "query", limit=5)
+
+        assert result is response
+        fn.assert_called_once_with("query", limit=5)
+        (row,) = metrics.summary()["calls"]
+        assert row["provider"] == "apple"
+        assert row["op"] == "search"
+        assert row["count"] == 1
+
+    def test_call_counts_429_responses(self):
+        """Test throttled responses are counted."""
+        metrics.call("tidal", "search", Mock(return_value=Mock(status_code=429)))
+
+        assert metrics.summary()["calls"][0]["throttled"] == 1
+
+    def test_call_records_exceptions(self):
+        """Test failing calls are timed, counted and re-raised."""
+        error = Exception("boom")
+        error.http_status = 429
+
+        with pytest.raises(Exception, match="boom"):
+            metrics.call("spotify", "search", Mock(side_effect=error))
+
+        row = metrics.summary()["calls"][0]
+        assert row["count"] == 1
+        assert row["throttled"] == 1
+
+    def test_count_retries(self):
+        """Test custom counters show up in the summary."""
+        metrics.record("apple", "search", 0.1)
+        metrics.count("apple", "search", "retries", 2)
+
+        assert metrics.summary()["calls"][0]["retries"] == 2
+
+    def test_stage_records_duration(self):
+        """Test stage() records one sample per use."""
+        with metrics.stage("compare"):
+            pass
+        with metrics.stage("compare"):
+            pass
+
+        (row,) = metrics.summary()["stages"]
+        assert row["stage"] == "compare"
+        assert row["count"] == 2
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        samples = list(range(1, 101))
+
+        assert metrics.percentile(samples, 50) == 50
+        assert metrics.percentile(samples, 95) == 95
+        assert metrics.percentile(samples, 99) == 99
+        assert metrics.percentile([], 50) == 0.0
+
+    @patch("builtins.print")
+    def test_report_timings_empty(self, mock_print):
+        """Test nothing is printed when no metrics were recorded."""
+        metrics.report_timings()
+
+        mock_print.assert_not_called()
+
+    def test_write_metrics_json_and_prometheus(self):
+        """Test writing JSON and Prometheus textfile output."""
+        metrics.record("spotify", "search", 0.25, 200)
+        with metrics.stage("source read"):
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, "metrics.json")
+            prom_path = os.path.join(tmp, "metrics.prom")
+            metrics.write_metrics(json_path)
+            metrics.write_metrics(prom_path)
+
+            with open(json_path) as file:
+                data = json.load(file)
+            with open(prom_path) as file:
+                prom = file.read()
+
+        assert data["calls"][0]["p50"] == 0.25
+        assert (
+            'sound_tunnel_api_request_seconds_count{provider="spotify",op="search"} 1'
+            in prom
+        )
+        assert 'sound_tunnel_stage_seconds_count{stage="source read"} 1' in prom
+
+
+if __name__ == "__main__":
+    unittest.main()
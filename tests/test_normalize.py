@@ -0,0 +1,104 @@
+import os
+import sys
+import unittest
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.normalize import (
+    drop_brackets,
+    featured_artist,
+    flatten,
+    normalize,
+    primary_artist,
+    strip_parentheticals,
+    track_fields,
+    track_key,
+    track_string,
+    transliterate,
+    versions,
+)
+
+
+@pytest.mark.main
+class TestNormalize(unittest.TestCase):
+    """Test suite for the text cleanup shared by the providers."""
+
+    def test_strip_parentheticals(self):
+        """Test bracketed parts and dash suffixes are removed from titles."""
+        assert strip_parentheticals("Song (Remastered 2011) [Live]") == "Song"
+        assert strip_parentheticals("Song - Radio Edit") == "Song"
+        assert drop_brackets("Song (Live) - Radio Edit") == "Song - Radio Edit"
+
+    def test_primary_artist(self):
+        """Test the first credited artist is kept."""
+        assert primary_artist("Daft Punk feat. Pharrell Williams") == "Daft Punk"
+        assert primary_artist("Simon & Garfunkel") == "Simon"
+        assert primary_artist("The Beatles") == "The Beatles"
+
+    def test_transliterate(self):
+        """Test accents and ligatures fold to ASCII."""
+        assert transliterate("Beyoncé Sigur Rós Straße") == "Beyonce Sigur Ros Strasse"
+
+    def test_featured_artist(self):
+        """Test Apple Music's "(feat. ...)" credits are read from titles."""
+        assert featured_artist("Get Lucky (feat. Pharrell Williams)") == (
+            "Pharrell Williams"
+        )
+        assert featured_artist("Get Lucky") is None
+
+    def test_track_fields(self):
+        """Test track strings are split back into their fields."""
+        assert track_string("Album", "Title", "Artist") == "Album&@#72Title&@#72Artist"
+        assert track_fields("Album&@#72Title&@#72Artist") == {
+            "album": "Album",
+            "title": "Title",
+            "artist": "Artist",
+        }
+        assert track_fields("Simon & Garfunkel")["title"] == "Simon & Garfunkel"
+        assert track_fields("odd")["title"] == "odd"
+
+    def test_flatten(self):
+        """Test track strings become plain words."""
+        assert flatten("Album&@#72Title&@#72Artist") == "Album Title Artist"
+
+    def test_normalize(self):
+        """Test credits, version tags, accents and punctuation are dropped."""
+        assert normalize("Halo (Live) - 2011 Remaster") == "halo"
+        assert normalize("Get Lucky [feat. Pharrell]") == "get lucky"
+        assert normalize("Mr. Brightside - Radio Edit") == "mr brightside"
+        assert normalize("Beyoncé!") == "beyonce"
+        # Dashes that aren't version tags stay
+        assert normalize("Anti-Hero - Acoustic Take") == "anti hero acoustic take"
+
+    def test_normalize_track_fields(self):
+        """Test whole track strings are normalised field by field."""
+        track = "Abbey Road (Remastered)&@#72Come Together - Live&@#72The Beatles"
+
+        assert normalize(track) == "abbey road come together the beatles"
+
+    def test_track_key(self):
+        """Test keys fold spelling but keep versions apart."""
+        assert track_key("Album&@#72Beyoncé!&@#72X") == track_key(
+            "ALBUM&@#72beyonce&@#72x"
+        )
+        assert track_key("A&@#72Halo&@#72B") != track_key("A&@#72Halo (Live)&@#72B")
+
+    def test_versions(self):
+        """Test the version tags normalize() drops are picked out of titles."""
+        assert versions("Halo (Live) - 2011 Remastered") == {"live", "remaster"}
+        assert versions("Something") == versions("Something (feat. X) [Explicit]")
+
+    def test_normalize_is_memoised(self):
+        """Test repeated strings are answered from the cache."""
+        normalize.cache_clear()
+        normalize("Dreams")
+        normalize("Dreams")
+
+        assert normalize.cache_info().hits == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.profiling import configure_profiling, phase
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+@pytest.mark.main
+class TestProfiling(unittest.TestCase):
+    """Test suite for the --profile phase profiler."""
+
+    def setUp(self):
+        """Profile into a fresh temporary directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = self.tmp.name
+
+    def tearDown(self):
+        configure_profiling(None)
+        self.tmp.cleanup()
+
+    def test_phase_disabled_writes_nothing(self):
+        """Test phases are a no-op unless profiling is configured."""
+        configure_profiling(None, self.out)
+
+        with phase("auth spotify"):
+            busy_wait(0.01)
+
+        assert os.listdir(self.out) == []
+
+    @patch("builtins.print")
+    def test_phase_pstats(self, mock_print):
+        """Test pstats output is written per phase."""
+        configure_profiling("pstats", self.out)
+
+        with phase("auth spotify"):
+            busy_wait(0.01)
+        with phase("tunnel My/Playlist"):
+            busy_wait(0.01)
+
+        files = sorted(os.listdir(self.out))
+        assert files == ["001-auth_spotify.pstats", "002-tunnel_My_Playlist.pstats"]
+        stats = pstats.Stats(os.path.join(self.out, files[0]))
+        assert any(func[2] == "busy_wait" for func in stats.stats)
+        assert "wall" in mock_print.call_args[0][0]
+
+    @patch("builtins.print")
+    def test_nested_phase(self, mock_print):
+        """Test a phase inside another is profiled as part of the outer one."""
+        configure_profiling("pstats", self.out)
+
+        with phase("tunnel Mix"):
+            with phase("listing tidal"):
+                busy_wait(0.01)
+            sorted_after_listing = sorted([3, 1, 2])
+
+        assert sorted_after_listing == [1, 2, 3]
+        (name,) = os.listdir(self.out)
+        assert name == "001-tunnel_Mix.pstats"
+        stats = pstats.Stats(os.path.join(self.out, name))
+        functions = {func[2] for func in stats.stats}
+        assert "busy_wait" in functions
+        assert "<built-in method builtins.sorted>" in functions
+
+    @patch("builtins.print")
+    def test_phase_includes_worker_threads(self, mock_print):
+        """Test functions run on threads the phase starts are profiled too."""
+        configure_profiling("pstats", self.out)
+
+        def searcher():
+            busy_wait(0.01)
+
+        with phase("tunnel Mix"):
+            worker = threading.Thread(target=searcher)
+            worker.start()
+            worker.join()
+
+        (name,) = os.listdir(self.out)
+        stats = pstats.Stats(os.path.join(self.out, name))
+        assert any(func[2] == "searcher" for func in stats.stats)
+
+    @patch("builtins.print")
+    def test_concurrent_phases_are_named(self, mock_print):
+        """Test a phase run alongside the profiled one is named in its summary."""
+        configure_profiling("pstats", self.out)
+        started = threading.Event()
+
+        def other():
+            started.wait()
+            with phase("tunnel Other"):
+                busy_wait(0.01)
+
+        worker = threading.Thread(target=other)
+        worker.start()
+        with phase("tunnel Mix"):
+            started.set()
+            worker.join()
+
+        assert os.listdir(self.out) == ["001-tunnel_Mix.pstats"]
+        assert "also covering tunnel Other" in mock_print.call_args[0][0]
+
+    @patch("builtins.print")
+    def test_phase_collapsed(self, mock_print):
+        """Test collapsed stacks include time spent sleeping."""
+        configure_profiling("collapsed", self.out)
+
+        with phase("listing tidal"):
+            time.sleep(0.1)
+
+        (name,) = os.listdir(self.out)
+        assert name == "001-listing_tidal.folded"
+        with open(os.path.join(self.out, name)) as file:
+            lines = file.read().splitlines()
+        assert lines
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+        assert any("test_phase_collapsed" in line for line in lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
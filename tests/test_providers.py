@@ -0,0 +1,47 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.importtime import measure
+from src.providers import load_provider
+
+
+@pytest.mark.main
+class TestProviders(unittest.TestCase):
+    """Test suite for the lazy provider registry."""
+
+    def test_load_provider(self):
+        """Test loading a provider returns an unauthenticated instance."""
+        provider = load_provider("spotify")
+
+        assert type(provider).__module__ == "src.spfyfuncs"
+        assert provider.name == "spotify"
+        assert provider.session is None
+        assert provider.batch_size == 100
+
+    @patch("builtins.print")
+    @patch("sys.exit", side_effect=SystemExit)
+    def test_load_unknown_provider(self, mock_exit, mock_print):
+        """Test unknown platforms exit with an error."""
+        with pytest.raises(SystemExit):
+            load_provider("deezer")
+
+        mock_exit.assert_called_with(1)
+
+    def test_main_import_is_lazy(self):
+        """Test importing main loads no provider client library."""
+        seconds, heavy = measure("main")
+
+        assert heavy == []
+        # Interpreter startup is excluded; eager imports took ~250ms
+        assert seconds < 0.1
+
+
+if __name__ == "__main__":
+    unittest.main()
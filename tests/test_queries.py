@@ -0,0 +1,95 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.providers import Provider
+from src.queries import cascade, plan_queries
+from src.spfyfuncs import spfy_qualified
+
+
+class QueryProvider(Provider):
+    name = "fake"
+    concurrency = 1
+    rate_limit = 0
+
+    def __init__(self, answers, delay=0.0):
+        super().__init__()
+        self.answers = answers
+        self.delay = delay
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def query(self, query, target, attempt=None):
+        with self.lock:
+            self.sent.append(query)
+        time.sleep(self.delay)
+        answer = self.answers.get(query)
+        if isinstance(answer, Exception):
+            raise answer
+        if answer is None and attempt is not None:
+            attempt["best"], attempt["score"] = f"near {query}", 0.3
+        return answer
+
+
+@pytest.mark.migration
+class TestQueries(unittest.TestCase):
+    """Test suite for the query planner and concurrent search cascade."""
+
+    def test_plan_queries(self):
+        """Test strategies run from most specific to broadest without repeats."""
+        track = "Lemonade&@#72Formation (Explicit)&@#72Beyoncé, Jay-Z"
+
+        assert plan_queries(track) == [
+            "Formation (Explicit) Beyoncé, Jay-Z",
+            "Formation (Explicit) Beyoncé",
+            "Formation Beyoncé",
+            "Formation Beyonce",
+        ]
+        assert plan_queries("A&@#72Song&@#72Band", spfy_qualified) == [
+            'track:"Song" artist:"Band"',
+            "Song Band",
+        ]
+
+    def test_cascade_first_hit_cancels_queued_queries(self):
+        """Test queued strategies are cancelled once one of them matches."""
+        provider = QueryProvider({"Song (Live) Band": "42"}, delay=0.05)
+        attempt = {}
+
+        assert cascade(provider, "A&@#72Song (Live)&@#72Band", attempt) == "42"
+        # One worker, so the broader queries were still queued and never sent
+        assert provider.sent == ["Song (Live) Band"]
+        assert attempt["queries"] == ["Song (Live) Band", "Song Band"]
+
+    def test_cascade_miss_keeps_best_candidate(self):
+        """Test a miss records every query and the closest candidate."""
+        provider = QueryProvider({})
+        attempt = {}
+
+        track = "A&@#72Song (Live)&@#72Band"
+        assert cascade(provider, track, attempt) is None
+        assert sorted(provider.sent) == sorted(plan_queries(track))
+        assert attempt["best"].startswith("near ")
+        assert attempt["score"] == 0.3
+
+    def test_cascade_raises_when_every_query_fails(self):
+        """Test outages surface instead of being reported as misses."""
+        provider = QueryProvider({"Song Band": ConnectionError("down")})
+
+        with pytest.raises(ConnectionError):
+            cascade(provider, "A&@#72Song&@#72Band")
+
+        provider = QueryProvider(
+            {"Song (Live) Band": ConnectionError("down"), "Song Band": "7"}
+        )
+        assert cascade(provider, "A&@#72Song (Live)&@#72Band") == "7"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import metrics, providers, retry
+from src.providers import AdaptiveLimit
+from src.retry import CircuitBreaker, backoff, get_json, retry_call, retry_write
+
+
+def _error(status):
+    error = Exception(f"HTTP {status}")
+    error.http_status = status
+    return error
+
+
+@pytest.mark.main
+@patch("src.retry.sleep")
+class TestRetry(unittest.TestCase):
+    """Test suite for request retries and the per-provider circuit breaker."""
+
+    def setUp(self):
+        """Start every test with closed circuits and empty metrics."""
+        retry.reset()
+        metrics.reset()
+
+    def test_retries_server_errors(self, mock_sleep):
+        """Test 5xx responses are sent again until one succeeds."""
+        ok = Mock(status_code=200)
+        fn = Mock(side_effect=[Mock(status_code=502), _error(503), ok])
+
+        assert retry_call("tidal", "playlist items", fn) is ok
+        assert fn.call_count == 3
+        assert mock_sleep.call_count == 2
+        assert metrics.summary()["calls"][0]["retries"] == 2
+
+    def test_gives_up_after_attempts(self, mock_sleep):
+        """Test the last error is raised once every attempt failed."""
+        fn = Mock(side_effect=ConnectionError("reset"))
+
+        with pytest.raises(ConnectionError):
+            retry_call("apple", "search", fn)
+        assert fn.call_count == retry.ATTEMPTS
+
+    def test_gives_up_on_error_responses(self, mock_sleep):
+        """Test a read still answered with a 5xx raises instead of returning it."""
+        fn = Mock(return_value=Mock(status_code=503))
+
+        with pytest.raises(requests.HTTPError) as raised:
+            retry_call("tidal", "search", fn)
+        assert raised.value.response.status_code == 503
+        assert fn.call_count == retry.ATTEMPTS
+
+    def test_garbled_bodies_are_sent_again(self, mock_sleep):
+        """Test a 200 whose body doesn't decode is retried like a dropped connection."""
+        garbled = requests.Response()
+        garbled.status_code = 200
+        garbled._content = b'{"data": ['
+        ok = requests.Response()
+        ok.status_code = 200
+        ok._content = b'{"data": []}'
+
+        with patch("src.retry.requests.get", side_effect=[garbled, ok]) as get:
+            response = retry_call("apple", "search", get_json, "https://api")
+        assert response.data == {"data": []}
+        assert get.call_count == 2
+
+    def test_recovered_failures_reach_the_gate(self, mock_sleep):
+        """Test every retried failure cuts the provider's limit, not just the last."""
+        gate = AdaptiveLimit(8, 8)
+        fn = Mock(side_effect=[_error(429), Mock(status_code=200)])
+
+        with patch.dict(providers._gates, {"apple": gate}):
+            retry_call("apple", "search", fn)
+        assert gate.limit == 4
+
+    def test_client_errors_are_not_retried(self, mock_sleep):
+        """Test errors that retrying can't fix are raised straight away."""
+        fn = Mock(side_effect=_error(404))
+
+        with pytest.raises(Exception, match="404"):
+            retry_call("spotify", "playlist items", fn)
+        assert fn.call_count == 1
+        mock_sleep.assert_not_called()
+
+    def test_writes_only_retry_throttling(self, mock_sleep):
+        """Test writes are sent again after a 429 but never after a 5xx."""
+        fn = Mock(side_effect=[_error(429), "done"])
+        assert retry_write("spotify", "add items", fn) == "done"
+
+        fn = Mock(side_effect=_error(502))
+        with pytest.raises(Exception, match="502"):
+            retry_write("spotify", "add items", fn)
+        assert fn.call_count == 1
+
+    def test_backoff_honours_retry_after(self, mock_sleep):
+        """Test delays grow with the attempt and respect Retry-After."""
+        assert all(backoff(0) <= retry.BASE_DELAY for _ in range(20))
+        assert all(backoff(10) <= retry.MAX_DELAY for _ in range(20))
+        assert backoff(0, retry_after=3) == 3
+
+    def test_breaker_pauses_and_resumes(self, mock_sleep):
+        """Test repeated failures pause the provider until a probe succeeds."""
+        breaker = CircuitBreaker("apple", threshold=2, cooldown=0.05)
+        with patch("builtins.print"):
+            breaker.failure()
+            breaker.failure()
+        assert breaker.open_until is not None
+
+        start = time.monotonic()
+        breaker.wait()
+        assert time.monotonic() - start >= 0.04
+
+        # Other callers wait for the probe's outcome
+        waiter = threading.Thread(target=breaker.wait)
+        waiter.start()
+        waiter.join(0.05)
+        assert waiter.is_alive()
+        breaker.success()
+        waiter.join(1)
+        assert not waiter.is_alive()
+        assert breaker.open_until is None
+
+    def test_failed_probe_doubles_the_pause(self, mock_sleep):
+        """Test a failing probe opens the circuit again for longer."""
+        breaker = CircuitBreaker("tidal", threshold=1, cooldown=0.01)
+        with patch("builtins.print"):
+            breaker.failure()
+            breaker.wait()
+            breaker.failure()
+
+        assert breaker._pause == 0.02
+
+
+if __name__ == "__main__":
+    unittest.main()
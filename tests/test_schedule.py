@@ -0,0 +1,156 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.schedule import order_playlists, run_playlists, select_shard, shard_path
+from src.transfer import set_deadline
+
+SIZES = {"Mix": 40, "Huge": 900, "Unknown": None, "Tiny": 3, "Also Unknown": None}
+
+
+@pytest.mark.migration
+class TestSchedule(unittest.TestCase):
+    """Test suite for ordering and running the playlists of a bulk run."""
+
+    def tearDown(self):
+        """Clear any deadline a test set."""
+        set_deadline(None)
+
+    def test_order_listed(self):
+        """Test the default keeps the listing's order."""
+        assert order_playlists(list(SIZES), SIZES.get) == list(SIZES)
+
+    def test_order_shortest(self):
+        """Test shortest first, unknown sizes last in listed order."""
+        assert order_playlists(list(SIZES), SIZES.get, "shortest") == [
+            "Tiny",
+            "Mix",
+            "Huge",
+            "Unknown",
+            "Also Unknown",
+        ]
+
+    def test_order_largest(self):
+        """Test largest first, unknown sizes last in listed order."""
+        assert order_playlists(list(SIZES), SIZES.get, "largest") == [
+            "Huge",
+            "Mix",
+            "Tiny",
+            "Unknown",
+            "Also Unknown",
+        ]
+
+    def test_shards_split_every_playlist_once(self):
+        """Test shards are disjoint, cover the list and keep its order."""
+        names = [f"Playlist {i}" for i in range(200)]
+        shards = [select_shard(names, 4, index) for index in range(4)]
+
+        assert sorted(sum(shards, [])) == sorted(names)
+        assert all(shard for shard in shards)
+        for shard in shards:
+            assert shard == [name for name in names if name in shard]
+
+    def test_shards_are_stable(self):
+        """Test a playlist lands in the same shard whatever else is listed."""
+        names = [f"Playlist {i}" for i in range(50)]
+        shard = select_shard(names, 3, 1)
+
+        assert select_shard(list(reversed(names)), 3, 1) == shard[::-1]
+        assert select_shard(names[:10], 3, 1) == [n for n in shard if n in names[:10]]
+
+    def test_shard_path(self):
+        """Test each shard gets its own copy of per run files."""
+        assert shard_path("resume.txt", 2) == "resume.shard2.txt"
+        assert shard_path("out/metrics.prom", 0) == "out/metrics.shard0.prom"
+        assert shard_path("profile/", 1) == "profile.shard1"
+
+    def test_run_serially(self):
+        """Test one playlist at a time runs in order on the calling thread."""
+        seen = []
+
+        def work(name, slot):
+            seen.append((name, slot, threading.get_ident()))
+            return len(name)
+
+        results, left = run_playlists(["a", "bb", "ccc"], work)
+
+        assert results == [1, 2, 3]
+        assert left == []
+        assert [(name, slot) for name, slot, _ in seen] == [
+            ("a", None),
+            ("bb", None),
+            ("ccc", None),
+        ]
+        assert {thread for _, _, thread in seen} == {threading.get_ident()}
+
+    def test_run_in_parallel(self):
+        """Test up to parallel playlists are in flight, each in its own slot."""
+        running = []
+        peak = []
+        slots = set()
+        lock = threading.Lock()
+
+        def work(name, slot):
+            with lock:
+                running.append(name)
+                peak.append(len(running))
+                slots.add(slot)
+            time.sleep(0.02)
+            with lock:
+                running.remove(name)
+            return 1
+
+        results, left = run_playlists([str(i) for i in range(9)], work, 3)
+
+        assert sum(results) == 9
+        assert left == []
+        assert max(peak) == 3
+        assert slots == {0, 1, 2}
+
+    def test_deadline_leaves_playlists_to_resume(self):
+        """Test playlists cut short come first, then those never started."""
+
+        def work(name, slot):
+            if name == "b":
+                set_deadline(0)
+            return 0
+
+        _, left = run_playlists(["a", "b", "c", "d"], work)
+
+        assert left == ["b", "c", "d"]
+
+    def test_deadline_after_a_playlist_finished(self):
+        """Test a playlist that got through before returning isn't resumed."""
+
+        def work(name, slot):
+            if name == "b":
+                set_deadline(0)
+            return 0
+
+        _, left = run_playlists(
+            ["a", "b", "c"], work, unfinished=lambda name: name != "b"
+        )
+
+        assert left == ["c"]
+
+    def test_errors_stop_the_run(self):
+        """Test a failing playlist is raised once the others in flight finish."""
+
+        def work(name, slot):
+            if name == "missing":
+                sys.exit(1)
+            return 0
+
+        with pytest.raises(SystemExit):
+            run_playlists(["a", "missing", "b", "c"], work, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,7 +11,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 from src.spfyfuncs import (
     get_spfy_likes,
     get_spotify_playlists,
-    move_to_spfy,
+    iter_spfy_playlist_content,
     spfy_dest_check,
     spotify_auth,
 )
@@ -154,6 +154,20 @@ class TestSpotifyFunctions(unittest.TestCase):
         assert result == expected
         self.mock_spotify.current_user_playlists.assert_called_once()
 
+    def test_get_spotify_playlists_sizes(self):
+        """Test track counts in the listing are collected for --order."""
+        self.mock_spotify.current_user_playlists.return_value = {
+            "items": [
+                {"name": "Big", "id": "p1", "tracks": {"total": 250}},
+                {"name": "No Count", "id": "p2"},
+            ]
+        }
+        sizes = {}
+
+        get_spotify_playlists(self.mock_spotify, sizes)
+
+        assert sizes == {"Big": 250}
+
     def test_get_spotify_playlists_empty(self):
         """Test retrieving Spotify playlists when no playlists exist."""
         self.mock_spotify.current_user_playlists.return_value = {"items": []}
@@ -211,6 +225,38 @@ class TestSpotifyFunctions(unittest.TestCase):
         expected = ["Hot Space&@#72Under Pressure&@#72Queen David Bowie"]
         assert result == expected
 
+    def test_get_spfy_playlist_content_pages(self):
+        """Test playlists longer than one page are read page_size at a time."""
+
+        def page(offset, limit):
+            return {
+                "total": 150,
+                "items": [
+                    {
+                        "track": {
+                            "name": f"Song {i}",
+                            "album": {"name": "Album"},
+                            "artists": [{"name": "Artist"}],
+                        }
+                    }
+                    for i in range(offset, min(offset + limit, 150))
+                ],
+            }
+
+        self.mock_spotify.playlist_items.side_effect = lambda uri, limit, offset: page(
+            offset, limit
+        )
+
+        pages = iter_spfy_playlist_content(self.mock_spotify, "playlist_123", 60)
+        first = next(pages)
+
+        assert len(first) == 60
+        assert self.mock_spotify.playlist_items.call_count == 1
+        assert [len(rest) for rest in pages] == [60, 30]
+        self.mock_spotify.playlist_items.assert_called_with(
+            "spotify:playlist:playlist_123", limit=60, offset=120
+        )
+
     def test_spfy_dest_check_existing_playlist(self):
         """Test checking for existing destination playlist."""
         playlists = {"Test Playlist": "playlist_123"}
@@ -246,72 +292,6 @@ class TestSpotifyFunctions(unittest.TestCase):
             )
             mock_message.assert_called_with("s+", "Playlist created")
 
-    @patch("src.spfyfuncs.get_spfy_playlist_content")
-    @patch("src.spfyfuncs.what_to_move")
-    @patch("src.spfyfuncs.tqdm")
-    def test_move_to_spfy(self, mock_tqdm, mock_what_to_move, mock_get_content):
-        """Test moving songs to Spotify playlist."""
-        # Mock existing playlist content
-        mock_get_content.return_value = []
-
-        # Mock songs to move
-        playlist_info = [
-            "A Night at the Opera&@#72Bohemian Rhapsody&@#72Queen",
-            "Imagine&@#72Imagine&@#72John Lennon",
-        ]
-        mock_what_to_move.return_value = playlist_info
-
-        # Mock search results
-        self.mock_spotify.search.return_value = self.mock_search_response
-
-        # Mock tqdm to return the input directly
-        mock_tqdm.return_value = playlist_info
-
-        with (
-            patch("src.spfyfuncs.compare", return_value=True),
-            patch("src.spfyfuncs.sleep"),
-        ):
-            move_to_spfy(
-                self.mock_spotify, playlist_info, "playlist_123", "Test Playlist"
-            )
-
-            # Should call playlist_add_items
-            self.mock_spotify.playlist_add_items.assert_called()
-
-    @patch("src.spfyfuncs.get_spfy_playlist_content")
-    @patch("src.spfyfuncs.what_to_move")
-    @patch("src.spfyfuncs.tqdm")
-    def test_move_to_spfy_song_not_found(
-        self, mock_tqdm, mock_what_to_move, mock_get_content
-    ):
-        """Test moving songs to Spotify when some songs are not found."""
-        mock_get_content.return_value = []
-
-        playlist_info = ["Unknown Album&@#72Unknown Song&@#72Unknown Artist"]
-        mock_what_to_move.return_value = playlist_info
-        mock_tqdm.return_value = playlist_info
-
-        # Mock empty search results
-        self.mock_spotify.search.return_value = {"tracks": {"items": []}}
-
-        result = move_to_spfy(
-            self.mock_spotify, playlist_info, "playlist_123", "Test Playlist"
-        )
-
-        # Should return the song that wasn't found
-        assert result == ["Unknown Album Unknown Song Unknown Artist"]
-
-    @patch("sys.exit")
-    def test_move_to_spfy_keyboard_interrupt(self, mock_exit):
-        """Test handling keyboard interrupt during move operation."""
-        with (
-            patch("src.spfyfuncs.get_spfy_playlist_content", return_value=[]),
-            patch("src.spfyfuncs.what_to_move", return_value=["test"]),
-            patch("src.spfyfuncs.tqdm", side_effect=KeyboardInterrupt()),
-        ):
-            move_to_spfy(self.mock_spotify, ["test"], "playlist_123", "Test Playlist")
-            mock_exit.assert_called_with(0)
-
 
 if __name__ == "__main__":
     unittest.main()
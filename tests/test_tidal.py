@@ -1,7 +1,8 @@
 import os
 import sys
+import tempfile
 import unittest
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from unittest.mock import Mock, patch
 
 import pytest
@@ -10,14 +11,21 @@ import pytest
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from src.tidalfuncs import (
+    TidalProvider,
     get_tidal_playlist_content,
     get_tidal_playlists,
-    move_to_tidal,
+    save_tidal_creds,
     tidal_auth,
     tidal_dest_check,
+    tidal_keep_fresh,
 )
 
 
+def utcnow():
+    # Expiry times in the creds file are naive UTC, like tidalapi's
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 @pytest.mark.tidal
 @pytest.mark.auth
 @pytest.mark.playlist
@@ -100,7 +108,7 @@ class TestTidalFunctions(unittest.TestCase):
     ):
         """Test successful Tidal authentication with cached credentials."""
         # Mock cached credentials
-        future_time = datetime.now() + timedelta(hours=1)
+        future_time = utcnow() + timedelta(hours=1)
         mock_creds = [
             "Bearer",
             "access_token_123",
@@ -149,14 +157,109 @@ class TestTidalFunctions(unittest.TestCase):
 
         with (
             patch("builtins.open", side_effect=mock_open_func),
+            patch("src.tidalfuncs.os.replace") as mock_replace,
             patch("src.tidalfuncs.message") as mock_message,
         ):
             result = tidal_auth()
 
             assert result == mock_session
             mock_session.login_oauth_simple.assert_called_once()
+            mock_replace.assert_called_once()
             mock_message.assert_called_with("t+", "Successfully Authenticated")
 
+    @patch("src.tidalfuncs.tidalapi.Session")
+    def test_tidal_auth_refreshes_expired_token(self, mock_session_class):
+        """Test an expired access token is renewed without a device login."""
+        new_expiry = utcnow() + timedelta(hours=4)
+        mock_session = Mock()
+        mock_session.load_oauth_session.return_value = True
+
+        def token_refresh(refresh_token):
+            mock_session.token_type = "Bearer"
+            mock_session.access_token = "renewed_access_token"
+            mock_session.expiry_time = new_expiry
+            return True
+
+        mock_session.token_refresh.side_effect = token_refresh
+        mock_session_class.return_value = mock_session
+
+        with tempfile.TemporaryDirectory() as tmp:
+            creds = os.path.join(tmp, "creds_auth.txt")
+            with open(creds, "w") as file:
+                file.write(
+                    "\n".join(
+                        [
+                            "Bearer",
+                            "old_access_token",
+                            "refresh_token_456",
+                            (utcnow() - timedelta(hours=1)).strftime(
+                                "%m/%d/%Y, %H:%M:%S.%f"
+                            ),
+                        ]
+                    )
+                )
+            with (
+                patch("src.tidalfuncs.tidalfile", creds),
+                patch("src.tidalfuncs.message"),
+            ):
+                result = tidal_auth()
+            with open(creds) as file:
+                saved = file.read().splitlines()
+
+        assert result == mock_session
+        mock_session.token_refresh.assert_called_once_with("refresh_token_456")
+        mock_session.login_oauth_simple.assert_not_called()
+        mock_session.load_oauth_session.assert_called_once_with(
+            "Bearer", "renewed_access_token", "refresh_token_456", new_expiry
+        )
+        assert saved[1] == "renewed_access_token"
+        assert saved[2] == "refresh_token_456"
+
+    def test_tidal_keep_fresh(self):
+        """Test tokens are renewed mid-run only when close to expiring."""
+        session = Mock()
+        session.token_type = "Bearer"
+        session.access_token = "access"
+        session.refresh_token = "refresh"
+        session.token_refresh.return_value = True
+
+        with tempfile.TemporaryDirectory() as tmp:
+            creds = os.path.join(tmp, "creds_auth.txt")
+            with patch("src.tidalfuncs.tidalfile", creds):
+                session.expiry_time = utcnow() + timedelta(hours=1)
+                tidal_keep_fresh(session)
+                session.token_refresh.assert_not_called()
+
+                session.expiry_time = utcnow() + timedelta(minutes=1)
+                tidal_keep_fresh(session)
+                session.token_refresh.assert_called_once_with("refresh")
+                assert os.listdir(tmp) == ["creds_auth.txt"]
+
+    def test_save_tidal_creds_replaces_file(self):
+        """Test saved credentials replace the old file in one step."""
+        session = Mock()
+        session.token_type = "Bearer"
+        session.access_token = "access"
+        session.refresh_token = "refresh"
+        session.expiry_time = datetime(2030, 1, 2, 3, 4, 5)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            creds = os.path.join(tmp, "creds_auth.txt")
+            with open(creds, "w") as file:
+                file.write("stale")
+            with patch("src.tidalfuncs.tidalfile", creds):
+                save_tidal_creds(session)
+            with open(creds) as file:
+                saved = file.read().splitlines()
+
+            assert saved == [
+                "Bearer",
+                "access",
+                "refresh",
+                "01/02/2030, 03:04:05.000000",
+            ]
+            assert os.listdir(tmp) == ["creds_auth.txt"]
+
     @patch("src.tidalfuncs.tidalapi.Session")
     @patch("sys.exit")
     def test_tidal_auth_failure(self, mock_exit, mock_session_class):
@@ -191,6 +294,22 @@ class TestTidalFunctions(unittest.TestCase):
             }
             assert result == expected
 
+    @patch("requests.get")
+    def test_provider_resolves_top_level_names_without_folders(self, mock_get):
+        """Test plain playlist names are resolved without crawling folders."""
+        self.mock_tidal.user.playlists.return_value = self.mock_user_playlists
+        provider = TidalProvider()
+        provider.session = self.mock_tidal
+
+        assert provider.resolve("Rock Collection") == "tidal_playlist_456"
+        mock_get.assert_not_called()
+        self.mock_tidal.folder.assert_not_called()
+
+        mock_get.return_value.status_code = 404
+        with patch("src.tidalfuncs.message"):
+            assert provider.resolve("Classical/Folder Playlist") is None
+        mock_get.assert_called_once()
+
     @patch("requests.get")
     def test_get_tidal_playlists_with_folders(self, mock_get):
         """Test retrieving Tidal playlists including those in folders."""
@@ -216,8 +335,9 @@ class TestTidalFunctions(unittest.TestCase):
         assert "My Tidal Playlist" in result
         assert "Rock Music/Folder Playlist" in result
 
+    @patch("src.retry.sleep")
     @patch("requests.get")
-    def test_get_tidal_playlists_folders_api_failure(self, mock_get):
+    def test_get_tidal_playlists_folders_api_failure(self, mock_get, mock_sleep):
         """Test handling folders API failure gracefully."""
         self.mock_tidal.user.playlists.return_value = self.mock_user_playlists
 
@@ -339,114 +459,6 @@ class TestTidalFunctions(unittest.TestCase):
             self.mock_tidal.user.create_playlist.assert_called_with("New Playlist", "")
             mock_folder.add_items.assert_called_with(["new_playlist_123"])
 
-    @patch("src.tidalfuncs.get_tidal_playlist_content")
-    @patch("src.tidalfuncs.what_to_move")
-    @patch("src.tidalfuncs.tqdm")
-    @patch("src.tidalfuncs.tidal_search_playlist")
-    @patch("src.tidalfuncs.tidal_add_song_to_playlist")
-    def test_move_to_tidal(
-        self, mock_add_song, mock_search, mock_tqdm, mock_what_to_move, mock_get_content
-    ):
-        """Test moving songs to Tidal playlist."""
-        # Mock existing playlist content
-        mock_get_content.return_value = []
-
-        # Mock songs to move
-        playlist_info = [
-            "A Night at the Opera&@#72Bohemian Rhapsody&@#72Queen",
-            "Imagine&@#72Imagine&@#72John Lennon",
-        ]
-        mock_what_to_move.return_value = playlist_info
-
-        # Mock search results
-        mock_search.return_value = self.mock_search_response
-
-        # Mock tqdm to return the input directly
-        mock_tqdm.return_value = playlist_info
-
-        self.mock_tidal.access_token = "test_token"
-
-        with (
-            patch("src.tidalfuncs.compare", return_value=True),
-            patch("src.tidalfuncs.sleep"),
-        ):
-            move_to_tidal(
-                self.mock_tidal, playlist_info, "playlist_123", "Test Playlist"
-            )
-
-            # Should call add song to playlist
-            mock_add_song.assert_called()
-
-    @patch("src.tidalfuncs.get_tidal_playlist_content")
-    @patch("src.tidalfuncs.what_to_move")
-    @patch("src.tidalfuncs.tqdm")
-    @patch("src.tidalfuncs.tidal_search_playlist")
-    def test_move_to_tidal_song_not_found(
-        self, mock_search, mock_tqdm, mock_what_to_move, mock_get_content
-    ):
-        """Test moving songs to Tidal when some songs are not found."""
-        mock_get_content.return_value = []
-
-        playlist_info = ["Unknown Album&@#72Unknown Song&@#72Unknown Artist"]
-        mock_what_to_move.return_value = playlist_info
-        mock_tqdm.return_value = playlist_info
-
-        # Create a simple string that when stringified has exactly 408 characters
-        error_response = "x" * 408
-        mock_search.return_value = error_response
-
-        self.mock_tidal.access_token = "test_token"
-
-        result = move_to_tidal(
-            self.mock_tidal, playlist_info, "playlist_123", "Test Playlist"
-        )
-
-        # Should return the song that wasn't found (the original song name, not the modified one)
-        assert result == ["Unknown Song Unknown Artist"]
-
-    @patch("src.tidalfuncs.get_tidal_playlist_content")
-    @patch("src.tidalfuncs.what_to_move")
-    @patch("src.tidalfuncs.tqdm")
-    @patch("src.tidalfuncs.tidal_search_playlist")
-    def test_move_to_tidal_with_parentheses_removal(
-        self, mock_search, mock_tqdm, mock_what_to_move, mock_get_content
-    ):
-        """Test moving songs with parentheses removal fallback."""
-        mock_get_content.return_value = []
-
-        playlist_info = ["Album&@#72Song (Remix)&@#72Artist"]
-        mock_what_to_move.return_value = playlist_info
-        mock_tqdm.return_value = playlist_info
-
-        # First search result has len(str()) == 408 to trigger fallback
-        # Second search result has len(list()) == 408 to trigger not_found
-        first_error = "x" * 408  # String with exactly 408 characters
-        second_error = ["x"] * 408  # List with exactly 408 items
-
-        mock_search.side_effect = [first_error, second_error]
-
-        self.mock_tidal.access_token = "test_token"
-
-        result = move_to_tidal(
-            self.mock_tidal, playlist_info, "playlist_123", "Test Playlist"
-        )
-
-        # Should have called search twice (with and without parentheses)
-        assert mock_search.call_count == 2
-        # Should return the song that wasn't found (original with parentheses as stored in bk)
-        assert result == ["Song (Remix) Artist"]
-
-    @patch("sys.exit")
-    def test_move_to_tidal_keyboard_interrupt(self, mock_exit):
-        """Test handling keyboard interrupt during move operation."""
-        with (
-            patch("src.tidalfuncs.get_tidal_playlist_content", return_value=[]),
-            patch("src.tidalfuncs.what_to_move", return_value=["test"]),
-            patch("src.tidalfuncs.tqdm", side_effect=KeyboardInterrupt()),
-        ):
-            move_to_tidal(self.mock_tidal, ["test"], "playlist_123", "Test Playlist")
-            mock_exit.assert_called_with(0)
-
     @patch("requests.put")
     def test_tidal_create_playlist(self, mock_put):
         """Test creating a new Tidal playlist via API."""
@@ -497,6 +509,26 @@ class TestTidalFunctions(unittest.TestCase):
         mock_get.assert_called_once()
         mock_post.assert_called_once()
 
+    @patch("requests.get")
+    @patch("requests.post")
+    def test_add_batch_rejected(self, mock_post, mock_get):
+        """Test every song of a batch Tidal rejects is reported."""
+        mock_get.return_value = Mock(headers={"Etag": "test_etag"})
+
+        def post(url, data=None, **kwargs):
+            assert data["onDupes"] == "SKIP"
+            return Mock(status_code=400 if "2" in data["trackIds"] else 200)
+
+        mock_post.side_effect = post
+        provider = TidalProvider()
+        provider.session = Mock(access_token="test_token")
+
+        with patch("src.tidalfuncs.tidal_keep_fresh"):
+            failed = provider.add("playlist_123", [1, 2, 3])
+
+        assert failed == [1, 2, 3]
+        assert mock_post.call_count == 1
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,449 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.providers import (
+    AdaptiveLimit,
+    Provider,
+    RateLimiter,
+    learned_limits,
+    save_limits,
+)
+from src.transfer import expired, fan_out, mark, set_deadline, stream, transfer
+
+
+class FakeProvider(Provider):
+    name = "fake"
+    label = "Fake"
+    batch_size = 2
+    concurrency = 3
+    rate_limit = 0
+
+    def __init__(self, catalog, existing=()):
+        super().__init__()
+        self.catalog = catalog
+        self.existing = list(existing)
+        self.batches = []
+        self.threads = set()
+
+    def read_id(self, playlist_id):
+        return self.existing
+
+    def search(self, track, attempt=None):
+        self.threads.add(threading.get_ident())
+        if track == "boom":
+            raise RuntimeError("search failed")
+        return self.catalog.get(track)
+
+    def add(self, dest_id, song_ids):
+        self.batches.append(list(song_ids))
+        return [song_id for song_id in song_ids if song_id == "rejected"]
+
+
+@pytest.mark.migration
+class TestTransfer(unittest.TestCase):
+    """Test suite for the batching transfer engine."""
+
+    def test_transfer_batches_and_not_found(self):
+        """Test matches are added in batches and misses are reported."""
+        catalog = {
+            "a&@#72one&@#72x": "1",
+            "a&@#72two&@#72x": "2",
+            "a&@#72three&@#72x": "3",
+            "a&@#72bad&@#72x": "rejected",
+        }
+        dest = FakeProvider(catalog)
+        tracks = [*catalog, "a&@#72missing&@#72x", "boom"]
+
+        not_found = transfer(tracks, dest, "pl", "Test")
+
+        # Searches finish in any order, but every batch is full until the last
+        assert [len(batch) for batch in dest.batches] == [2, 2]
+        assert sorted(sum(dest.batches, [])) == ["1", "2", "3", "rejected"]
+        failed = {miss["track"]: miss["reason"] for miss in not_found}
+        assert failed == {
+            "a&@#72bad&@#72x": "add failed",
+            "a&@#72missing&@#72x": "not found",
+            "boom": "error",
+        }
+
+    def test_transfer_splits_rejected_batches(self):
+        """Test a batch rejected whole is retried song by song, each paced."""
+        catalog = {f"a&@#72{i}&@#72x": str(i) for i in range(3)}
+        catalog["a&@#72dup&@#72x"] = "dup"
+        dest = FakeProvider(catalog)
+        dest.batch_size = 4
+
+        def add(dest_id, song_ids):
+            # The whole request fails while the duplicate is in it
+            if "dup" in song_ids:
+                return list(song_ids)
+            dest.batches.append(list(song_ids))
+            return []
+
+        dest.add = add
+        dest.limiter = Mock()
+
+        not_found = transfer(list(catalog), dest, "pl", "Test")
+
+        assert sorted(sum(dest.batches, [])) == ["0", "1", "2"]
+        assert all(len(batch) == 1 for batch in dest.batches)
+        assert [miss["reason"] for miss in not_found] == ["add failed"]
+        # The rejected batch, then one request per song
+        assert dest.limiter.wait.call_count == 5
+
+    def test_transfer_skips_existing(self):
+        """Test tracks already in the destination are not searched again."""
+        dest = FakeProvider({"a&@#72one&@#72x": "1"}, existing=["a&@#72one&@#72x"])
+
+        assert transfer(["a&@#72one&@#72x"], dest, "pl", "Test") == []
+        assert dest.batches == []
+
+    def test_transfer_skips_existing_spelled_differently(self):
+        """Test another platform's spelling of a present track isn't added again."""
+        dest = FakeProvider(
+            {"Abbey Road&@#72Something&@#72The Beatles": "1"},
+            existing=["ABBEY ROAD&@#72Something!&@#72The Beatles"],
+        )
+
+        tracks = ["Abbey Road&@#72Something&@#72The Beatles"]
+        assert transfer(tracks, dest, "pl", "Test") == []
+        assert dest.batches == []
+
+    def test_transfer_keeps_other_versions(self):
+        """Test a live version isn't taken for the studio track beside it."""
+        catalog = {
+            "I Am... Sasha Fierce&@#72Halo&@#72Beyoncé": "0",
+            "I Am... Sasha Fierce&@#72Halo (Live)&@#72Beyoncé": "1",
+        }
+        dest = FakeProvider(catalog)
+
+        assert transfer(list(catalog), dest, "pl", "Test") == []
+        assert sorted(sum(dest.batches, [])) == ["0", "1"]
+
+        # With the studio track already there, the live one is still added
+        dest = FakeProvider(
+            catalog, existing=["I Am... Sasha Fierce&@#72Halo&@#72Beyonce"]
+        )
+        transfer(list(catalog), dest, "pl", "Test")
+        assert sum(dest.batches, []) == ["1"]
+
+    def test_transfer_streams_with_bounded_queues(self):
+        """Test the source is read no further ahead than the queues allow."""
+        dest = FakeProvider({})
+        dest.concurrency = 1
+        produced = []
+        lead = []
+
+        def source():
+            for i in range(2000):
+                produced.append(i)
+                yield f"a&@#72{i}&@#72x"
+
+        def search(track, attempt=None):
+            # Nothing matches, so every track comes back as not found
+            lead.append(len(produced) - len(lead))
+
+        dest.search = search
+        not_found = transfer(source(), dest, "pl", "Test", queue_size=8)
+
+        assert len(not_found) == 2000
+        # Two queues of 8 plus the tracks held by each stage
+        assert max(lead) <= 20
+
+    def test_transfer_raises_source_errors(self):
+        """Test a failing source read surfaces after matched tracks are written."""
+        dest = FakeProvider({"a&@#72one&@#72x": "1"})
+
+        def source():
+            yield "a&@#72one&@#72x"
+            raise ConnectionError("page 2 failed")
+
+        with pytest.raises(ConnectionError):
+            transfer(source(), dest, "pl", "Test")
+        assert dest.batches == [["1"]]
+
+    def test_transfer_reuses_results_across_playlists(self):
+        """Test songs shared by several playlists are searched for once per run."""
+        catalog = {"a&@#72one&@#72x": "1", "a&@#72two&@#72x": "2"}
+        dest = FakeProvider(catalog)
+        searched = []
+        original = dest.search
+
+        def search(track, attempt=None):
+            searched.append(track)
+            return original(track, attempt)
+
+        dest.search = search
+        first = transfer([*catalog, "a&@#72gone&@#72x"], dest, "pl1", "One")
+        second = transfer(["a&@#72two&@#72x", "a&@#72gone&@#72x"], dest, "pl2", "Two")
+
+        assert sorted(searched) == sorted([*catalog, "a&@#72gone&@#72x"])
+        assert dest.reused == 2
+        assert [miss["track"] for miss in first] == ["a&@#72gone&@#72x"]
+        assert [miss["track"] for miss in second] == ["a&@#72gone&@#72x"]
+        assert sorted(sum(dest.batches, [])) == ["1", "2", "2"]
+
+    def test_transfer_finds_other_spellings_in_the_index(self):
+        """Test a song matched earlier is reused when spelled another way."""
+        catalog = {
+            "Abbey Road&@#72Something&@#72The Beatles": "1",
+            "Abbey Road&@#72Something (Live)&@#72The Beatles": "live",
+            "1&@#72Hey Jude&@#72The Beatles": "2",
+            "1&@#72Hey Bulldog&@#72The Beatles": "3",
+        }
+        dest = FakeProvider(catalog)
+        searched = []
+        original = dest.search
+
+        def search(track, attempt=None):
+            searched.append(track)
+            return original(track, attempt)
+
+        dest.search = search
+        transfer(list(catalog)[::2], dest, "pl1", "One")
+        again = [
+            "Best Of&@#72Something!&@#72The Beatles",
+            "Abbey Road&@#72Something (Live)&@#72The Beatles",
+            "1&@#72Hey Bulldog&@#72The Beatles",
+        ]
+        transfer(again, dest, "pl2", "Two")
+
+        # Another album and punctuation, but not another recording or song
+        assert sorted(searched) == sorted([*list(catalog)[::2], *again[1:]])
+        assert dest.reused == 1
+        assert sorted(sum(dest.batches, [])) == ["1", "1", "2", "3", "live"]
+
+    def test_transfer_retries_errored_searches_later(self):
+        """Test a search that raised is not remembered as a miss."""
+        dest = FakeProvider({})
+
+        transfer(["boom"], dest, "pl1", "One")
+        transfer(["boom"], dest, "pl2", "Two")
+
+        assert dest.reused == 0
+
+    def test_transfer_stops_at_deadline(self):
+        """Test no new track starts after the deadline and matches are written."""
+        catalog = {f"a&@#72{i}&@#72x": str(i) for i in range(500)}
+        dest = FakeProvider(catalog)
+        searched = []
+
+        def search(track, attempt=None):
+            searched.append(track)
+            if len(searched) == 5:
+                set_deadline(0)
+            return catalog[track]
+
+        dest.search = search
+        try:
+            not_found = transfer(list(catalog), dest, "pl", "Test")
+            assert expired()
+        finally:
+            set_deadline(None)
+
+        # Searches already running finished, nothing after them started
+        assert 5 <= len(searched) < 10
+        assert sorted(sum(dest.batches, [])) == sorted(catalog[t] for t in searched)
+        assert not_found == []
+
+    def test_transfer_resumes_after_deadline(self):
+        """Test a run cut short is picked up after the tracks it got through."""
+        catalog = {f"a&@#72{i}&@#72x": str(i) for i in range(50)}
+        tracks = list(catalog)
+        dest = FakeProvider(catalog)
+        dest.concurrency = 1
+        searched = []
+
+        def search(track, attempt=None):
+            searched.append(track)
+            if len(searched) == 5:
+                set_deadline(0)
+            return catalog[track]
+
+        dest.search = search
+        resume = {}
+        try:
+            transfer(tracks, dest, "pl", "Test", resume=resume)
+        finally:
+            set_deadline(None)
+        assert resume == {"fake": (5, mark(tracks[4]))}
+
+        # The next run reads a destination that spells the tracks its own way,
+        # so only the saved count keeps them from being added again
+        rerun = FakeProvider(catalog, existing=["Other&@#720&@#72X"])
+        transfer(tracks, rerun, "pl", "Test", resume=resume)
+
+        added = sum(dest.batches + rerun.batches, [])
+        assert sorted(added) == sorted(catalog.values())
+        assert resume == {}
+
+    def test_transfer_diffs_a_changed_source(self):
+        """Test nothing is skipped once the tracks a run got through have moved."""
+        catalog = {f"a&@#72{i}&@#72x": str(i) for i in range(10)}
+        tracks = list(catalog)
+        # Moved before the deadline: the first 5, the last of them marked
+        resume = {"fake": (5, mark(tracks[4]))}
+        dest = FakeProvider(catalog, existing=tracks[:5])
+
+        # A song liked since goes first and pushes the rest down
+        catalog["a&@#72new&@#72x"] = "new"
+        transfer(["a&@#72new&@#72x", *tracks], dest, "pl", "Test", resume=resume)
+
+        assert sorted(sum(dest.batches, [])) == sorted(["new", *"56789"])
+        assert resume == {}
+
+    def test_fan_out_reads_source_once(self):
+        """Test every stream gets every track from a single pass of the source."""
+        reads = []
+
+        def source():
+            for i in range(50):
+                reads.append(i)
+                yield i
+
+        first, second = fan_out(source(), 2, queue_size=4)
+        results = {}
+        reader = threading.Thread(target=lambda: results.update(a=list(first)))
+        reader.start()
+        results["b"] = list(second)
+        reader.join()
+
+        assert results["a"] == results["b"] == list(range(50))
+        assert reads == list(range(50))
+
+    def test_fan_out_raises_source_errors(self):
+        """Test a source failure reaches every stream."""
+
+        def source():
+            yield 1
+            raise ConnectionError("page 2 failed")
+
+        for copy in fan_out(source(), 2):
+            with pytest.raises(ConnectionError):
+                list(copy)
+
+    def test_stream_reads_pages_lazily(self):
+        """Test pages are only fetched when their tracks are needed."""
+        fetched = []
+
+        def pages():
+            for i in range(3):
+                fetched.append(i)
+                yield [f"{i}-a", f"{i}-b"]
+
+        tracks = stream(pages())
+        assert next(tracks) == "0-a"
+        assert fetched == [0]
+        assert list(tracks) == ["0-b", "1-a", "1-b", "2-a", "2-b"]
+
+    def test_rate_limiter_spaces_calls(self):
+        """Test the limiter spaces calls out across threads."""
+        limiter = RateLimiter(50)
+        start = time.monotonic()
+        threads = [threading.Thread(target=limiter.wait) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Five calls at 50/s need at least four 20ms gaps
+        assert time.monotonic() - start >= 0.07
+
+    def test_rate_limiter_disabled(self):
+        """Test a zero rate never sleeps."""
+        limiter = RateLimiter(0)
+        start = time.monotonic()
+        for _ in range(100):
+            limiter.wait()
+
+        assert time.monotonic() - start < 0.05
+
+    def test_adaptive_limit_grows_on_success(self):
+        """Test the limit rises by about one per round of successes."""
+        gate = AdaptiveLimit(2, ceiling=4)
+        for _ in range(5):
+            gate.succeeded(0.01)
+
+        assert 3.5 < gate.limit <= 4
+        for _ in range(50):
+            gate.succeeded(0.01)
+        assert gate.limit == 4
+
+    def test_adaptive_limit_backs_off_on_throttling(self):
+        """Test 429s halve the limit while other client errors don't."""
+        gate = AdaptiveLimit(8, ceiling=8)
+        throttled = Exception("429")
+        throttled.http_status = 429
+        missing = Exception("404")
+        missing.http_status = 404
+
+        gate.failed(missing)
+        assert gate.limit == 8
+        gate.failed(throttled)
+        assert gate.limit == 4
+        gate.failed(throttled)
+        gate.failed(throttled)
+        assert gate.limit == 1
+
+    def test_adaptive_limit_backs_off_on_slow_requests(self):
+        """Test a request far slower than usual counts as congestion."""
+        gate = AdaptiveLimit(8, ceiling=8)
+        for _ in range(AdaptiveLimit.WARMUP):
+            gate.succeeded(0.01)
+
+        gate.succeeded(0.5)
+
+        assert gate.limit == 4
+
+    def test_adaptive_limit_caps_requests_in_flight(self):
+        """Test no more than limit callers are inside the gate at once."""
+        gate = AdaptiveLimit(2, ceiling=2)
+        inside = []
+        peak = []
+        lock = threading.Lock()
+
+        def work():
+            with gate:
+                with lock:
+                    inside.append(1)
+                    peak.append(len(inside))
+                time.sleep(0.01)
+                with lock:
+                    inside.pop()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max(peak) == 2
+
+    def test_learned_limits_persist_between_runs(self):
+        """Test the limit a run ends with is the next run's starting point."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "limits.json")
+            dest = FakeProvider({})
+            dest.max_concurrency = 6
+            dest._gate = AdaptiveLimit(5, dest.ceiling)
+            unused = FakeProvider({})
+            unused.name = "unused"
+
+            save_limits([dest, unused], path)
+
+            assert learned_limits(path) == {"fake": 5}
+            assert learned_limits(os.path.join(tmp, "missing.json")) == {}
+
+
+if __name__ == "__main__":
+    unittest.main()
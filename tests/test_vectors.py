@@ -0,0 +1,77 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("numpy")
+
+from bench.reconcile import libraries
+from src import vectors
+from src.matching import best_match
+from src.vectors import embed, reconcile, similar_pairs
+
+
+@pytest.mark.main
+class TestVectors(unittest.TestCase):
+    """Test suite for bulk matching with hashed trigram vectors."""
+
+    def test_embed_normalises_rows(self):
+        """Test every track becomes a unit vector, equal spellings alike."""
+        vectors = embed(
+            [
+                "Album&@#72Dreams&@#72Fleetwood Mac",
+                "Other&@#72dreams!&@#72FLEETWOOD MAC",
+            ]
+        )
+
+        assert vectors.shape[0] == 2
+        assert abs(float(vectors[0] @ vectors[0]) - 1) < 1e-5
+        assert abs(float(vectors[0] @ vectors[1]) - 1) < 1e-5
+
+    def test_similar_pairs_across_blocks(self):
+        """Test pairs above the threshold are found whatever the block size."""
+        ours, theirs = libraries(40)
+
+        pairs = list(similar_pairs(ours, theirs, block=7))
+
+        assert {(source, target) for source, target, _ in pairs} >= {
+            (i, i) for i in range(40)
+        }
+        assert all(cosine >= 0.4 for _, _, cosine in pairs)
+
+    def test_sources_embedded_per_block(self):
+        """Test only one block of sources is held as vectors at a time."""
+        ours, theirs = libraries(20)
+
+        with patch("src.vectors.embed", wraps=vectors.embed) as mock_embed:
+            list(similar_pairs(ours, theirs, block=8))
+
+        sizes = [len(call.args[0]) for call in mock_embed.call_args_list]
+        assert sizes == [20, 8, 8, 4]
+
+    def test_reconcile_matches_pairwise(self):
+        """Test the vectorized path finds what best_match() finds."""
+        ours, theirs = libraries(60)
+
+        matches = reconcile(ours, theirs)
+
+        assert matches == [best_match(track, theirs) for track in ours]
+        assert [match[0] for match in matches] == list(range(60))
+
+    def test_unmatched(self):
+        """Test tracks with no close target are None."""
+        matches = reconcile(
+            ["Kind of Blue&@#72So What&@#72Miles Davis"],
+            ["Rumours&@#72Dreams&@#72Fleetwood Mac"],
+        )
+
+        assert matches == [None]
+
+
+if __name__ == "__main__":
+    unittest.main()
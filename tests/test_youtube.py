@@ -9,11 +9,12 @@ import pytest
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from src.ytfuncs import (
+    YouTubeProvider,
     change_name,
     get_youtube_playlists,
     get_yt_playlist_content,
-    move_to_ytmusic,
     yt_dest_check,
+    yt_query,
     ytmusic_auth,
 )
 
@@ -143,6 +144,25 @@ class TestYoutubeFunctions(unittest.TestCase):
                 "Renamed spfy2yt Old Playlist to sound-tunnel Old Playlist to fit new script",
             )
 
+    def test_provider_renames_only_when_listing(self):
+        """Test old spfy2yt playlists are renamed for -L/-A, not for -p."""
+        self.mock_ytmusic.get_library_playlists.return_value = [
+            {"title": "spfy2yt Mix", "playlistId": "PL_old"}
+        ]
+        self.mock_ytmusic.get_playlist.return_value = {"tracks": []}
+        self.mock_ytmusic.edit_playlist.return_value = "STATUS_SUCCEEDED"
+        provider = YouTubeProvider()
+        provider.session = self.mock_ytmusic
+
+        assert provider.read("spfy2yt Mix") == []
+        self.mock_ytmusic.edit_playlist.assert_not_called()
+
+        with patch("src.ytfuncs.message"):
+            assert provider.all_playlists() == ["sound-tunnel Mix"]
+        self.mock_ytmusic.edit_playlist.assert_called_once_with(
+            "PL_old", "sound-tunnel Mix"
+        )
+
     def test_change_name_no_spfy2yt_playlists(self):
         """Test change_name when no spfy2yt playlists exist."""
         yt_lists = {
@@ -161,12 +181,14 @@ class TestYoutubeFunctions(unittest.TestCase):
         result = get_yt_playlist_content(self.mock_ytmusic, "PLrAUCsHkE_test123")
 
         expected = [
-            "A Night at the Opera&Bohemian Rhapsody&Queen",
-            "Led Zeppelin IV&Stairway to Heaven&Led Zeppelin",
-            "&Song Without Album&Unknown Artist",
+            "A Night at the Opera&@#72Bohemian Rhapsody&@#72Queen",
+            "Led Zeppelin IV&@#72Stairway to Heaven&@#72Led Zeppelin",
+            "&@#72Song Without Album&@#72Unknown Artist",
         ]
         assert result == expected
-        self.mock_ytmusic.get_playlist.assert_called_once_with("PLrAUCsHkE_test123")
+        self.mock_ytmusic.get_playlist.assert_called_once_with(
+            "PLrAUCsHkE_test123", limit=None
+        )
 
     def test_get_yt_playlist_content_multiple_artists(self):
         """Test playlist content with multiple artists."""
@@ -183,7 +205,7 @@ class TestYoutubeFunctions(unittest.TestCase):
 
         result = get_yt_playlist_content(self.mock_ytmusic, "PLrAUCsHkE_test123")
 
-        expected = ["Hot Space&Under Pressure&Queen David Bowie"]
+        expected = ["Hot Space&@#72Under Pressure&@#72Queen David Bowie"]
         assert result == expected
 
     def test_yt_dest_check_existing_playlist(self):
@@ -212,98 +234,65 @@ class TestYoutubeFunctions(unittest.TestCase):
             )
             mock_message.assert_called_with("y+", "Playlist created")
 
-    @patch("src.ytfuncs.get_yt_playlist_content")
-    @patch("src.ytfuncs.what_to_move")
-    @patch("src.ytfuncs.tqdm")
-    def test_move_to_ytmusic(self, mock_tqdm, mock_what_to_move, mock_get_content):
-        """Test moving songs to YouTube Music playlist."""
-        # Mock existing playlist content
-        mock_get_content.return_value = []
-
-        # Mock songs to move
-        playlist_info = [
-            "A Night at the Opera&Bohemian Rhapsody&Queen",
-            "Imagine&Imagine&John Lennon",
-        ]
-        mock_what_to_move.return_value = playlist_info
-
-        # Mock search results
-        self.mock_ytmusic.search.return_value = self.mock_search_response
-
-        # Mock tqdm to return the input directly
-        mock_tqdm.return_value = playlist_info
-
-        # Mock successful add result
-        self.mock_ytmusic.add_playlist_items.return_value = "STATUS_SUCCEEDED"
-
-        with patch("src.ytfuncs.sleep"):
-            move_to_ytmusic(
-                self.mock_ytmusic, playlist_info, "PLrAUCsHkE_test123", "Test Playlist"
-            )
-
-            # Should call add_playlist_items
-            self.mock_ytmusic.add_playlist_items.assert_called()
-
-    @patch("src.ytfuncs.get_yt_playlist_content")
-    @patch("src.ytfuncs.what_to_move")
-    @patch("src.ytfuncs.tqdm")
-    def test_move_to_ytmusic_song_not_found(
-        self, mock_tqdm, mock_what_to_move, mock_get_content
-    ):
-        """Test moving songs to YouTube Music when some songs are not found."""
-        mock_get_content.return_value = []
-
-        playlist_info = ["Unknown Album&Unknown Song&Unknown Artist"]
-        mock_what_to_move.return_value = playlist_info
-        mock_tqdm.return_value = playlist_info
+    def test_add_batch_with_duplicate(self):
+        """Test a batch YouTube drops for one duplicate is reported whole."""
+        present = {"v2"}
 
-        # Mock search that returns empty results (will cause IndexError)
-        self.mock_ytmusic.search.return_value = []
+        def add_playlist_items(playlist_id, video_ids):
+            if present & set(video_ids):
+                return {
+                    "status": "STATUS_FAILED",
+                    "actions": ["This song is already in the playlist"],
+                }
+            present.update(video_ids)
+            return {"status": "STATUS_SUCCEEDED"}
+
+        self.mock_ytmusic.add_playlist_items.side_effect = add_playlist_items
+        provider = YouTubeProvider()
+        provider.session = self.mock_ytmusic
+
+        assert provider.add("PL1", ["v1", "v2", "v3"]) == ["v1", "v2", "v3"]
+        # A song already there on its own counts as added
+        assert provider.add("PL1", ["v2"]) == []
+        assert provider.add("PL1", ["v1"]) == []
+        assert present == {"v1", "v2"}
+
+    def test_query_scores_results(self):
+        """Test results that aren't the track are skipped, not taken first."""
+        self.mock_ytmusic.search.return_value = [
+            {
+                "videoId": "warhols",
+                "title": "Bohemian Like You",
+                "album": None,
+                "artists": [{"name": "The Dandy Warhols"}],
+            },
+            {
+                "videoId": "queen",
+                "title": "Bohemian Rhapsody",
+                "album": {"name": "A Night at the Opera"},
+                "artists": [{"name": "Queen"}],
+            },
+        ]
+        target = "A Night at the Opera&@#72Bohemian Rhapsody&@#72Queen"
+        attempt = {}
 
-        result = move_to_ytmusic(
-            self.mock_ytmusic, playlist_info, "PLrAUCsHkE_test123", "Test Playlist"
+        assert yt_query(self.mock_ytmusic, "Bohemian Rhapsody", target, attempt) == (
+            "queen"
         )
+        assert "The Dandy Warhols" in attempt["best"]
 
-        # Should return not_found list due to exception handling
-        assert result == []
-
-    @patch("src.ytfuncs.get_yt_playlist_content")
-    @patch("src.ytfuncs.what_to_move")
-    @patch("src.ytfuncs.tqdm")
-    def test_move_to_ytmusic_add_failure(
-        self, mock_tqdm, mock_what_to_move, mock_get_content
-    ):
-        """Test moving songs when add operation fails."""
-        mock_get_content.return_value = []
-
-        playlist_info = ["Album&Song&Artist"]
-        mock_what_to_move.return_value = playlist_info
-        mock_tqdm.return_value = playlist_info
+        self.mock_ytmusic.search.return_value = self.mock_ytmusic.search.return_value[
+            :1
+        ]
+        assert yt_query(self.mock_ytmusic, "Bohemian Rhapsody", target) is None
 
-        # Mock search returns results but add fails
-        self.mock_ytmusic.search.return_value = self.mock_search_response
+    def test_add_batch_failure(self):
+        """Test every song of a failed batch is reported."""
         self.mock_ytmusic.add_playlist_items.return_value = "FAILED"
+        provider = YouTubeProvider()
+        provider.session = self.mock_ytmusic
 
-        with patch("src.ytfuncs.sleep"):
-            result = move_to_ytmusic(
-                self.mock_ytmusic, playlist_info, "PLrAUCsHkE_test123", "Test Playlist"
-            )
-
-            # Should return the song that failed to add
-            assert result == ["Album Song Artist"]
-
-    @patch("sys.exit")
-    def test_move_to_ytmusic_keyboard_interrupt(self, mock_exit):
-        """Test handling keyboard interrupt during move operation."""
-        with (
-            patch("src.ytfuncs.get_yt_playlist_content", return_value=[]),
-            patch("src.ytfuncs.what_to_move", return_value=["test"]),
-            patch("src.ytfuncs.tqdm", side_effect=KeyboardInterrupt()),
-        ):
-            move_to_ytmusic(
-                self.mock_ytmusic, ["test"], "PLrAUCsHkE_test123", "Test Playlist"
-            )
-            mock_exit.assert_called_with(0)
+        assert provider.add("PL1", ["v1", "v2"]) == ["v1", "v2"]
 
 
 if __name__ == "__main__":